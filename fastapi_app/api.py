@@ -1,12 +1,20 @@
-from fastapi import APIRouter, HTTPException, status
-from database import DatabaseSessionDep
+import json
+from fastapi import APIRouter, Header, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from database import DatabaseSessionDep, ReadSessionDep, read_session
 from redis_client import RedisDep
+from cache import DeviceCacheDep, cache_stats
+from events import DeviceEventsDep, EVENTS_CHANNEL
 from models import DeviceStatus, ConnectionStatus, SessionStatus
 from schemas import (
     DeviceSchema,
     DeviceCreateSchema,
     OnlyStatusSchema,
     StatusDeviceSchema,
+    DeviceStatusBatchSchema,
+    DeviceStatusBatchResultSchema,
+    device_rows_adapter,
+    serial_numbers_adapter,
 )
 from repository import DeviceRepository
 from exceptions import DeviceAlreadyExists, InvalidStatusError
@@ -22,10 +30,13 @@ router = APIRouter(
     "/",
     summary="Get complete information about all device",
     status_code=status.HTTP_200_OK,
+    response_model=list[DeviceSchema],
 )
-async def get_all_device(db: DatabaseSessionDep) -> list[DeviceSchema]:
+async def get_all_device(db: ReadSessionDep) -> Response:
     result = await DeviceRepository(db).get_all_devices()
-    return [DeviceSchema.model_validate(x) for x in result]
+    return Response(
+        device_rows_adapter.dump_json(result), media_type="application/json"
+    )
 
 
 @router.post(
@@ -49,9 +60,13 @@ async def create_device(
     status_code=status.HTTP_200_OK,
 )
 async def edit_label_by_serial_number(
-    serial_number: str, label: str, db: DatabaseSessionDep
+    serial_number: str,
+    label: str,
+    db: DatabaseSessionDep,
+    cache: DeviceCacheDep,
+    events: DeviceEventsDep,
 ) -> DeviceCreateSchema:
-    data = await DeviceRepository(db).update_device(
+    data = await DeviceRepository(db, cache, events).update_device(
         serial_number=serial_number, label=label
     )
     return DeviceCreateSchema.model_validate(data)
@@ -63,9 +78,9 @@ async def edit_label_by_serial_number(
     status_code=status.HTTP_200_OK,
 )
 async def get_status_and_label_by_serial_number(
-    serial_number: str, db: DatabaseSessionDep
+    serial_number: str, db: ReadSessionDep, cache: DeviceCacheDep
 ) -> StatusDeviceSchema:
-    data = await DeviceRepository(db).get_status_device_by_serial_number(
+    data = await DeviceRepository(db, cache).get_status_device_by_serial_number(
         serial_number=serial_number
     )
     return StatusDeviceSchema.model_validate(data)
@@ -75,9 +90,13 @@ async def get_status_and_label_by_serial_number(
     "/edit-status/device/{serial_number}", summary="Updates the device's device status"
 )
 async def edit_device_status_by_serial_number(
-    serial_number: str, status: DeviceStatus, db: DatabaseSessionDep
+    serial_number: str,
+    status: DeviceStatus,
+    db: DatabaseSessionDep,
+    cache: DeviceCacheDep,
+    events: DeviceEventsDep,
 ) -> DeviceSchema:
-    data = await DeviceRepository(db).update_device(
+    data = await DeviceRepository(db, cache, events).update_device(
         serial_number=serial_number, status_device=status
     )
     return DeviceSchema.model_validate(data)
@@ -88,9 +107,13 @@ async def edit_device_status_by_serial_number(
     summary="Updates the device's session status",
 )
 async def edit_session_status_by_serial_number(
-    serial_number: str, status: SessionStatus, db: DatabaseSessionDep
+    serial_number: str,
+    status: SessionStatus,
+    db: DatabaseSessionDep,
+    cache: DeviceCacheDep,
+    events: DeviceEventsDep,
 ) -> DeviceSchema:
-    data = await DeviceRepository(db).update_device(
+    data = await DeviceRepository(db, cache, events).update_device(
         serial_number=serial_number, session_status=status
     )
     return DeviceSchema.model_validate(data)
@@ -101,9 +124,13 @@ async def edit_session_status_by_serial_number(
     summary="Updates the device's connection status",
 )
 async def edit_connection_status_by_serial_number(
-    serial_number: str, status: ConnectionStatus, db: DatabaseSessionDep
+    serial_number: str,
+    status: ConnectionStatus,
+    db: DatabaseSessionDep,
+    cache: DeviceCacheDep,
+    events: DeviceEventsDep,
 ) -> DeviceSchema:
-    data = await DeviceRepository(db).update_device(
+    data = await DeviceRepository(db, cache, events).update_device(
         serial_number=serial_number, connection_status=status
     )
     return DeviceSchema.model_validate(data)
@@ -111,15 +138,40 @@ async def edit_connection_status_by_serial_number(
 
 @router.post("/edit-all", summary="Updates all device's session status")
 async def edit_all_device_session_status(
-    status: SessionStatus, db: DatabaseSessionDep
+    status: SessionStatus,
+    db: DatabaseSessionDep,
+    cache: DeviceCacheDep,
+    events: DeviceEventsDep,
 ) -> dict:
-    await DeviceRepository(db).update_device(session_status=status)
+    await DeviceRepository(db, cache, events).update_device(session_status=status)
     return {"message": f"{status=}"}
 
 
-@router.get("/online-devices", summary="Get all devices online")
-async def get_all_devices_online(db: DatabaseSessionDep) -> list[str]:
-    return await DeviceRepository(db).get_all_online_devices()
+@router.patch(
+    "/status:batch",
+    summary="Updates statuses of many devices in one transaction",
+    status_code=status.HTTP_200_OK,
+)
+async def edit_statuses_batch(
+    batch: DeviceStatusBatchSchema,
+    db: DatabaseSessionDep,
+    cache: DeviceCacheDep,
+    events: DeviceEventsDep,
+) -> DeviceStatusBatchResultSchema:
+    updated, not_found = await DeviceRepository(db, cache, events).update_statuses(
+        batch.changes
+    )
+    return DeviceStatusBatchResultSchema(updated=updated, not_found=not_found)
+
+
+@router.get(
+    "/online-devices", summary="Get all devices online", response_model=list[str]
+)
+async def get_all_devices_online(db: ReadSessionDep) -> Response:
+    result = await DeviceRepository(db).get_all_online_devices()
+    return Response(
+        serial_numbers_adapter.dump_json(result), media_type="application/json"
+    )
 
 
 @router.get("/not-auth-devices", summary="Get all unregistered devices")
@@ -128,15 +180,95 @@ async def get_all_unregister_device(redis: RedisDep) -> set:
     return result
 
 
+SSE_KEEPALIVE = 15
+
+
+def sse_message(event: str, version: int, data) -> str:
+    return f"id: {version}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/events", summary="Stream of device state changes (server-sent events)")
+async def device_events_stream(
+    request: Request,
+    redis: RedisDep,
+    events: DeviceEventsDep,
+    since: int | None = None,
+    last_event_id: int | None = Header(default=None),
+) -> StreamingResponse:
+    # a client that knows a version (Last-Event-ID on reconnect, or ?since=)
+    # gets the missed changes; otherwise, or if the log no longer reaches
+    # back, it gets a full snapshot tagged with the version it reflects
+    resume_from = last_event_id if last_event_id is not None else since
+    pubsub = redis.pubsub()
+    await pubsub.subscribe(EVENTS_CHANNEL)
+
+    async def catch_up(version: int | None):
+        # the changes after `version` from the log, or a full snapshot when
+        # there is no version or the log no longer reaches back to it
+        missed = None
+        if version is not None:
+            missed = await events.changes_since(version)
+        if missed is None:
+            version = await events.current_version()
+            async with read_session() as db:
+                devices = await DeviceRepository(db).get_all_devices()
+            snapshot = {
+                "version": version,
+                "devices": json.loads(device_rows_adapter.dump_json(devices)),
+            }
+            yield sse_message("snapshot", version, snapshot), version
+        else:
+            for change in missed:
+                yield sse_message("change", change["version"], change), change["version"]
+
+    async def stream():
+        try:
+            version = resume_from
+            async for message, version in catch_up(resume_from):
+                yield message
+            while not await request.is_disconnected():
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=SSE_KEEPALIVE
+                )
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                change = json.loads(message["data"])
+                if change["version"] <= version:
+                    continue
+                if change["version"] != version + 1:
+                    # a message was lost on the way, the log has it (it is
+                    # written before the publish) or a snapshot replaces it
+                    async for message, version in catch_up(version):
+                        yield message
+                    continue
+                version = change["version"]
+                yield sse_message("change", version, change)
+        finally:
+            await pubsub.unsubscribe(EVENTS_CHANNEL)
+            await pubsub.aclose()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache-stats", summary="Device cache hit and miss counters")
+async def get_cache_stats() -> dict:
+    return cache_stats
+
+
 @router.get(
     "/{serial_number}",
     summary="Get complete information about the device by the serial number",
     status_code=status.HTTP_200_OK,
 )
 async def get_device_by_serial_number(
-    serial_number: str, db: DatabaseSessionDep
+    serial_number: str, db: ReadSessionDep, cache: DeviceCacheDep
 ) -> DeviceSchema:
-    result = await DeviceRepository(db).get_device_by_serial_number(
+    result = await DeviceRepository(db, cache).get_device_by_serial_number(
         serial_number=serial_number
     )
     return DeviceSchema.model_validate(result)
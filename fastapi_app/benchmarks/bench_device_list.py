@@ -0,0 +1,104 @@
+"""Latency and peak memory of listing 10k devices: the previous path
+(select(Device), model_validate per row, FastAPI response serialization)
+against the column projection + TypeAdapter.dump_json used by GET
+/v1/devices/ now. Also times the status-filtered online query.
+
+Usage: python benchmarks/bench_device_list.py [--devices 10000] [--runs 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+DB_DIR = tempfile.mkdtemp()
+os.environ.setdefault("DB_URL", f"sqlite+aiosqlite:///{DB_DIR}/bench.db")
+os.environ.setdefault("REDIS_HOST", "localhost")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("FASTAPI_HOST", "127.0.0.1")
+os.environ.setdefault("FASTAPI_PORT", "8000")
+
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from database import create_meta, async_session, read_session
+from models import Device, DeviceStatus
+from repository import DeviceRepository
+from schemas import DeviceSchema, device_rows_adapter
+
+response_adapter = TypeAdapter(list[DeviceSchema])
+
+
+async def orm_list() -> bytes:
+    async with read_session() as db:
+        result = await db.execute(select(Device))
+        models = [DeviceSchema.model_validate(x) for x in result.scalars().all()]
+    # what FastAPI does with a list[DeviceSchema] return value
+    data = response_adapter.dump_python(response_adapter.validate_python(models), mode="json")
+    return json.dumps(data).encode()
+
+
+async def projection_list() -> bytes:
+    async with read_session() as db:
+        rows = await DeviceRepository(db).get_all_devices()
+    return device_rows_adapter.dump_json(rows)
+
+
+async def online_list() -> list[str]:
+    async with read_session() as db:
+        return await DeviceRepository(db).get_all_online_devices()
+
+
+async def measure(fn, runs: int) -> tuple[float, float]:
+    await fn()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    await fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    await create_meta()
+    async with async_session() as db:
+        await db.execute(
+            Device.__table__.insert(),
+            [
+                {
+                    "serial_number": f"list-{i:06d}",
+                    "label": f"device {i}",
+                    "status_device": DeviceStatus.ONLINE if i % 10 else DeviceStatus.OFFLINE,
+                }
+                for i in range(args.devices)
+            ],
+        )
+        await db.commit()
+
+    assert json.loads(await orm_list()) == json.loads(await projection_list())
+    for name, fn in (
+        ("ORM + model_validate", orm_list),
+        ("projection + dump_json", projection_list),
+        ("online (indexed)", online_list),
+    ):
+        latency, peak = await measure(fn, args.runs)
+        print(f"{name:<23} median {latency * 1000:8.1f} ms  peak {peak / 2**20:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+"""Mixed read/write load on the device table with the default engine
+(rollback journal, one shared pool) and with the tuned storage layer from
+database.py (WAL, synchronous=NORMAL, busy_timeout, a single-connection
+writer pool next to a reader pool).
+
+Every process runs its own engines against the same SQLite file, the way
+the API, device_support and the host server share it in production.
+
+Usage: python benchmarks/bench_sqlite_load.py [--seconds 5] [--processes 2]
+           [--writers 4] [--readers 16] [--devices 200]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+os.environ.setdefault("DB_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("REDIS_HOST", "localhost")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("FASTAPI_HOST", "127.0.0.1")
+os.environ.setdefault("FASTAPI_PORT", "8000")
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+from database import Base, configure_sqlite
+from models import Device, DeviceStatus
+
+
+def make_sessions(url: str, tuned: bool, readers: int):
+    if not tuned:
+        engine = create_async_engine(url)
+        maker = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        return maker, maker, [engine]
+    writer = configure_sqlite(create_async_engine(url, pool_size=1, max_overflow=0))
+    reader = configure_sqlite(
+        create_async_engine(url, pool_size=min(readers, 5), max_overflow=0)
+    )
+    return (
+        sessionmaker(writer, expire_on_commit=False, class_=AsyncSession),
+        sessionmaker(reader, expire_on_commit=False, class_=AsyncSession),
+        [writer, reader],
+    )
+
+
+async def workload(url: str, tuned: bool, args) -> dict:
+    write_session, read_session, engines = make_sessions(url, tuned, args.readers)
+    serials = [f"load-{i:05d}" for i in range(args.devices)]
+    deadline = time.perf_counter() + args.seconds
+    result = {"reads": [], "writes": [], "errors": 0}
+
+    async def writer():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with write_session() as session:
+                    await session.execute(
+                        update(Device)
+                        .where(Device.serial_number == random.choice(serials))
+                        .values(status_device=random.choice(list(DeviceStatus)))
+                    )
+                    await session.commit()
+                result["writes"].append(time.perf_counter() - start)
+            except OperationalError:
+                result["errors"] += 1
+
+    async def reader():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with read_session() as session:
+                    await session.execute(
+                        select(Device.status_device, Device.label).where(
+                            Device.serial_number == random.choice(serials)
+                        )
+                    )
+                result["reads"].append(time.perf_counter() - start)
+            except OperationalError:
+                result["errors"] += 1
+
+    await asyncio.gather(
+        *(writer() for _ in range(args.writers)),
+        *(reader() for _ in range(args.readers)),
+    )
+    for engine in engines:
+        await engine.dispose()
+    return result
+
+
+def run_process(url: str, tuned: bool, args) -> dict:
+    return asyncio.run(workload(url, tuned, args))
+
+
+async def seed(url: str, devices: int):
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            Device.__table__.insert(),
+            [{"serial_number": f"load-{i:05d}", "label": str(i)} for i in range(devices)],
+        )
+    await engine.dispose()
+
+
+def p99(values: list[float]) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100)[98]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--devices", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, tuned in (("default engine", False), ("tuned engine", True)):
+            url = f"sqlite+aiosqlite:///{directory}/{name.split()[0]}.db"
+            asyncio.run(seed(url, args.devices))
+            with multiprocessing.Pool(args.processes) as pool:
+                results = pool.starmap(
+                    run_process, [(url, tuned, args)] * args.processes
+                )
+            reads = [x for r in results for x in r["reads"]]
+            writes = [x for r in results for x in r["writes"]]
+            errors = sum(r["errors"] for r in results)
+            print(
+                f"{name:<15} reads {len(reads) / args.seconds:7.0f}/s "
+                f"p99 {p99(reads) * 1000:7.1f} ms  "
+                f"writes {len(writes) / args.seconds:6.0f}/s "
+                f"p99 {p99(writes) * 1000:7.1f} ms  locked {errors}"
+            )
+
+
+if __name__ == "__main__":
+    main()
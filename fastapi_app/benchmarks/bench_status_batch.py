@@ -0,0 +1,78 @@
+"""1,000 device status flips through the per-device endpoint against one
+PATCH /v1/devices/status:batch, in process over httpx's ASGI transport and
+a temporary SQLite file.
+
+Usage: python benchmarks/bench_status_batch.py [--devices 1000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+DB_DIR = tempfile.mkdtemp()
+os.environ.setdefault("DB_URL", f"sqlite+aiosqlite:///{DB_DIR}/bench.db")
+os.environ.setdefault("REDIS_HOST", "localhost")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ.setdefault("FASTAPI_HOST", "127.0.0.1")
+os.environ.setdefault("FASTAPI_PORT", "8000")
+
+import httpx
+from database import create_meta
+from main import app
+
+
+async def seed(client: httpx.AsyncClient, serials: list[str]):
+    for serial in serials:
+        response = await client.post(
+            "/v1/devices/add", json={"serial_number": serial, "label": serial}
+        )
+        response.raise_for_status()
+
+
+async def per_device(client: httpx.AsyncClient, serials: list[str], status: str) -> float:
+    start = time.perf_counter()
+    for serial in serials:
+        response = await client.patch(
+            f"/v1/devices/edit-status/device/{serial}", params={"status": status}
+        )
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def batch(client: httpx.AsyncClient, serials: list[str], status: str) -> float:
+    changes = [{"serial_number": serial, "status_device": status} for serial in serials]
+    start = time.perf_counter()
+    response = await client.patch("/v1/devices/status:batch", json={"changes": changes})
+    response.raise_for_status()
+    assert not response.json()["not_found"]
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=1000)
+    args = parser.parse_args()
+
+    await create_meta()
+    serials = [f"bench-{i:05d}" for i in range(args.devices)]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await seed(client, serials)
+        results = {
+            "per-device PATCH": await per_device(client, serials, "OFFLINE"),
+            "status:batch": await batch(client, serials, "ONLINE"),
+        }
+    for name, elapsed in results.items():
+        print(
+            f"{name:<17} {elapsed * 1000:9.1f} ms  "
+            f"{args.devices / elapsed:9.0f} flips/s"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
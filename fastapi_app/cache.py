@@ -0,0 +1,119 @@
+import redis.asyncio as redis
+from enum import Enum
+from fastapi import Depends
+from typing import Annotated
+from redis_client import RedisDep
+
+DEVICE_KEY_PREFIX = "device:"
+DEVICE_TTL = 300
+# every invalidation bumps the generation of the device (and invalidate_all
+# the global one); a read fills the cache only if neither changed since its
+# miss, so a row read before a concurrent update is never cached after it
+GENERATION_KEY_PREFIX = "device-generation:"
+GLOBAL_GENERATION_KEY = "device-generation"
+GENERATION_TTL = 86400
+FILL_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1]
+        or (redis.call('GET', KEYS[3]) or '0') ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+DEVICE_FIELDS = (
+    "serial_number",
+    "label",
+    "status_device",
+    "session_status",
+    "connection_status",
+)
+
+cache_stats = {"hits": 0, "misses": 0, "errors": 0, "invalidations": 0}
+
+
+class DeviceCache:
+    def __init__(self, redis_client: redis.Redis) -> None:
+        self.redis = redis_client
+        self.fill_script = redis_client.register_script(FILL_SCRIPT)
+
+    @staticmethod
+    def key(serial_number: str) -> str:
+        return f"{DEVICE_KEY_PREFIX}{serial_number}"
+
+    @staticmethod
+    def generation_key(serial_number: str) -> str:
+        return f"{GENERATION_KEY_PREFIX}{serial_number}"
+
+    async def lookup(self, serial_number: str) -> tuple[dict | None, tuple | None]:
+        # (cached data or None, generation to pass to set() after a miss)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hgetall(self.key(serial_number))
+                pipe.mget(self.generation_key(serial_number), GLOBAL_GENERATION_KEY)
+                data, generations = await pipe.execute()
+        except redis.RedisError:
+            cache_stats["errors"] += 1
+            return None, None
+        if not data:
+            cache_stats["misses"] += 1
+            return None, tuple(x or "0" for x in generations)
+        cache_stats["hits"] += 1
+        data.setdefault("label", None)
+        return data, None
+
+    async def get(self, serial_number: str) -> dict | None:
+        data, _ = await self.lookup(serial_number)
+        return data
+
+    async def set(self, serial_number: str, data: dict, generation: tuple) -> bool:
+        # False when the device was invalidated since the miss that read `generation`
+        args = [*generation, DEVICE_TTL]
+        for field, value in data.items():
+            if value is not None:
+                args += [field, value.value if isinstance(value, Enum) else value]
+        try:
+            return bool(
+                await self.fill_script(
+                    keys=[
+                        self.key(serial_number),
+                        self.generation_key(serial_number),
+                        GLOBAL_GENERATION_KEY,
+                    ],
+                    args=args,
+                )
+            )
+        except redis.RedisError:
+            cache_stats["errors"] += 1
+            return False
+
+    async def invalidate(self, *serial_numbers: str) -> None:
+        if not serial_numbers:
+            return
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(*(self.key(x) for x in serial_numbers))
+                for serial_number in serial_numbers:
+                    pipe.incr(self.generation_key(serial_number))
+                    pipe.expire(self.generation_key(serial_number), GENERATION_TTL)
+                await pipe.execute()
+            cache_stats["invalidations"] += len(serial_numbers)
+        except redis.RedisError:
+            cache_stats["errors"] += 1
+
+    async def invalidate_all(self) -> None:
+        try:
+            await self.redis.incr(GLOBAL_GENERATION_KEY)
+            keys = [key async for key in self.redis.scan_iter(f"{DEVICE_KEY_PREFIX}*")]
+            if keys:
+                await self.redis.delete(*keys)
+            cache_stats["invalidations"] += len(keys)
+        except redis.RedisError:
+            cache_stats["errors"] += 1
+
+
+async def get_device_cache(redis_client: RedisDep) -> DeviceCache:
+    return DeviceCache(redis_client)
+
+
+DeviceCacheDep = Annotated[DeviceCache, Depends(get_device_cache)]
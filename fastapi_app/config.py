@@ -20,6 +20,11 @@ class RedisConfig(AppBaseSettings):
 
 class SQLiteConfig(AppBaseSettings):
     db_url: str
+    db_journal_mode: str = "WAL"
+    db_synchronous: str = "NORMAL"
+    db_busy_timeout: int = 5000  # ms
+    db_read_pool_size: int = 5
+    db_pool_timeout: float = 30
 
 
 class Settings(BaseSettings):
@@ -1,13 +1,59 @@
 from typing import Annotated
 from fastapi import Depends
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
-from sqlalchemy import update
+from sqlalchemy import event, update
 from config import settings
 
 
-engine = create_async_engine(url=settings.sqlite_config.db_url)
+def configure_sqlite(engine: AsyncEngine,
+                     journal_mode: str = "WAL",
+                     synchronous: str = "NORMAL",
+                     busy_timeout: int = 5000) -> AsyncEngine:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+        cursor.close()
+
+    return engine
+
+
+def pool_options(url: str, pool_size: int) -> dict:
+    # an in-memory database lives in one StaticPool connection
+    if ":memory:" in url:
+        return {}
+    return {
+        "pool_size": pool_size,
+        "max_overflow": 0,
+        "pool_timeout": settings.sqlite_config.db_pool_timeout,
+    }
+
+
+sqlite_config = settings.sqlite_config
+pragmas = {
+    "journal_mode": sqlite_config.db_journal_mode,
+    "synchronous": sqlite_config.db_synchronous,
+    "busy_timeout": sqlite_config.db_busy_timeout,
+}
+# SQLite allows one writer at a time: writes queue for the single pooled
+# connection in process instead of failing with "database is locked",
+# while WAL lets the reader pool run next to them
+engine = configure_sqlite(
+    create_async_engine(url=sqlite_config.db_url,
+                        **pool_options(sqlite_config.db_url, 1)),
+    **pragmas,
+)
+read_engine = engine if ":memory:" in sqlite_config.db_url else configure_sqlite(
+    create_async_engine(url=sqlite_config.db_url,
+                        **pool_options(sqlite_config.db_url,
+                                       sqlite_config.db_read_pool_size)),
+    **pragmas,
+)
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+read_session = sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
 
 
 class Base(DeclarativeBase):
@@ -27,13 +73,27 @@ async def preparing_table_after_restart() -> None:
         await session.commit()
 
 
+def create_missing_indexes(connection) -> None:
+    # create_all skips existing tables, and with them their new indexes
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
 async def create_meta() -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_missing_indexes)
 
 
 async def get_async_session():
     async with async_session() as session:
         yield session
 
-DatabaseSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
\ No newline at end of file
+
+async def get_read_session():
+    async with read_session() as session:
+        yield session
+
+DatabaseSessionDep = Annotated[AsyncSession, Depends(get_async_session)]
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
\ No newline at end of file
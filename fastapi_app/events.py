@@ -0,0 +1,81 @@
+import json
+import redis.asyncio as redis
+from enum import Enum
+from fastapi import Depends
+from typing import Annotated
+from redis_client import RedisDep
+
+
+EVENTS_CHANNEL = "device-events"
+VERSION_KEY = "device-events:version"
+LOG_KEY = "device-events:log"
+# how far back a reconnecting client can resume without a new snapshot
+LOG_SIZE = 1000
+# numbers the changes, appends them to the log and publishes them in one
+# atomic step: concurrent writers cannot publish out of order and a failure
+# leaves no reserved version unwritten. ARGV: channel, log size, then each
+# change as a JSON object the version is prepended to
+PUBLISH_SCRIPT = """
+local count = #ARGV - 2
+local last = redis.call('INCRBY', KEYS[1], count)
+for i = 1, count do
+    local message = '{"version": ' .. (last - count + i) .. ', ' .. string.sub(ARGV[i + 2], 2)
+    redis.call('RPUSH', KEYS[2], message)
+    redis.call('PUBLISH', ARGV[1], message)
+end
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+return last
+"""
+
+
+def encode_change(serial_number: str, fields: dict) -> dict:
+    change = {"serial_number": serial_number}
+    for field, value in fields.items():
+        change[field] = value.value if isinstance(value, Enum) else value
+    return change
+
+
+class DeviceEvents:
+    def __init__(self, redis_client: redis.Redis) -> None:
+        self.redis = redis_client
+        self.publish_script = redis_client.register_script(PUBLISH_SCRIPT)
+
+    async def current_version(self) -> int:
+        return int(await self.redis.get(VERSION_KEY) or 0)
+
+    async def publish(self, changes: list[dict]) -> None:
+        # the database commit happens first: every version a client sees is
+        # already visible to the snapshot query
+        if not changes:
+            return
+        try:
+            await self.publish_script(
+                keys=[VERSION_KEY, LOG_KEY],
+                args=[EVENTS_CHANNEL, LOG_SIZE, *(json.dumps(change) for change in changes)],
+            )
+        except redis.RedisError:
+            # nothing was numbered: connected clients miss these changes
+            # until their next snapshot, no version is left without a change
+            pass
+
+    async def changes_since(self, version: int) -> list[dict] | None:
+        # None when the log no longer reaches back to `version`
+        current = await self.current_version()
+        if version > current:
+            return None
+        if version == current:
+            return []
+        changes = [json.loads(x) for x in await self.redis.lrange(LOG_KEY, 0, -1)]
+        missed = sorted(
+            (x for x in changes if x["version"] > version), key=lambda x: x["version"]
+        )
+        if not missed or missed[0]["version"] != version + 1:
+            return None
+        return missed
+
+
+async def get_device_events(redis_client: RedisDep) -> DeviceEvents:
+    return DeviceEvents(redis_client)
+
+
+DeviceEventsDep = Annotated[DeviceEvents, Depends(get_device_events)]
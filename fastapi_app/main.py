@@ -9,15 +9,18 @@ import redis.asyncio as redis
 from database import create_meta, preparing_table_after_restart
 from exceptions import DatabaseError, DeviceNotFoundError, InvalidStatusError
 from redis_client import redis_pool
+from cache import DeviceCache
 from api import router as devices_router
 from config import settings
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis.Redis(connection_pool=redis_pool)
+    redis_client = redis.Redis(connection_pool=redis_pool)
     await create_meta()
     await preparing_table_after_restart()
+    # statuses were reset in bulk, nothing cached before the restart is valid
+    await DeviceCache(redis_client).invalidate_all()
     yield
     await redis_pool.disconnect()
 
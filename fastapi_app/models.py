@@ -25,9 +25,10 @@ class Device(Base):
 
     serial_number: Mapped[str] = mapped_column(String(length=128), primary_key=True)
     label: Mapped[str] = mapped_column(String(length=128), nullable=True)
-    status_device: Mapped[DeviceStatus] = mapped_column(default=DeviceStatus.ONLINE)
-    session_status: Mapped[SessionStatus] = mapped_column(default=SessionStatus.INACTIVE)
-    connection_status: Mapped[ConnectionStatus] = mapped_column(default=ConnectionStatus.DISCONNECTED)
+    status_device: Mapped[DeviceStatus] = mapped_column(default=DeviceStatus.ONLINE, index=True)
+    session_status: Mapped[SessionStatus] = mapped_column(default=SessionStatus.INACTIVE, index=True)
+    connection_status: Mapped[ConnectionStatus] = mapped_column(default=ConnectionStatus.DISCONNECTED,
+                                                                index=True)
     created_at: Mapped[datetime.datetime] = mapped_column(server_default=func.now())
     updated_at: Mapped[datetime.datetime] = mapped_column(server_default=func.now(),
                                                           onupdate=datetime.datetime.utcnow) # <- TODO: update utcnow
\ No newline at end of file
@@ -1,14 +1,26 @@
-from schemas import DeviceCreateSchema, DeviceSchema
+from collections import defaultdict
+from schemas import DeviceCreateSchema, DeviceSchema, DeviceStatusChangeSchema, DeviceRow
 from models import Device, DeviceStatus
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import select, update
 from exceptions import DeviceNotFoundError, DeviceAlreadyExists, DatabaseError
+from cache import DeviceCache, DEVICE_FIELDS
+from events import DeviceEvents, encode_change
+
+STATUS_FIELDS = ("status_device", "session_status", "connection_status")
+# stays well below SQLite's limit on bound parameters per statement
+IN_CHUNK_SIZE = 500
 
 
 class DeviceRepository:
-    def __init__(self, db: AsyncSession) -> None:
+    def __init__(self,
+                 db: AsyncSession,
+                 cache: DeviceCache | None = None,
+                 events: DeviceEvents | None = None) -> None:
         self.db = db
+        self.cache = cache
+        self.events = events
 
     async def already_exists(self, serial_number: str):
         stmt = select(Device.serial_number).where(Device.serial_number == serial_number)
@@ -29,10 +41,11 @@ class DeviceRepository:
         return new_device
         
 
-    async def get_all_devices(self) -> list[DeviceSchema]:
-        stmt = select(Device)
+    async def get_all_devices(self) -> list[DeviceRow]:
+        # plain rows instead of identity-mapped ORM objects
+        stmt = select(*(getattr(Device, field) for field in DEVICE_FIELDS))
         result = await self.db.execute(stmt)
-        return result.scalars().all()
+        return [dict(zip(DEVICE_FIELDS, row)) for row in result.tuples()]
 
 
     async def get_all_online_devices(self):
@@ -42,11 +55,21 @@ class DeviceRepository:
 
 
     async def get_device_by_serial_number(self, serial_number: str) -> DeviceSchema:
+        generation = None
+        if self.cache:
+            cached, generation = await self.cache.lookup(serial_number)
+            if cached:
+                return cached
         stmt = select(Device).where(Device.serial_number == serial_number)
         result = await self.db.execute(stmt)
         data = result.scalar_one_or_none()
         if not data:
             raise DeviceNotFoundError(serial_number)
+        if self.cache and generation is not None:
+            # skipped by the cache if an update invalidated the device meanwhile
+            await self.cache.set(serial_number,
+                                 {field: getattr(data, field) for field in DEVICE_FIELDS},
+                                 generation)
         return data
 
 
@@ -55,24 +78,76 @@ class DeviceRepository:
                             **update_fields) -> DeviceSchema | list[DeviceSchema]:
         stmt = update(Device)
         if serial_number:
-            exists = await self.already_exists(serial_number)
-            if not exists:
-                raise DeviceNotFoundError(serial_number)
             stmt = stmt.where(Device.serial_number == serial_number)
         stmt = stmt.values(**update_fields).returning(Device)
         result = await self.db.execute(stmt)
+        if serial_number:
+            # RETURNING yields no row for an unknown serial, no SELECT needed
+            data = result.scalar_one_or_none()
+            if data is None:
+                await self.db.rollback()
+                raise DeviceNotFoundError(serial_number)
+        else:
+            data = [DeviceSchema.model_validate(x) for x in result.scalars().all()]
         try:
             await self.db.commit()
+        except Exception as e:
+            raise DatabaseError(e)
+        if self.cache:
             if serial_number:
-                return result.scalar_one_or_none()
+                await self.cache.invalidate(serial_number)
             else:
-                row = result.scalars().all()
-                return [DeviceSchema.model_validate(x) for x in row]
+                await self.cache.invalidate(*(x.serial_number for x in data))
+        if self.events:
+            rows = [data] if serial_number else data
+            await self.events.publish(
+                [encode_change(x.serial_number, update_fields) for x in rows]
+            )
+        return data
+
+
+    async def update_statuses(self,
+                              changes: list[DeviceStatusChangeSchema]) -> tuple[list[str], list[str]]:
+        # the last change of a field wins, then one UPDATE per (field, value)
+        latest = {}
+        for change in changes:
+            for field in STATUS_FIELDS:
+                value = getattr(change, field)
+                if value is not None:
+                    latest[(change.serial_number, field)] = value
+        groups = defaultdict(list)
+        for (serial_number, field), value in latest.items():
+            groups[(field, value)].append(serial_number)
+
+        updated = set()
+        published = []
+        try:
+            for (field, value), serials in groups.items():
+                for i in range(0, len(serials), IN_CHUNK_SIZE):
+                    stmt = (update(Device)
+                            .where(Device.serial_number.in_(serials[i:i + IN_CHUNK_SIZE]))
+                            .values({field: value})
+                            .returning(Device.serial_number))
+                    result = await self.db.execute(stmt)
+                    for serial_number in result.scalars().all():
+                        updated.add(serial_number)
+                        published.append(encode_change(serial_number, {field: value}))
+            await self.db.commit()
         except Exception as e:
+            await self.db.rollback()
             raise DatabaseError(e)
+        if self.cache:
+            await self.cache.invalidate(*updated)
+        if self.events:
+            await self.events.publish(published)
+        requested = {serial_number for serial_number, _ in latest}
+        return sorted(updated), sorted(requested - updated)
 
 
     async def get_status_device_by_serial_number(self, serial_number: str):
+        if self.cache:
+            # status and label share the cached device hash
+            return await self.get_device_by_serial_number(serial_number)
         stmt = (select(Device.status_device, 
                       Device.session_status, 
                       Device.connection_status, 
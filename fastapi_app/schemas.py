@@ -1,4 +1,5 @@
-from pydantic import BaseModel, Field
+from typing_extensions import TypedDict
+from pydantic import BaseModel, Field, TypeAdapter
 from models import DeviceStatus, SessionStatus, ConnectionStatus
 
 class Base(BaseModel):
@@ -27,4 +28,33 @@ class StatusDeviceSchema(Base):
 class OnlyStatusSchema(DeviceCreateSchema):
     status_device: DeviceStatus
     connection_status: ConnectionStatus
-    session_status: SessionStatus
\ No newline at end of file
+    session_status: SessionStatus
+
+
+class DeviceStatusChangeSchema(Base):
+    serial_number: str = Field(..., max_length=128)
+    status_device: DeviceStatus | None = None
+    session_status: SessionStatus | None = None
+    connection_status: ConnectionStatus | None = None
+
+
+class DeviceStatusBatchSchema(Base):
+    changes: list[DeviceStatusChangeSchema]
+
+
+class DeviceStatusBatchResultSchema(Base):
+    updated: list[str]
+    not_found: list[str]
+
+
+class DeviceRow(TypedDict):
+    serial_number: str
+    label: str | None
+    status_device: DeviceStatus
+    connection_status: ConnectionStatus
+    session_status: SessionStatus
+
+
+# list endpoints serialize trusted rows straight to JSON, without building models
+device_rows_adapter = TypeAdapter(list[DeviceRow])
+serial_numbers_adapter = TypeAdapter(list[str])
\ No newline at end of file
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# settings are read at import time; the tests use an in-memory database and
+# a fake redis, nothing connects to the configured hosts
+os.environ.setdefault("FASTAPI_HOST", "127.0.0.1")
+os.environ.setdefault("FASTAPI_PORT", "8000")
+os.environ.setdefault("REDIS_HOST", "127.0.0.1")
+os.environ.setdefault("REDIS_PORT", "6379")
+os.environ["DB_URL"] = "sqlite+aiosqlite:///:memory:"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
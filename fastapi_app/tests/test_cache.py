@@ -0,0 +1,89 @@
+import asyncio
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # fakeredis runs the Lua scripts with it
+
+from cache import DeviceCache
+from database import async_session, create_meta
+from models import Device, SessionStatus
+from repository import DeviceRepository
+
+
+def new_cache() -> DeviceCache:
+    return DeviceCache(fakeredis.FakeAsyncRedis(decode_responses=True))
+
+
+def test_fill_after_a_miss():
+    async def run():
+        cache = new_cache()
+        data, generation = await cache.lookup("a")
+        assert data is None
+        assert await cache.set("a", {"serial_number": "a", "label": None}, generation)
+        assert await cache.get("a") == {"serial_number": "a", "label": None}
+
+    asyncio.run(run())
+
+
+def test_invalidation_between_miss_and_fill_skips_the_fill():
+    async def run():
+        cache = new_cache()
+        _, generation = await cache.lookup("a")
+        await cache.invalidate("a")
+        assert not await cache.set("a", {"serial_number": "a"}, generation)
+        assert await cache.get("a") is None
+        # the next miss reads the new generation and fills again
+        _, generation = await cache.lookup("a")
+        assert await cache.set("a", {"serial_number": "a"}, generation)
+
+    asyncio.run(run())
+
+
+def test_invalidate_all_skips_fills_in_flight():
+    async def run():
+        cache = new_cache()
+        _, generation = await cache.lookup("a")
+        await cache.invalidate_all()
+        assert not await cache.set("a", {"serial_number": "a"}, generation)
+
+    asyncio.run(run())
+
+
+class RacingCache(DeviceCache):
+    # runs an update after the reader's SELECT and before its cache fill
+    def __init__(self, redis_client, race):
+        super().__init__(redis_client)
+        self.race = race
+
+    async def set(self, serial_number, data, generation):
+        await self.race()
+        return await super().set(serial_number, data, generation)
+
+
+def test_read_miss_racing_an_update_does_not_cache_the_old_row():
+    async def run():
+        await create_meta()
+        redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+        async with async_session() as db:
+            db.add(Device(serial_number="race", label="phone"))
+            await db.commit()
+
+        async def update():
+            async with async_session() as db:
+                await DeviceRepository(db, DeviceCache(redis_client)).update_device(
+                    "race", session_status=SessionStatus.ACTIVE
+                )
+
+        async with async_session() as db:
+            cache = RacingCache(redis_client, update)
+            stale = await DeviceRepository(db, cache).get_device_by_serial_number("race")
+        assert stale.session_status is SessionStatus.INACTIVE
+
+        async with async_session() as db:
+            device = await DeviceRepository(
+                db, DeviceCache(redis_client)
+            ).get_device_by_serial_number("race")
+        status = device["session_status"] if isinstance(device, dict) else device.session_status
+        assert SessionStatus(status) is SessionStatus.ACTIVE
+
+    asyncio.run(run())
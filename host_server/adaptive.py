@@ -0,0 +1,97 @@
+import time
+from typing import NamedTuple
+
+
+class Rung(NamedTuple):
+    bit_rate: int
+    max_size: int  # 0 keeps the device resolution
+    max_fps: int  # 0 keeps the device frame rate
+
+
+# best first
+LADDER = (
+    Rung(8_000_000, 0, 60),
+    Rung(4_000_000, 1920, 60),
+    Rung(2_000_000, 1280, 60),
+    Rung(1_000_000, 1024, 60),
+    Rung(500_000, 800, 30),
+    Rung(250_000, 640, 15),
+)
+
+
+def budget_level(budget: int, sessions: int, ladder=LADDER) -> int:
+    # the best rung every running session can have within the host budget
+    share = budget / max(1, sessions)
+    for level, rung in enumerate(ladder):
+        if rung.bit_rate <= share:
+            return level
+    return len(ladder) - 1
+
+
+class QualityController:
+    def __init__(
+        self,
+        level: int = 3,
+        ladder=LADDER,
+        up_after: int = 5,
+        hold: float = 10.0,
+        max_decode_lag: float = 0.5,
+        memory: float = 60.0,
+    ):
+        self.ladder = ladder
+        self.level = level
+        self.up_after = up_after  # clean intervals before stepping up
+        self.hold = hold  # seconds before stepping up again, a restart takes a while
+        self.max_decode_lag = max_decode_lag
+        self.memory = memory  # seconds a congested rung is remembered
+        self.clean = 0
+        self.last_dropped = 0
+        self.failures: dict[int, tuple[int, float]] = {}  # level -> (times it congested, when)
+        self.changed_at = time.monotonic()
+
+    @property
+    def rung(self) -> Rung:
+        return self.ladder[self.level]
+
+    def congested(self, sample: dict) -> bool:
+        dropped = sample.get("dropped", 0) - self.last_dropped
+        self.last_dropped = sample.get("dropped", 0)
+        return (
+            dropped > 0
+            or sample.get("depth", 0) > sample.get("maxsize", 0) // 2
+            or (sample.get("decode_lag") or 0) > self.max_decode_lag
+        )
+
+    def backoff(self, level: int) -> int:
+        count, at = self.failures.get(level, (0, 0.0))
+        return count if time.monotonic() - at < self.memory else 0
+
+    def update(self, sample: dict | None, min_level: int = 0) -> Rung | None:
+        # sample: send buffer and client report of the viewer the quality is
+        # tuned for, None without viewers; returns the rung to switch to
+        target = self.level
+        if sample is not None and self.congested(sample):
+            self.clean = 0
+            target = self.level + 1
+        elif sample is not None:
+            self.clean += 1
+            if self.clean == self.up_after:
+                self.failures.pop(self.level, None)  # this rung holds
+            # a rung that congested recently is probed again less and less often
+            if self.clean >= self.up_after << self.backoff(self.level - 1):
+                target = self.level - 1
+        target = min(max(target, min_level), len(self.ladder) - 1)
+        if target == self.level:
+            return None
+        # the budget is enforced at once, the network signals wait for the
+        # previous change to show its effect; stepping down waits less
+        over_budget = self.level < min_level
+        hold = self.hold if target < self.level else self.hold / 4
+        if not over_budget and time.monotonic() - self.changed_at < hold:
+            return None
+        if target > self.level and not over_budget:
+            self.failures[self.level] = (min(self.backoff(self.level) + 1, 4), time.monotonic())
+        self.level = target
+        self.clean = 0
+        self.changed_at = time.monotonic()
+        return self.rung
@@ -0,0 +1,193 @@
+import os
+import socket
+import struct
+import subprocess
+import time
+from loguru import logger
+
+SYNC_DATA_MAX = 64 * 1024
+
+
+class AdbError(Exception):
+    pass
+
+
+def parse_devices(payload: str) -> dict[str, str]:
+    devices = {}
+    for line in payload.splitlines():
+        parts = line.split()
+        if len(parts) >= 2:
+            devices[parts[0]] = parts[1]
+    return devices
+
+
+def parse_devices_long(payload: str) -> list[dict]:
+    devices = []
+    for line in payload.splitlines():
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+        device = {"serial": parts[0], "state": parts[1]}
+        for part in parts[2:]:
+            key, _, value = part.partition(":")
+            device[key] = value
+        devices.append(device)
+    return devices
+
+
+class AdbConnection:
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def recv_exact(self, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = self.sock.recv(size)
+            if not chunk:
+                raise AdbError("adb server closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def recv_all(self) -> bytes:
+        chunks = []
+        while True:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def read_string(self) -> str:
+        size = int(self.recv_exact(4), 16)
+        return self.recv_exact(size).decode(errors="replace")
+
+    def send_request(self, request: str):
+        data = request.encode()
+        self.sock.sendall(b"%04x" % len(data) + data)
+        self.check_status()
+
+    def check_status(self):
+        status = self.recv_exact(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(self.read_string())
+        raise AdbError(f"unexpected adb response {status!r}")
+
+
+class AdbClient:
+    # The adb server serves one request per connection (a transport switch
+    # is followed by exactly one service), so there is nothing to keep alive
+    # between calls: every call is one loopback connect instead of a fork/exec.
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5037, timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def connect(self) -> AdbConnection:
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except ConnectionRefusedError:
+            self.start_server()
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        return AdbConnection(sock)
+
+    def start_server(self):
+        logger.info("adb server is not running, starting it")
+        subprocess.run(
+            ["adb", "-P", str(self.port), "start-server"],
+            capture_output=True,
+            timeout=30,
+        )
+
+    def host_query(self, request: str) -> str:
+        with self.connect() as conn:
+            conn.send_request(request)
+            return conn.read_string()
+
+    def transport(self, serial: str) -> AdbConnection:
+        conn = self.connect()
+        try:
+            conn.send_request(f"host:transport:{serial}")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def devices(self) -> dict[str, str]:
+        return parse_devices(self.host_query("host:devices"))
+
+    def devices_long(self) -> list[dict]:
+        return parse_devices_long(self.host_query("host:devices-l"))
+
+    def track_devices(self):
+        # yields the full {serial: state} snapshot on every change
+        with self.connect() as conn:
+            conn.sock.settimeout(None)
+            conn.send_request("host:track-devices")
+            while True:
+                yield parse_devices(conn.read_string())
+
+    def forward(self, serial: str, local: str, remote: str):
+        with self.connect() as conn:
+            # the first OKAY acknowledges the transport, the second the forward
+            conn.send_request(f"host-serial:{serial}:forward:{local};{remote}")
+            conn.check_status()
+
+    def kill_forward(self, serial: str, local: str):
+        with self.connect() as conn:
+            conn.send_request(f"host-serial:{serial}:killforward:{local}")
+            conn.check_status()
+
+    def list_forward(self) -> list[tuple[str, str, str]]:
+        payload = self.host_query("host:list-forward")
+        return [tuple(line.split()) for line in payload.splitlines() if line.strip()]
+
+    def shell(self, serial: str, command: str) -> str:
+        with self.transport(serial) as conn:
+            conn.send_request(f"shell:{command}")
+            return conn.recv_all().decode(errors="replace")
+
+    def open_shell(self, serial: str, command: str) -> AdbConnection:
+        # long running command, the caller reads the output from the socket
+        conn = self.transport(serial)
+        try:
+            conn.sock.settimeout(None)
+            conn.send_request(f"shell:{command}")
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def push(self, serial: str, local_path: str, remote_path: str, mode: int = 0o644):
+        with self.transport(serial) as conn, open(local_path, "rb") as f:
+            conn.send_request("sync:")
+            target = f"{remote_path},{0o100000 | mode}".encode()
+            conn.sock.sendall(b"SEND" + struct.pack("<I", len(target)) + target)
+            for chunk in iter(lambda: f.read(SYNC_DATA_MAX), b""):
+                conn.sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+            mtime = int(os.path.getmtime(local_path) or time.time())
+            conn.sock.sendall(b"DONE" + struct.pack("<I", mtime))
+            status = conn.recv_exact(4)
+            size = struct.unpack("<I", conn.recv_exact(4))[0]
+            if status == b"FAIL":
+                raise AdbError(conn.recv_exact(size).decode(errors="replace"))
+            if status != b"OKAY":
+                raise AdbError(f"unexpected sync response {status!r}")
+            conn.sock.sendall(b"QUIT" + struct.pack("<I", 0))
+
+
+adb = AdbClient()
@@ -4,21 +4,35 @@ monkey.patch_all()
 from flask import Flask, render_template, request, abort
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from scrcpy import Scrcpy
-import queue
+from fanout import VideoFanout, set_tcp_nodelay
+from packet_queue import QueuePolicy
+from deploy_cache import ServerDeployCache
+from adb_client import adb
+from port_allocator import PortAllocator
+from backend_client import BackendClient, Dispatcher
+from session_pool import Session, SessionPool
+from batch_jobs import BatchOrchestrator, bus_key
+from adaptive import QualityController, budget_level
+from metrics import registry, session_gauges
+from rooms import Rooms, attach_viewer, recording_options
+from gevent.pywsgi import WSGIServer
+from config import settings
 import subprocess
-import socket
-import random
-import requests
 from loguru import logger
 import os
-from utils import send_message_to_telegram
-from typing import Dict, Set
+from utils import is_device_available, notifier, report_session
 
 # TODO: refactoring
 
-active_connections: Dict[str, dict] = {}  # serial -> {scrcpy, queue, task}
-sid_to_device: Dict[str, str] = {}  # sid -> serial
-room_clients: Dict[str, Set[str]] = {}  # serial -> set(sid)
+deploy_cache = ServerDeployCache()
+backend = BackendClient(
+    settings.BACKEND_URL, settings.BACKEND_TIMEOUT, settings.BACKEND_RETRIES
+)
+dispatcher = Dispatcher()
+rooms = Rooms(
+    lambda serial, started: dispatcher.submit(report_session, backend, serial, started)
+)
+ports = PortAllocator(settings.FORWARD_PORT_START, settings.FORWARD_PORT_END)
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "secret!"
@@ -30,64 +44,25 @@ socketio = SocketIO(
 )
 
 
-def find_free_port() -> int:
-    while True:
-        port = random.randint(30000, 40000)
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            if s.connect_ex(("localhost", port)) != 0:
-                return port
-
-
-def is_device_available(serial: str) -> bool:
-    try:
-        result = subprocess.run(
-            ["adb", "devices"], capture_output=True, text=True, check=True
-        )
-        lines = result.stdout.splitlines()
-        for line in lines[1:]:
-            if line.strip() and serial in line and "device" in line:
-                return True
-        return False
-    except Exception as e:
-        logger.error(f"ADB devices check failed: {e}")
-        return False
-
-
-def video_send_task(serial: str):
-    conn = active_connections.get(serial)
-    if not conn:
-        return
-    q = conn["queue"]
-    logger.info(f"Video send task started for {serial}")
-    while serial in active_connections:
-        try:
-            data = q.get(timeout=0.001)
-            socketio.emit("video_data", data, room=serial)
-        except queue.Empty:
-            continue
-        except Exception as e:
-            logger.error(f"Error sending video for {serial}: {e}")
-    logger.info(f"Video send task stopped for {serial}")
-
-
 @app.route("/favicon.ico")
 def favicon():
     return "", 204, {"Content-Type": "image/x-icon"}
 
 
+@app.route("/stats")
+def queue_stats():
+    return {
+        serial: {**session.stats(), "controller": rooms.controller(serial)}
+        for serial, session in list(pool.sessions.items())
+    }
+
+
 @app.route("/<serial_number>")
 def device_page(serial_number):
-    if serial_number in room_clients and room_clients[serial_number]:
-        return render_template("403.html"), 403
-
     try:
-        res = requests.get(
-            f"http://localhost:8000/v1/devices/device/status/{serial_number}"
-        )
-        if res.status_code == 404:
+        device_data = backend.get_status(serial_number)
+        if device_data is None:
             return render_template("404.html"), 404
-        res.raise_for_status()
-        device_data = res.json()
         if (
             device_data.get("session_status") == "ACTIVE"
             and device_data.get("status_device") == "ONLINE"
@@ -102,6 +77,154 @@ def device_page(serial_number):
         abort(500, description="Backend service unavailable")
 
 
+def start_session(serial: str) -> Session | None:
+    sc = Scrcpy(serial_number=serial, deploy_cache=deploy_cache, port_allocator=ports)
+
+    fanout = VideoFanout(
+        serial,
+        lambda sid, data, ack: socketio.emit("video_data", data, to=sid, callback=ack),
+        maxsize=settings.VIDEO_QUEUE_SIZE,
+        max_batch=settings.VIDEO_MAX_BATCH,
+        policy=QueuePolicy(settings.VIDEO_QUEUE_POLICY.upper()),
+        gop_cache_bytes=settings.GOP_CACHE_MAX_BYTES,
+        viewer_queue_size=settings.VIEWER_QUEUE_SIZE,
+        ack_window=settings.VIEWER_ACK_WINDOW,
+        ack_timeout=settings.VIEWER_ACK_TIMEOUT,
+        metrics=registry.device(serial),
+    )
+
+    # a new session starts within its share of the budget
+    level = max(
+        settings.ADAPTIVE_START_LEVEL,
+        budget_level(settings.HOST_VIDEO_BUDGET, len(pool.sessions) + 1),
+    )
+    quality = QualityController(level, hold=settings.ADAPTIVE_HOLD)
+    started = sc.scrcpy_start(
+        fanout.put,
+        quality.rung.bit_rate,
+        record=False,
+        force_push=settings.SCRCPY_FORCE_PUSH,
+        startup_timeout=settings.SCRCPY_STARTUP_TIMEOUT,
+        max_size=quality.rung.max_size,
+        max_fps=quality.rung.max_fps,
+    )
+    if not started:
+        logger.error(f"Failed to start scrcpy for {serial}")
+        fanout.close()
+        return None
+    return Session(
+        serial, sc, fanout, socketio.start_background_task(fanout.run), quality
+    )
+
+
+pool = SessionPool(
+    start_session,
+    warm=settings.WARM_POOL_ENABLED,
+    max_sessions=settings.WARM_POOL_MAX_SESSIONS,
+    idle_timeout=settings.WARM_POOL_IDLE_TIMEOUT,
+)
+
+
+def warm_pool_task():
+    # keeps a running scrcpy for every ACTIVE device so viewers attach instantly
+    while True:
+        try:
+            active = {
+                device["serial_number"]
+                for device in backend.list_devices()
+                if device["session_status"] == "ACTIVE"
+                and device["status_device"] == "ONLINE"
+            }
+            pool.retire(active)
+            pool.evict_idle()
+            pool.prewarm(sorted(active))
+        except Exception as e:
+            logger.error(f"Warm pool refresh failed: {e}")
+        socketio.sleep(settings.WARM_POOL_INTERVAL)
+
+
+def restart_session(session: Session, rung):
+    serial = session.serial
+    if not rooms.begin_restart(session, rung):
+        return
+    try:
+        ok = session.scrcpy.restart(
+            rung.bit_rate,
+            rung.max_size,
+            rung.max_fps,
+            startup_timeout=settings.SCRCPY_STARTUP_TIMEOUT,
+        )
+    finally:
+        rooms.end_restart(session)
+    if pool.get(serial) is not session:
+        # stopped while restarting
+        session.scrcpy.scrcpy_stop()
+    elif not ok:
+        logger.error(f"Failed to restart scrcpy for {serial}")
+        batch_stop(serial)
+
+
+def adaptive_task():
+    while True:
+        try:
+            sessions = list(pool.sessions.values())
+            min_level = budget_level(settings.HOST_VIDEO_BUDGET, len(sessions))
+            for session, rung in rooms.quality_updates(sessions, min_level):
+                socketio.start_background_task(restart_session, session, rung)
+        except Exception as e:
+            logger.error(f"Adaptive quality update failed: {e}")
+        socketio.sleep(settings.ADAPTIVE_INTERVAL)
+
+
+def batch_start(serial: str) -> bool:
+    # pinned: the sessions of a large batch do not evict each other
+    return pool.start(serial, pin=True) is not None
+
+
+def batch_stop(serial: str) -> bool:
+    for sid in rooms.sids(serial):
+        socketio.server.disconnect(sid, namespace="/")
+    pool.stop(serial)
+    return True
+
+
+batch = BatchOrchestrator(
+    {"start": batch_start, "stop": batch_stop},
+    per_bus_limit=settings.BATCH_PER_BUS_LIMIT,
+    max_concurrency=settings.BATCH_MAX_CONCURRENCY,
+    device_timeout=settings.BATCH_DEVICE_TIMEOUT,
+)
+
+
+@app.route("/sessions/batch", methods=["POST"])
+def batch_sessions():
+    body = request.get_json(silent=True) or {}
+    action = body.get("action")
+    if action not in batch.actions:
+        return {"detail": "action must be start or stop"}, 400
+    try:
+        devices = adb.devices_long()
+    except Exception as e:
+        logger.error(f"ADB devices check failed: {e}")
+        devices = []
+    serials = body.get("serials")
+    if serials is None:
+        if action == "start":
+            serials = [d["serial"] for d in devices if d["state"] == "device"]
+        else:
+            serials = list(pool.sessions)
+    job = batch.submit(action, serials, {d["serial"]: bus_key(d) for d in devices})
+    return job.to_dict(), 202
+
+
+@app.route("/sessions/batch/<job_id>")
+def batch_status(job_id):
+    job = batch.get(job_id)
+    if job is None:
+        return {"detail": "Job not found"}, 404
+    return job.to_dict()
+
+
 @socketio.on("connect")
 def handle_connect(auth=None):
     serial = request.args.get("device")
@@ -113,92 +236,57 @@ def handle_connect(auth=None):
         logger.warning(f"Device {serial} not available via ADB")
         return False
 
-    if serial in room_clients and room_clients[serial]:
-        logger.warning(
-            f"Device {serial} already has active client(s). Rejecting new connection."
-        )
-        return False
-
     sid = request.sid
-    sid_to_device[sid] = serial
-    room_clients.setdefault(serial, set()).add(sid)
+    rooms.join(sid, serial)
+    set_tcp_nodelay(request.environ)
 
-    if serial in active_connections:
-        join_room(serial, sid=sid)
-        return
-
-    local_port = find_free_port()
-
-    sc = Scrcpy(serial_number=serial, local_port=local_port)
-
-    q = queue.Queue()
-
-    def video_callback(data):
-        q.put(data)
-
-    requests.patch(
-        f"http://localhost:8000/v1/devices/update-status/connect/{serial}/disconnect"
-    )
-    sc.scrcpy_start(video_callback, 1024000)
-    label = requests.get(f"http://localhost:8000/v1/devices/device/{serial}")
-    label = label.json()
-    text_log = f"🟢Сессия с девайсом {label['label']} началась 🟢"
-    logger.bind(connection=True).info(text_log)
-    try:
-        send_message_to_telegram(text_log)
-    except:
-        pass
-
-    active_connections[serial] = {
-        "scrcpy": sc,
-        "queue": q,
-        "task": socketio.start_background_task(video_send_task, serial),
-    }
+    session = pool.acquire(serial)
+    if session is None:
+        rooms.leave(sid)
+        return False
 
+    control = rooms.assign_role(sid, serial, request.args.get("mode") == "observe")
+    emit("role", {"control": control})
     join_room(serial, sid=sid)
+    options = recording_options(session)
+    if options:
+        session.scrcpy.start_recording(**options)
+    attach_viewer(session, sid)
 
 
 @socketio.on("disconnect")
 def handle_disconnect():
     sid = request.sid
-    serial = sid_to_device.pop(sid, None)
+    serial = rooms.leave(sid)
     if not serial:
         return
 
     leave_room(serial, sid=sid)
-    clients = room_clients.get(serial, set())
-    clients.discard(sid)
-    requests.patch(
-        f"http://localhost:8000/v1/devices/update-status/connect/{serial}/disconnect"
-    )
-    label = requests.get(f"http://localhost:8000/v1/devices/device/{serial}")
-    label = label.json()
-    text_log = f"🔴Сессия с девайсом {label['label']} закончилась 🔴"
-    logger.bind(connection=True).info(text_log)
-    try:
-        send_message_to_telegram(text_log)
-    except:
-        pass
-
-    if not clients:
-        conn = active_connections.pop(serial, None)
-        if conn:
-            logger.info(f"Stopping scrcpy for {serial} (no clients)")
-            conn["scrcpy"].scrcpy_stop()
-        room_clients.pop(serial, None)
-    else:
-        logger.debug(f"Client {sid} left, still {len(clients)} clients for {serial}")
-
-
-@socketio.on("control_data")
-def handle_control_data(data):
+    session = pool.get(serial)
+    if session:
+        session.fanout.unsubscribe(sid)
+    session = pool.release(serial)
+    if session and not session.viewers:
+        session.scrcpy.stop_recording()
+
+
+@socketio.on("control_batch")
+def handle_control_batch(data):
     sid = request.sid
-    serial = sid_to_device.get(sid)
-    if not serial:
-        return
-    conn = active_connections.get(serial)
-    if conn:
-        conn["scrcpy"].scrcpy_send_control(data)
+    return rooms.control_batch(sid, pool.get(rooms.serial_of(sid)), data)
+
+
+@socketio.on("client_stats")
+def handle_client_stats(data):
+    sid = request.sid
+    rooms.client_stats(sid, pool.get(rooms.serial_of(sid)), data)
+
+
+@socketio.on("control_ping")
+def handle_control_ping():
+    # acked from the same handler pool as control_batch, the page measures
+    # the round trip and reports it in client_stats
+    return True
 
 
 @socketio.on("inactivity_timeout")
@@ -213,5 +301,17 @@ if __name__ == "__main__":
             rf"{os.getcwd()}\host_server\device_support.py",
         ]
     )
+    notifier.start()
+    ports.reconcile(adb)
+    if settings.WARM_POOL_ENABLED:
+        socketio.start_background_task(warm_pool_task)
+    if settings.ADAPTIVE_QUALITY:
+        socketio.start_background_task(adaptive_task)
+    if settings.METRICS_PORT:
+        WSGIServer(
+            ("0.0.0.0", settings.METRICS_PORT),
+            registry.wsgi_app(lambda: session_gauges(list(pool.sessions.items()))),
+            log=None,
+        ).start()
     logger.info(f"Starting server on port 5000")
     socketio.run(app, host="0.0.0.0", port=5000)
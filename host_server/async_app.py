@@ -0,0 +1,367 @@
+import asyncio
+import os
+import subprocess
+from urllib.parse import parse_qs
+import jinja2
+import socketio
+from aiohttp import web
+from loguru import logger
+from async_scrcpy import AsyncScrcpy
+from fanout import AsyncVideoFanout
+from packet_queue import QueuePolicy
+from deploy_cache import ServerDeployCache
+from adb_client import adb
+from port_allocator import PortAllocator
+from backend_client import BackendClient, Dispatcher
+from session_pool import AsyncSession, AsyncSessionPool
+from batch_jobs import BatchOrchestrator, bus_key
+from adaptive import QualityController, budget_level
+from rooms import Rooms, attach_viewer, recording_options
+from metrics import registry, session_gauges
+from config import settings
+from utils import is_device_available, notifier, report_session
+
+# The host server on one asyncio loop: python-socketio AsyncServer on aiohttp
+# with the same events as app.py, sessions read by AsyncScrcpy tasks.
+# Run it instead of app.py: python host_server/async_app.py
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# the readers write to the recorder from the loop, a full BLOCK queue would
+# stop every session on the host; SPILL never blocks and keeps every packet
+if QueuePolicy(settings.RECORD_QUEUE_POLICY.upper()) == QueuePolicy.BLOCK:
+    raise SystemExit("RECORD_QUEUE_POLICY=BLOCK is not supported by async_app.py, use SPILL")
+
+background: set[asyncio.Task] = set()
+deploy_cache = ServerDeployCache()
+backend = BackendClient(
+    settings.BACKEND_URL, settings.BACKEND_TIMEOUT, settings.BACKEND_RETRIES
+)
+dispatcher = Dispatcher()
+rooms = Rooms(
+    lambda serial, started: dispatcher.submit(report_session, backend, serial, started)
+)
+ports = PortAllocator(settings.FORWARD_PORT_START, settings.FORWARD_PORT_END)
+
+sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*")
+app = web.Application()
+sio.attach(app)
+templates = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(os.path.join(HERE, "templates")),
+    autoescape=True,
+)
+routes = web.RouteTableDef()
+
+
+def spawn(coro) -> asyncio.Task:
+    # the loop keeps only weak references to tasks
+    task = asyncio.create_task(coro)
+    background.add(task)
+    task.add_done_callback(background.discard)
+    return task
+
+
+def render(name: str, status: int = 200, **context) -> web.Response:
+    return web.Response(
+        text=templates.get_template(name).render(**context),
+        status=status,
+        content_type="text/html",
+    )
+
+
+@routes.get("/favicon.ico")
+async def favicon(request):
+    return web.Response(status=204, content_type="image/x-icon")
+
+
+@routes.get("/stats")
+async def queue_stats(request):
+    return web.json_response(
+        {
+            serial: {**session.stats(), "controller": rooms.controller(serial)}
+            for serial, session in list(pool.sessions.items())
+        }
+    )
+
+
+@routes.post("/sessions/batch")
+async def batch_sessions(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        body = {}
+    action = body.get("action") if isinstance(body, dict) else None
+    if action not in batch.actions:
+        return web.json_response({"detail": "action must be start or stop"}, status=400)
+    try:
+        devices = await asyncio.to_thread(adb.devices_long)
+    except Exception as e:
+        logger.error(f"ADB devices check failed: {e}")
+        devices = []
+    serials = body.get("serials")
+    if serials is None:
+        if action == "start":
+            serials = [d["serial"] for d in devices if d["state"] == "device"]
+        else:
+            serials = list(pool.sessions)
+    job = batch.submit(action, serials, {d["serial"]: bus_key(d) for d in devices})
+    return web.json_response(job.to_dict(), status=202)
+
+
+@routes.get("/sessions/batch/{job_id}")
+async def batch_status(request):
+    job = batch.get(request.match_info["job_id"])
+    if job is None:
+        return web.json_response({"detail": "Job not found"}, status=404)
+    return web.json_response(job.to_dict())
+
+
+@routes.get("/{serial_number}")
+async def device_page(request):
+    serial_number = request.match_info["serial_number"]
+    try:
+        device_data = await asyncio.to_thread(backend.get_status, serial_number)
+    except Exception as e:
+        logger.error(f"Failed to fetch device status for {serial_number}: {e}")
+        raise web.HTTPInternalServerError(text="Backend service unavailable")
+    if device_data is None:
+        return render("404.html", status=404)
+    if (
+        device_data.get("session_status") == "ACTIVE"
+        and device_data.get("status_device") == "ONLINE"
+    ):
+        return render("index.html", title=device_data.get("label", serial_number))
+    return web.json_response({"status": "Device not available or offline"})
+
+
+async def start_session(serial: str) -> AsyncSession | None:
+    sc = AsyncScrcpy(serial_number=serial, deploy_cache=deploy_cache, port_allocator=ports)
+
+    fanout = AsyncVideoFanout(
+        serial,
+        lambda sid, data, ack: sio.emit("video_data", data, to=sid, callback=ack),
+        maxsize=settings.VIDEO_QUEUE_SIZE,
+        max_batch=settings.VIDEO_MAX_BATCH,
+        policy=QueuePolicy(settings.VIDEO_QUEUE_POLICY.upper()),
+        gop_cache_bytes=settings.GOP_CACHE_MAX_BYTES,
+        viewer_queue_size=settings.VIEWER_QUEUE_SIZE,
+        ack_window=settings.VIEWER_ACK_WINDOW,
+        ack_timeout=settings.VIEWER_ACK_TIMEOUT,
+        metrics=registry.device(serial),
+    )
+
+    # a new session starts within its share of the budget
+    level = max(
+        settings.ADAPTIVE_START_LEVEL,
+        budget_level(settings.HOST_VIDEO_BUDGET, len(pool.sessions) + 1),
+    )
+    quality = QualityController(level, hold=settings.ADAPTIVE_HOLD)
+    started = await sc.scrcpy_start(
+        fanout.put,
+        quality.rung.bit_rate,
+        record=False,
+        force_push=settings.SCRCPY_FORCE_PUSH,
+        startup_timeout=settings.SCRCPY_STARTUP_TIMEOUT,
+        max_size=quality.rung.max_size,
+        max_fps=quality.rung.max_fps,
+    )
+    if not started:
+        logger.error(f"Failed to start scrcpy for {serial}")
+        fanout.close()
+        return None
+    return AsyncSession(serial, sc, fanout, spawn(fanout.run()), quality)
+
+
+pool = AsyncSessionPool(
+    start_session,
+    warm=settings.WARM_POOL_ENABLED,
+    max_sessions=settings.WARM_POOL_MAX_SESSIONS,
+    idle_timeout=settings.WARM_POOL_IDLE_TIMEOUT,
+)
+
+
+async def warm_pool_task():
+    # keeps a running scrcpy for every ACTIVE device so viewers attach instantly
+    while True:
+        try:
+            active = {
+                device["serial_number"]
+                for device in await asyncio.to_thread(backend.list_devices)
+                if device["session_status"] == "ACTIVE"
+                and device["status_device"] == "ONLINE"
+            }
+            await pool.retire(active)
+            await pool.evict_idle()
+            await pool.prewarm(sorted(active))
+        except Exception as e:
+            logger.error(f"Warm pool refresh failed: {e}")
+        await asyncio.sleep(settings.WARM_POOL_INTERVAL)
+
+
+async def restart_session(session: AsyncSession, rung):
+    serial = session.serial
+    if not rooms.begin_restart(session, rung):
+        return
+    try:
+        ok = await session.scrcpy.restart(
+            rung.bit_rate,
+            rung.max_size,
+            rung.max_fps,
+            startup_timeout=settings.SCRCPY_STARTUP_TIMEOUT,
+        )
+    finally:
+        rooms.end_restart(session)
+    if pool.get(serial) is not session:
+        # stopped while restarting
+        await session.scrcpy.scrcpy_stop()
+    elif not ok:
+        logger.error(f"Failed to restart scrcpy for {serial}")
+        await stop_device(serial)
+
+
+async def adaptive_task():
+    while True:
+        try:
+            sessions = list(pool.sessions.values())
+            min_level = budget_level(settings.HOST_VIDEO_BUDGET, len(sessions))
+            for session, rung in rooms.quality_updates(sessions, min_level):
+                spawn(restart_session(session, rung))
+        except Exception as e:
+            logger.error(f"Adaptive quality update failed: {e}")
+        await asyncio.sleep(settings.ADAPTIVE_INTERVAL)
+
+
+async def stop_device(serial: str):
+    for sid in rooms.sids(serial):
+        await sio.disconnect(sid)
+    await pool.stop(serial)
+
+
+def run_on_loop(loop, coro):
+    # batch jobs run on orchestrator threads, the sessions live on the loop
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def make_batch(loop) -> BatchOrchestrator:
+    return BatchOrchestrator(
+        {
+            "start": lambda serial: run_on_loop(loop, pool.start(serial, pin=True)) is not None,
+            "stop": lambda serial: run_on_loop(loop, stop_device(serial)) or True,
+        },
+        per_bus_limit=settings.BATCH_PER_BUS_LIMIT,
+        max_concurrency=settings.BATCH_MAX_CONCURRENCY,
+        device_timeout=settings.BATCH_DEVICE_TIMEOUT,
+    )
+
+
+batch: BatchOrchestrator = None
+
+
+@sio.on("connect")
+async def handle_connect(sid, environ, auth=None):
+    args = parse_qs(environ.get("QUERY_STRING", ""))
+    serial = args.get("device", [None])[0]
+    if not serial:
+        logger.warning("Connect without device parameter")
+        return False
+
+    if not await asyncio.to_thread(is_device_available, serial):
+        logger.warning(f"Device {serial} not available via ADB")
+        return False
+
+    # aiohttp and asyncio transports already run with TCP_NODELAY
+    rooms.join(sid, serial)
+    session = await pool.acquire(serial)
+    if session is None:
+        rooms.leave(sid)
+        return False
+
+    control = rooms.assign_role(sid, serial, args.get("mode", [None])[0] == "observe")
+    await sio.emit("role", {"control": control}, to=sid)
+    await sio.enter_room(sid, serial)
+    options = recording_options(session)
+    if options:
+        await asyncio.to_thread(session.scrcpy.start_recording, **options)
+    attach_viewer(session, sid)
+
+
+@sio.on("disconnect")
+async def handle_disconnect(sid, *args):
+    serial = rooms.leave(sid)
+    if not serial:
+        return
+
+    await sio.leave_room(sid, serial)
+    session = pool.get(serial)
+    if session:
+        session.fanout.unsubscribe(sid)
+    session = await pool.release(serial)
+    if session and not session.viewers:
+        await asyncio.to_thread(session.scrcpy.stop_recording)
+
+
+@sio.on("control_batch")
+async def handle_control_batch(sid, data):
+    return rooms.control_batch(sid, pool.get(rooms.serial_of(sid)), data)
+
+
+@sio.on("client_stats")
+async def handle_client_stats(sid, data):
+    rooms.client_stats(sid, pool.get(rooms.serial_of(sid)), data)
+
+
+@sio.on("control_ping")
+async def handle_control_ping(sid):
+    return True
+
+
+@sio.on("inactivity_timeout")
+async def handle_inactivity_timeout(sid):
+    await handle_disconnect(sid)
+
+
+async def metrics_handler(request):
+    body = registry.render(session_gauges(list(pool.sessions.items()))).encode()
+    return web.Response(
+        body=body,
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def on_startup(app):
+    global batch
+    batch = make_batch(asyncio.get_running_loop())
+    notifier.start()
+    await asyncio.to_thread(ports.reconcile, adb)
+    if settings.WARM_POOL_ENABLED:
+        spawn(warm_pool_task())
+    if settings.ADAPTIVE_QUALITY:
+        spawn(adaptive_task())
+    if settings.METRICS_PORT:
+        # served on its own port so a scrape never queues behind socket.io
+        metrics_app = web.Application()
+        metrics_app.router.add_get("/metrics", metrics_handler)
+        runner = web.AppRunner(metrics_app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "0.0.0.0", settings.METRICS_PORT).start()
+
+
+async def on_cleanup(app):
+    await pool.stop_all()
+
+
+app.router.add_static("/static", os.path.join(HERE, "static"))
+app.add_routes(routes)
+app.on_startup.append(on_startup)
+app.on_cleanup.append(on_cleanup)
+
+
+if __name__ == "__main__":
+    subprocess.Popen(
+        [
+            rf"{os.getcwd()}\venv\Scripts\python.exe",
+            rf"{os.getcwd()}\host_server\device_support.py",
+        ]
+    )
+    logger.info(f"Starting asyncio server on port 5000")
+    web.run_app(app, host="0.0.0.0", port=5000, access_log=None)
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from loguru import logger
+from adb_client import AdbError
+from demuxer import VideoDemuxer
+from packet_queue import QueuePolicy
+from recorder import RecordMode
+from scrcpy import Scrcpy
+
+
+class AsyncScrcpy(Scrcpy):
+    # one session on the asyncio loop: the server output and the video, audio
+    # and control sockets are asyncio streams read by tasks, no thread per
+    # socket. adb requests (push, forward) are short and once per start, they
+    # run in the default executor; the recorder keeps its writer thread, file
+    # and ffmpeg pipe writes block
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.video_reader = self.video_writer = None
+        self.audio_reader = self.audio_writer = None
+        self.control_reader = self.control_writer = None
+        self.server_writer = None
+        self.tasks: list[asyncio.Task] = []
+
+    async def run_server(self, conn):
+        try:
+            reader, self.server_writer = await asyncio.open_connection(sock=conn.sock)
+            # the shell service merges stdout and stderr
+            while not self.stop:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.log_server_line(line)
+        except OSError as e:
+            if not self.stop:
+                logger.error(f"scrcpy server on {self.serial_number} failed: {e}")
+        finally:
+            self.server_exited = True
+
+    async def connect_when_ready(self, deadline: float):
+        # see Scrcpy.connect_when_ready: the dummy byte tells a listening
+        # server from adb accepting the forward on its own
+        delay = 0.05
+        while not self.stop and time.monotonic() < deadline:
+            if self.server_exited:
+                logger.error(f"scrcpy server on {self.serial_number} exited early")
+                return None
+            writer = None
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection("localhost", self.local_port), 1.0
+                )
+                timeout = max(0.1, min(1.0, deadline - time.monotonic()))
+                if await asyncio.wait_for(reader.read(1), timeout):
+                    return reader, writer
+            except (OSError, asyncio.TimeoutError):
+                pass
+            if writer:
+                writer.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        return None
+
+    async def connect_streams(self, startup_timeout) -> bool:
+        self.server_exited = False
+        try:
+            self.server_conn = await asyncio.to_thread(
+                self.adb.open_shell, self.serial_number, self.server_command()
+            )
+        except (AdbError, OSError) as e:
+            logger.error(f"scrcpy server on {self.serial_number} failed: {e}")
+            return False
+        self.tasks.append(asyncio.create_task(self.run_server(self.server_conn)))
+
+        video = await self.connect_when_ready(time.monotonic() + startup_timeout)
+        if not video:
+            logger.error(f"scrcpy server on {self.serial_number} is not ready")
+            return False
+        self.video_reader, self.video_writer = video
+        try:
+            self.audio_reader, self.audio_writer = await asyncio.open_connection(
+                "localhost", self.local_port
+            )
+            self.control_reader, self.control_writer = await asyncio.open_connection(
+                "localhost", self.local_port
+            )
+        except OSError as e:
+            logger.error(f"scrcpy sockets of {self.serial_number} failed: {e}")
+            return False
+        return True
+
+    def start_readers(self):
+        self.tasks += [
+            asyncio.create_task(self.receive_video_data()),
+            asyncio.create_task(self.drain(self.audio_reader)),
+            asyncio.create_task(self.drain(self.control_reader)),
+        ]
+
+    async def receive_video_data(self):
+        logger.info("Receiving video data (H.264)...")
+        while not self.stop:
+            try:
+                data = await self.video_reader.read(262144)
+            except OSError as e:
+                if not self.stop:
+                    logger.error(f"Video socket error: {e}")
+                break
+            if not data:
+                break
+            for packet in self.demuxer.feed(data):
+                self.track_packet(packet)
+                await self.video_callback(packet)
+        logger.warning("Video data reception stopped")
+
+    async def drain(self, reader):
+        # audio and device messages are not used, they are read so the
+        # server never blocks on a full socket
+        try:
+            while not self.stop and await reader.read(65536):
+                pass
+        except OSError:
+            pass
+
+    async def scrcpy_start(
+        self,
+        video_callback,
+        video_bit_rate,
+        record=True,
+        record_mode=RecordMode.REMUX,
+        record_format="mp4",
+        record_queue_size=512,
+        record_queue_policy=QueuePolicy.SPILL,
+        force_push=False,
+        startup_timeout=10.0,
+        max_size=0,
+        max_fps=0,
+    ):
+        # video_callback is a coroutine function, the reader awaits it
+        self.reset(video_callback, video_bit_rate, max_size, max_fps)
+        if not await asyncio.to_thread(self.push_server_to_device, force_push):
+            return False
+
+        try:
+            await asyncio.to_thread(self.setup_adb_forward)
+        except (AdbError, OSError) as e:
+            logger.error(f"adb forward for {self.serial_number} failed: {e}")
+            return False
+        if not await self.connect_streams(startup_timeout):
+            await self.scrcpy_stop()
+            return False
+        self.time_to_ready = time.monotonic() - self.started_at
+
+        if record:
+            await asyncio.to_thread(
+                self.start_recording,
+                record_mode,
+                record_format,
+                record_queue_size,
+                record_queue_policy,
+            )
+        self.start_readers()
+        return True
+
+    async def restart(self, video_bit_rate, max_size=0, max_fps=0, startup_timeout=10.0):
+        record_options = self.record_options if self.recorder else None
+        await self.shutdown_streams()
+        await asyncio.to_thread(self.stop_recording)
+        self.stop = False
+        self.video_bit_rate = video_bit_rate
+        self.max_size = max_size
+        self.max_fps = max_fps
+        self.demuxer = VideoDemuxer()
+        self.restarts += 1
+        if not await self.connect_streams(startup_timeout):
+            return False
+        if record_options:
+            await asyncio.to_thread(self.start_recording, **record_options)
+        self.start_readers()
+        return True
+
+    async def scrcpy_stop(self):
+        await self.shutdown_streams()
+        await asyncio.to_thread(self.stop_recording)
+        await asyncio.to_thread(self.remove_adb_forward)
+
+    async def shutdown_streams(self):
+        self.stop = True
+        # closing the shell connection hangs up the server process
+        for writer in (
+            self.video_writer,
+            self.audio_writer,
+            self.control_writer,
+            self.server_writer,
+        ):
+            if writer:
+                writer.close()
+        if self.server_conn and not self.server_writer:
+            self.server_conn.close()
+        tasks, self.tasks = self.tasks, []
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.video_reader = self.video_writer = None
+        self.audio_reader = self.audio_writer = None
+        self.control_reader = self.control_writer = None
+        self.server_writer = self.server_conn = None
+
+    def scrcpy_send_control(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        writer = self.control_writer
+        if not writer or writer.is_closing():
+            return
+        # buffered by the transport, the loop writes it without waiting
+        writer.write(data)
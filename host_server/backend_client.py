@@ -0,0 +1,88 @@
+import queue
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from loguru import logger
+
+
+class BackendClient:
+    def __init__(
+        self,
+        base_url: str = "http://localhost:8000",
+        timeout: float = 5.0,
+        retries: int = 3,
+        pool_size: int = 10,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (min(timeout, 2.0), timeout)  # connect, read
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=None,  # status updates are idempotent, PATCH included
+        )
+        adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, f"{self.base_url}{path}", **kwargs)
+
+    def get_json(self, path: str, **kwargs):
+        # None for an unknown device
+        res = self.request("GET", path, **kwargs)
+        if res.status_code == 404:
+            return None
+        res.raise_for_status()
+        return res.json()
+
+    def list_devices(self) -> list[dict]:
+        return self.get_json("/v1/devices/") or []
+
+    def get_device(self, serial: str) -> dict | None:
+        return self.get_json(f"/v1/devices/{serial}")
+
+    def get_status(self, serial: str) -> dict | None:
+        return self.get_json(f"/v1/devices/status-and-label/{serial}")
+
+    def set_connection_status(self, serial: str, status: str):
+        res = self.request(
+            "PATCH",
+            f"/v1/devices/edit-status/connect/{serial}",
+            params={"status": status},
+        )
+        res.raise_for_status()
+
+
+class Dispatcher:
+    # one worker keeps jobs in submission order, so a disconnect report never
+    # overtakes the connect report of the same session
+    def __init__(self, maxsize: int = 1000):
+        self.jobs = queue.Queue(maxsize)
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._worker, daemon=True)
+            self.thread.start()
+        return self
+
+    def submit(self, fn, *args, **kwargs) -> bool:
+        self.start()
+        try:
+            self.jobs.put_nowait((fn, args, kwargs))
+            return True
+        except queue.Full:
+            logger.warning(f"Background queue is full, dropping {fn.__name__}")
+            return False
+
+    def _worker(self):
+        while True:
+            fn, args, kwargs = self.jobs.get()
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Background job {fn.__name__} failed: {e}")
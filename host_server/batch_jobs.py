@@ -0,0 +1,155 @@
+import itertools
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from loguru import logger
+
+PENDING = "pending"
+RUNNING = "running"
+OK = "ok"
+FAILED = "failed"
+TIMEOUT = "timeout"
+
+
+def bus_key(device: dict) -> str:
+    # usb:1-1.4 is port path 1.4 on bus 1; devices over tcp share the network
+    usb = device.get("usb")
+    if usb:
+        return f"usb{usb.split('-')[0]}"
+    return "network"
+
+
+class BatchJob:
+    def __init__(self, action: str, serials: list[str]):
+        self.id = uuid.uuid4().hex[:12]
+        self.action = action
+        self.states = {serial: PENDING for serial in serials}
+        self.errors: dict[str, str] = {}
+        self.created_at = time.time()
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def set(self, serial: str, state: str, error: str | None = None):
+        with self.lock:
+            self.states[serial] = state
+            if error:
+                self.errors[serial] = error
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            counts = {state: 0 for state in (PENDING, RUNNING, OK, FAILED, TIMEOUT)}
+            for state in self.states.values():
+                counts[state] += 1
+            return {
+                "job_id": self.id,
+                "action": self.action,
+                "total": len(self.states),
+                "done": counts[OK] + counts[FAILED] + counts[TIMEOUT],
+                **counts,
+                "finished": self.finished,
+                "elapsed": (self.finished_at or time.time()) - self.created_at,
+                "devices": dict(self.states),
+                "errors": dict(self.errors),
+            }
+
+
+class BatchOrchestrator:
+    def __init__(
+        self,
+        actions: dict,
+        per_bus_limit: int = 4,
+        max_concurrency: int = 16,
+        device_timeout: float = 30,
+        keep_jobs: int = 50,
+    ):
+        self.actions = actions  # name -> fn(serial) returning True on success
+        self.per_bus_limit = per_bus_limit
+        self.max_concurrency = max_concurrency
+        self.device_timeout = device_timeout
+        self.keep_jobs = keep_jobs
+        self.jobs: OrderedDict[str, BatchJob] = OrderedDict()
+        self.bus_slots: dict[str, threading.Semaphore] = {}
+        self.slots = threading.Semaphore(max_concurrency)
+        self.lock = threading.Lock()
+
+    def get(self, job_id: str) -> BatchJob | None:
+        return self.jobs.get(job_id)
+
+    def submit(self, action: str, serials: list[str], buses: dict[str, str]) -> BatchJob:
+        job = BatchJob(action, list(dict.fromkeys(serials)))
+        with self.lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.keep_jobs:
+                self.jobs.popitem(last=False)
+        threading.Thread(target=self._run, args=(job, buses), daemon=True).start()
+        return job
+
+    def _bus_slot(self, bus: str) -> threading.Semaphore:
+        # the limits are shared by all jobs: a USB hub does not get faster
+        # because two batches run at once
+        with self.lock:
+            if bus not in self.bus_slots:
+                self.bus_slots[bus] = threading.Semaphore(self.per_bus_limit)
+            return self.bus_slots[bus]
+
+    def _run(self, job: BatchJob, buses: dict[str, str]):
+        # interleave buses so the first workers are not all queued on one hub
+        by_bus: dict[str, list[str]] = {}
+        for serial in job.states:
+            by_bus.setdefault(buses.get(serial, "network"), []).append(serial)
+        order = [
+            serial
+            for group in itertools.zip_longest(*by_bus.values())
+            for serial in group
+            if serial is not None
+        ]
+        workers = [
+            threading.Thread(
+                target=self._device,
+                args=(job, serial, buses.get(serial, "network")),
+                daemon=True,
+            )
+            for serial in order
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        job.finished_at = time.time()
+        summary = job.to_dict()
+        logger.info(
+            f"Batch {job.action} {job.id}: {summary[OK]} ok, {summary[FAILED]} failed, "
+            f"{summary[TIMEOUT]} timed out in {summary['elapsed']:.1f} s"
+        )
+
+    def _device(self, job: BatchJob, serial: str, bus: str):
+        fn = self.actions[job.action]
+        with self._bus_slot(bus), self.slots:
+            job.set(serial, RUNNING)
+            result = {}
+
+            def call():
+                try:
+                    result["ok"] = bool(fn(serial))
+                except Exception as e:
+                    result["error"] = str(e) or type(e).__name__
+
+            # the call cannot be interrupted; after the timeout it keeps its
+            # slot until it returns so the bus limit still holds
+            call_thread = threading.Thread(target=call, daemon=True)
+            call_thread.start()
+            call_thread.join(self.device_timeout)
+            if call_thread.is_alive():
+                job.set(serial, TIMEOUT, f"no result after {self.device_timeout:.0f} s")
+                call_thread.join()
+            elif "error" in result:
+                job.set(serial, FAILED, result["error"])
+            elif result.get("ok"):
+                job.set(serial, OK)
+            else:
+                job.set(serial, FAILED, f"{job.action} failed")
@@ -0,0 +1,110 @@
+"""QualityController on a simulated viewer link, against the old fixed
+1 Mbps, and the budget split for a number of sessions.
+
+The link trace is a list of (seconds, capacity in bits/s). Video the link
+cannot carry piles up in the viewer buffer; past its size (VIEWER_QUEUE_SIZE
+packets at 60 fps) the buffer drops frames. A rung change costs --restart
+seconds without video while scrcpy restarts. The clock is simulated, the
+run takes no wall time.
+
+Usage: python benchmarks/bench_adaptive.py [--interval 2] [--restart 1.5]
+"""
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import adaptive
+from adaptive import LADDER, QualityController, budget_level
+
+TRACE = [  # office wifi, a congested minute, then a good link
+    (60, 3_000_000),
+    (60, 600_000),
+    (60, 10_000_000),
+    (60, 1_500_000),
+]
+BUFFER_SECONDS = 1.0  # 60 packets at 60 fps
+
+
+class Clock:
+    now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+def simulate(controller: QualityController | None, interval: float, restart: float) -> dict:
+    clock = Clock()
+    adaptive.time = clock
+    if controller:
+        controller.changed_at = 0.0
+    tick = 0.05
+    bit_rate = LADDER[3].bit_rate
+    backlog = 0.0  # bits waiting in the viewer buffer
+    dropped = 0
+    delivered = 0.0
+    stalled = 0.0
+    lag = []
+    changes = 0
+    paused_until = 0.0
+    next_update = interval
+    for seconds, capacity in TRACE:
+        end = clock.now + seconds
+        while clock.now < end - 1e-9:
+            if clock.now >= paused_until:
+                backlog += bit_rate * tick
+            else:
+                stalled += tick
+            sent = min(capacity * tick, backlog)
+            backlog -= sent
+            delivered += sent
+            if backlog > bit_rate * BUFFER_SECONDS:
+                # the viewer queue drops everything up to the next keyframe
+                dropped += 1
+                backlog = 0.0
+            lag.append(backlog / capacity)
+            clock.now += tick
+            if controller and clock.now >= next_update:
+                next_update += interval
+                sample = {"dropped": dropped, "depth": backlog / bit_rate * 60, "maxsize": 60}
+                rung = controller.update(sample)
+                if rung:
+                    bit_rate = rung.bit_rate
+                    backlog = 0.0  # the restart discards the old stream
+                    paused_until = clock.now + restart
+                    changes += 1
+    total = sum(seconds for seconds, _ in TRACE)
+    lag.sort()
+    return {
+        "kbps": delivered / total / 1000,
+        "drop events": dropped,
+        "lag p95 ms": lag[int(len(lag) * 0.95)] * 1000,
+        "restarts": changes,
+        "stalled s": stalled,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--interval", type=float, default=2.0)
+    parser.add_argument("--restart", type=float, default=1.5)
+    parser.add_argument("--budget", type=int, default=200_000_000)
+    args = parser.parse_args()
+
+    print("link: " + ", ".join(f"{s}s at {c / 1e6:g} Mbps" for s, c in TRACE))
+    for name, controller in (("fixed", None), ("adaptive", QualityController())):
+        result = simulate(controller, args.interval, args.restart)
+        print(f"{name:<9} " + "  ".join(
+            f"{k} {v:.0f}" if isinstance(v, float) else f"{k} {v}" for k, v in result.items()
+        ))
+    print(f"budget {args.budget / 1e6:g} Mbps:")
+    for sessions in (10, 50, 100, 200, 400, 1000):
+        rung = LADDER[budget_level(args.budget, sessions)]
+        print(f"  {sessions:>5} sessions  {rung.bit_rate / 1e6:g} Mbps "
+              f"max_size {rung.max_size or 'device'} max_fps {rung.max_fps}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Calls per second of the in-process adb client against the per-call
+subprocess path.
+
+The client talks to benchmarks/fake_adb_server.py. The subprocess path runs
+a real adb binary against the same fake server (adb -P <port>) when one is
+found on PATH or given with --adb; otherwise it falls back to the
+benchmarks/fake_adb.py stub, whose interpreter startup makes each call more
+expensive than a real adb fork/exec.
+
+Usage: python benchmarks/bench_adb_client.py [--seconds 3] [--threads 8]
+           [--latency 0] [--adb /path/to/adb]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from adb_client import AdbClient
+from fake_adb_server import FakeAdbServer
+
+SERIAL = "emulator-5554"
+
+
+def client_calls(client: AdbClient) -> dict:
+    return {
+        "devices": lambda: client.devices(),
+        "forward": lambda: client.forward(SERIAL, "tcp:27183", "localabstract:scrcpy"),
+        "shell stat": lambda: client.shell(SERIAL, "stat -c %s /data/local/tmp/x"),
+    }
+
+
+def subprocess_calls(adb_cmd: list[str]) -> dict:
+    def run(*args):
+        subprocess.run([*adb_cmd, *args], capture_output=True)
+
+    return {
+        "devices": lambda: run("devices"),
+        "forward": lambda: run("-s", SERIAL, "forward", "tcp:27183", "localabstract:scrcpy"),
+        "shell stat": lambda: run("-s", SERIAL, "shell", "stat -c %s /data/local/tmp/x"),
+    }
+
+
+def rate(call, seconds: float, threads: int) -> float:
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        count = 0
+        while time.perf_counter() < deadline:
+            call()
+            count += 1
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        total = sum(executor.map(lambda _: worker(), range(threads)))
+    return total / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--adb", default=shutil.which("adb"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        server = FakeAdbServer(directory, [SERIAL], latency=args.latency).start()
+        if args.adb:
+            adb_cmd = [args.adb, "-P", str(server.port)]
+            label = "adb binary"
+        else:
+            os.environ["FAKE_ADB_ROOT"] = directory
+            os.environ["FAKE_ADB_LATENCY"] = str(args.latency)
+            os.environ["FAKE_ADB_SERIALS"] = SERIAL
+            adb_cmd = [sys.executable, os.path.join(HERE, "fake_adb.py")]
+            label = "fake_adb.py stub"
+        paths = {
+            "AdbClient": client_calls(AdbClient(port=server.port)),
+            f"subprocess ({label})": subprocess_calls(adb_cmd),
+        }
+        for name, calls in paths.items():
+            for call_name, call in calls.items():
+                print(
+                    f"{name:<30} {call_name:<11} "
+                    f"{rate(call, args.seconds, args.threads):9.0f} calls/s"
+                )
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Drags on the control channel: one socket.io message and one device write
+per event (control_data, with and without the 20 ms throttle input.js had)
+against one length-prefixed control_batch per animation frame with the moves
+coalesced on the host.
+
+A Flask-SocketIO gevent server (this script with --serve) forwards control
+input to a fake device, a TCP reader in this process that counts the writes
+that arrive. Every client drags a pointer back and forth, producing move
+events at --rate Hz with a down and an up every second. Latency is from the
+input event (the oldest one of a batch) to the ack the server sends once the
+data was written to the device socket.
+
+Usage: python benchmarks/bench_control.py [--clients 10] [--rate 240] [--seconds 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from control import LENGTH
+
+TOUCH = struct.Struct(">BBQiiHHHii")
+FRAME = 1 / 60
+THROTTLE = 0.02
+IDLE = 0.05  # input after a pause is sent without waiting for the frame
+MODES = ("event", "throttle", "batch")
+
+
+def touch(action: int, pointer: int, x: int, y: int) -> bytes:
+    return TOUCH.pack(2, action, pointer, x, y, 1080, 2400, 0xFFFF if action != 1 else 0, 0, 0)
+
+
+def serve(port: int, mode: str, device_port: int):
+    from gevent import monkey
+
+    monkey.patch_all()
+
+    from flask import Flask
+    from flask_socketio import SocketIO
+    from loguru import logger
+    from control import coalesce_moves, split_batch
+
+    logger.remove()
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode="gevent")
+    device = socket.create_connection(("127.0.0.1", device_port))
+    device.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    counts = {"messages": 0, "writes": 0, "coalesced": 0}
+
+    @socketio.on("control_data")
+    def control_data(data):
+        counts["messages"] += 1
+        counts["writes"] += 1
+        device.sendall(data)
+        return True
+
+    @socketio.on("control_batch")
+    def control_batch(data):
+        messages = split_batch(data)
+        kept = coalesce_moves(messages)
+        counts["messages"] += len(messages)
+        counts["coalesced"] += len(messages) - len(kept)
+        counts["writes"] += 1
+        device.sendall(b"".join(kept))
+        return True
+
+    @app.route("/stats")
+    def stats():
+        return {"cpu": time.process_time(), "time": time.monotonic(), **counts}
+
+    socketio.run(app, host="127.0.0.1", port=port, log_output=False)
+
+
+def device_reader(listener: socket.socket, received: dict):
+    conn, _ = listener.accept()
+    while True:
+        data = conn.recv(65536)
+        if not data:
+            break
+        received["reads"] += 1
+        received["bytes"] += len(data)
+
+
+async def drag(url: str, mode: str, pointer: int, rate: float, seconds: float, latency: list, sent: list):
+    import socketio
+
+    client = socketio.AsyncClient()
+    await client.connect(url, transports=["websocket"])
+    loop = asyncio.get_running_loop()
+    pending: list[bytes] = []
+    pending_since = 0.0
+    last_sent = 0.0
+
+    def acked(since):
+        return lambda *args: latency.append(loop.time() - since)
+
+    async def emit(event: str, data: bytes, since: float):
+        sent.append(1)
+        await client.emit(event, data, callback=acked(since))
+
+    async def flush():
+        nonlocal last_sent
+        batch = b"".join(LENGTH.pack(len(m)) + m for m in pending)
+        pending.clear()
+        last_sent = loop.time()
+        await emit("control_batch", batch, pending_since)
+
+    async def on_event(message: bytes, move: bool):
+        nonlocal pending_since, last_sent
+        now = loop.time()
+        if mode == "event":
+            await emit("control_data", message, now)
+        elif mode == "throttle":
+            if move and now - last_sent < THROTTLE:
+                return
+            last_sent = now
+            await emit("control_data", message, now)
+        else:
+            if not pending:
+                pending_since = now
+            pending.append(message)
+            if len(pending) == 1 and now - last_sent > IDLE:
+                await flush()
+
+    async def frames():
+        while True:
+            await asyncio.sleep(FRAME)
+            if pending:
+                await flush()
+
+    flusher = asyncio.create_task(frames()) if mode == "batch" else None
+    end = loop.time() + seconds
+    step = 1 / rate
+    n = 0
+    while loop.time() < end:
+        x = 100 + (n * 7) % 800
+        if n % int(rate) == 0:
+            await on_event(touch(0, pointer, x, 1200), False)
+        elif n % int(rate) == int(rate) - 1:
+            await on_event(touch(1, pointer, x, 1200), False)
+        else:
+            await on_event(touch(2, pointer, x, 1200), True)
+        n += 1
+        await asyncio.sleep(step)
+    await asyncio.sleep(0.2)
+    if flusher:
+        flusher.cancel()
+    await client.disconnect()
+    return n
+
+
+async def drags(url: str, mode: str, args) -> dict:
+    latency: list[float] = []
+    sent: list[int] = []
+    events = await asyncio.gather(*(
+        drag(url, mode, pointer, args.rate, args.seconds, latency, sent)
+        for pointer in range(args.clients)
+    ))
+    return {"events": sum(events), "emits": len(sent), "latency": latency}
+
+
+def stats(url: str) -> dict:
+    with urllib.request.urlopen(f"{url}/stats") as res:
+        return json.load(res)
+
+
+def percentile(values: list[float], q: int) -> float:
+    if len(values) < 2:
+        return float("nan")
+    return statistics.quantiles(values, n=100)[q - 1] * 1000
+
+
+def run(mode: str, args) -> dict:
+    listener = socket.create_server(("127.0.0.1", 0))
+    received = {"reads": 0, "bytes": 0}
+    threading.Thread(target=device_reader, args=(listener, received), daemon=True).start()
+    port = 18100 + MODES.index(mode)
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", mode, "--port", str(port),
+         "--device-port", str(listener.getsockname()[1])]
+    )
+    try:
+        for _ in range(50):
+            try:
+                stats(url)
+                break
+            except OSError:
+                time.sleep(0.1)
+        before = stats(url)
+        result = asyncio.run(drags(url, mode, args))
+        after = stats(url)
+    finally:
+        server.kill()
+    wall = after["time"] - before["time"]
+    return {
+        "events/s": result["events"] / wall,
+        "socket.io msgs/s": result["emits"] / wall,
+        "device writes/s": (after["writes"] - before["writes"]) / wall,
+        "coalesced/s": (after["coalesced"] - before["coalesced"]) / wall,
+        "server cpu %": (after["cpu"] - before["cpu"]) / wall * 100,
+        "latency p50 ms": percentile(result["latency"], 50),
+        "latency p99 ms": percentile(result["latency"], 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=240)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--serve")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--device-port", type=int)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.port, args.serve, args.device_port)
+
+    print(f"{args.clients} drags at {args.rate:g} events/s, {args.seconds:.0f}s")
+    for mode in MODES:
+        result = run(mode, args)
+        print(f"{mode:<8} " + "  ".join(f"{k} {v:.1f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
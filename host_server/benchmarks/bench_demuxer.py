@@ -0,0 +1,127 @@
+"""Throughput of VideoDemuxer on a recorded or synthetic scrcpy video stream.
+
+A recorded stream is the raw content of the video socket after the dummy
+byte (device name, codec meta, framed packets), e.g. captured with
+`nc localhost <forwarded port> > stream.bin` while a scrcpy server is running.
+
+The baseline is what the page did before the demuxer (VideoParser.appendData
+in the old video_parser.js): every chunk is appended by copying the whole
+pending buffer into a new one, every complete packet is copied out with
+slice() and the remainder is copied again. A frame that arrives in n chunks
+is copied about n times, so the cost grows with frame size / chunk size.
+The old host did no parsing at all, it forwarded recv() chunks as they came;
+the host side demuxer is there for frame-aligned messages, not for speed.
+Each chunk size is measured separately.
+
+Usage: python benchmarks/bench_demuxer.py [--stream stream.bin] [--chunks 1024,16384,65536]
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from demuxer import (
+    CODEC_META,
+    DEVICE_NAME_LENGTH,
+    PACKET_FLAG_CONFIG,
+    PACKET_FLAG_KEY_FRAME,
+    PACKET_HEADER,
+    VideoDemuxer,
+)
+
+
+def synthetic_stream(seconds: int, fps: int = 60, gop: int = 60) -> bytes:
+    rng = random.Random(0)
+    parts = [
+        b"bench".ljust(DEVICE_NAME_LENGTH, b"\x00"),
+        CODEC_META.pack(0x68323634, 1080, 2400),
+    ]
+    config = b"\x00\x00\x00\x01\x67" + bytes(20) + b"\x00\x00\x00\x01\x68" + bytes(4)
+    parts.append(PACKET_HEADER.pack(PACKET_FLAG_CONFIG, len(config)) + config)
+    for i in range(seconds * fps):
+        pts = i * 1_000_000 // fps
+        if i % gop == 0:
+            size, flags = rng.randint(150_000, 400_000), PACKET_FLAG_KEY_FRAME
+        else:
+            size, flags = rng.randint(2_000, 30_000), 0
+        payload = b"\x00\x00\x00\x01\x65" + os.urandom(size - 5)
+        parts.append(PACKET_HEADER.pack(pts | flags, size) + payload)
+    return b"".join(parts)
+
+
+def chunks(stream: bytes, max_chunk: int):
+    rng = random.Random(1)
+    view = memoryview(stream)
+    pos = 0
+    while pos < len(stream):
+        size = rng.randint(1, max_chunk)
+        yield view[pos : pos + size]
+        pos += size
+
+
+def naive_demux(stream_chunks):
+    # the algorithm VideoParser.appendData used: copy the whole buffer per
+    # chunk, slice() every packet out and copy the remainder
+    buffer = b""
+    header_done = False
+    count = 0
+    for chunk in stream_chunks:
+        buffer = buffer + bytes(chunk)
+        start = 0
+        packets = []
+        if not header_done:
+            if len(buffer) < DEVICE_NAME_LENGTH + CODEC_META.size:
+                continue
+            start = DEVICE_NAME_LENGTH + CODEC_META.size
+            header_done = True
+        while len(buffer) - start > PACKET_HEADER.size:
+            size = struct.unpack_from(">I", buffer, start + 8)[0]
+            if len(buffer) - start < PACKET_HEADER.size + size:
+                break
+            packets.append(buffer[start + PACKET_HEADER.size : start + PACKET_HEADER.size + size])
+            start += PACKET_HEADER.size + size
+        count += len(packets)
+        buffer = buffer[start:]
+    return count
+
+
+def demux(stream_chunks):
+    demuxer = VideoDemuxer()
+    count = 0
+    for chunk in stream_chunks:
+        count += len(demuxer.feed(chunk))
+    return count - 1  # stream header
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stream", help="recorded raw video socket stream")
+    parser.add_argument("--seconds", type=int, default=30)
+    parser.add_argument("--chunks", default="1024,16384,65536", help="max chunk sizes")
+    args = parser.parse_args()
+
+    if args.stream:
+        with open(args.stream, "rb") as f:
+            stream = f.read()
+    else:
+        stream = synthetic_stream(args.seconds)
+    size_mb = len(stream) / 1024 / 1024
+    for max_chunk in (int(x) for x in args.chunks.split(",")):
+        stream_chunks = list(chunks(stream, max_chunk))
+        print(f"{size_mb:.1f} MiB in {len(stream_chunks)} chunks of up to {max_chunk} bytes")
+        for name, func in (("old page", naive_demux), ("demuxer", demux)):
+            start = time.perf_counter()
+            count = func(stream_chunks)
+            elapsed = time.perf_counter() - start
+            print(
+                f"  {name:<9} {size_mb / elapsed:>9.1f} MiB/s "
+                f"{count / elapsed:>10.0f} packets/s ({count} packets)"
+            )
+
+
+if __name__ == "__main__":
+    main()
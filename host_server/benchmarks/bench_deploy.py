@@ -0,0 +1,70 @@
+"""Session start latency of the push + forward steps with and without the
+scrcpy-server deploy cache, against benchmarks/fake_adb_server.py.
+
+Usage: python benchmarks/bench_deploy.py [--runs 20] [--latency 0.03]
+           [--push-overhead 0.15] [--usb-mbps 20]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from loguru import logger
+from adb_client import AdbClient
+from deploy_cache import ServerDeployCache
+from scrcpy import Scrcpy
+from fake_adb_server import FakeAdbServer
+
+logger.remove()
+
+
+def measure(client: AdbClient, server_path: str, deploy_cache, runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        sc = Scrcpy("emulator-5554", 27183, deploy_cache=deploy_cache, adb_client=client)
+        sc.server_path = server_path
+        start = time.perf_counter()
+        assert sc.push_server_to_device()
+        sc.setup_adb_forward()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--push-overhead", type=float, default=0.15)
+    parser.add_argument("--usb-mbps", type=float, default=20)
+    args = parser.parse_args()
+
+    server_path = os.path.join(os.path.dirname(HERE), "scrcpy-server")
+    with tempfile.TemporaryDirectory() as directory:
+        server = FakeAdbServer(
+            os.path.join(directory, "devices"),
+            ["emulator-5554"],
+            latency=args.latency,
+            push_overhead=args.push_overhead,
+            usb_mbps=args.usb_mbps,
+        ).start()
+        client = AdbClient(port=server.port)
+        cache = ServerDeployCache(os.path.join(directory, "deploy.json"))
+        results = {
+            "always push": measure(client, server_path, None, args.runs),
+            "deploy cache": measure(client, server_path, cache, args.runs),
+        }
+        server.shutdown()
+    for name, timings in results.items():
+        print(
+            f"{name:<13} median {statistics.median(timings) * 1000:7.1f} ms  "
+            f"max {max(timings) * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
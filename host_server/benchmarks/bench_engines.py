@@ -0,0 +1,191 @@
+"""Host server engines side by side: the gevent Flask-SocketIO app (app.py)
+against the asyncio one (async_app.py), each with --sessions devices that
+are streamed to one socket.io client per device.
+
+benchmarks/fake_adb_server.py plays adb and the devices in this process:
+scrcpy-server runs at --fps frames/s with the bit rate of the adaptive start
+rung. Each engine is a subprocess (this script with --serve) with adb
+pointed at the fake server and recordings in mkv; the viewers run in
+--client-procs processes and ack like the page. CPU time, RSS and OS threads
+are read from /proc for the server process only, sessions per core is the
+number of sessions one fully busy core would carry at the measured CPU.
+
+Usage: python benchmarks/bench_engines.py [--sessions 40] [--seconds 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+ENGINES = ("gevent", "asyncio")
+
+
+def serve(engine: str, port: int, adb_port: int, server_path: str):
+    os.environ.update(
+        TOKEN="bench",
+        ADMIN_ID="0",
+        BACKEND_URL="http://127.0.0.1:9",
+        BACKEND_RETRIES="0",
+        METRICS_PORT="0",
+        ADAPTIVE_QUALITY="false",
+        RECORD_FORMAT="mkv",
+    )
+    if engine == "gevent":
+        import app as host
+    else:
+        import async_app as host
+    import adb_client
+    import scrcpy
+    from loguru import logger
+
+    logger.remove()
+    adb_client.adb.port = adb_port
+    init = scrcpy.Scrcpy.__init__
+
+    def patched_init(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        self.server_path = server_path
+
+    scrcpy.Scrcpy.__init__ = patched_init
+    if engine == "gevent":
+        host.socketio.run(host.app, host="127.0.0.1", port=port, log_output=False)
+    else:
+        from aiohttp import web
+
+        web.run_app(host.app, host="127.0.0.1", port=port, access_log=None, print=None)
+
+
+async def watch(url: str, serials: list[str], warmup: float, seconds: float):
+    import socketio
+
+    asyncio.get_running_loop().set_exception_handler(lambda loop, context: None)
+    frames = [0]
+    clients = []
+    for serial in serials:
+        client = socketio.AsyncClient()
+
+        @client.on("video_data")
+        def on_video(data):
+            frames[0] += 1
+            return True
+
+        await client.connect(f"{url}?device={serial}", transports=["websocket"])
+        clients.append(client)
+    print("ready", flush=True)
+    await asyncio.sleep(warmup)
+    start = frames[0]
+    await asyncio.sleep(seconds)
+    print(json.dumps({"batches": frames[0] - start}), flush=True)
+    for client in clients:
+        await client.disconnect()
+
+
+def proc_stats(pid: int) -> dict:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    result = {"cpu": (int(fields[11]) + int(fields[12])) / ticks, "time": time.monotonic()}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                result["rss"] = int(line.split()[1]) / 1024
+            elif line.startswith("Threads:"):
+                result["threads"] = int(line.split()[1])
+    return result
+
+
+def run(engine: str, args, adb_port: int, server_path: str, serials: list[str]) -> dict:
+    port = 18200 + ENGINES.index(engine)
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", engine, "--port", str(port),
+         "--adb-port", str(adb_port), "--server-path", server_path],
+        cwd=tempfile.mkdtemp(),
+    )
+    clients = []
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"{url}/stats").close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        idle = proc_stats(server.pid)
+        started = time.monotonic()
+        for i in range(args.client_procs):
+            clients.append(subprocess.Popen(
+                [sys.executable, __file__, "--watch", url, "--warmup", str(args.warmup),
+                 "--seconds", str(args.seconds), *serials[i :: args.client_procs]],
+                stdout=subprocess.PIPE, text=True,
+            ))
+        for client in clients:
+            client.stdout.readline()
+        startup = time.monotonic() - started
+        time.sleep(args.warmup)
+        before = proc_stats(server.pid)
+        time.sleep(args.seconds)
+        after = proc_stats(server.pid)
+        batches = sum(json.loads(client.stdout.readline())["batches"] for client in clients)
+    finally:
+        for client in clients:
+            client.kill()
+        server.kill()
+    cpu = (after["cpu"] - before["cpu"]) / (after["time"] - before["time"])
+    return {
+        "start all s": startup,
+        "cpu %": cpu * 100,
+        "sessions/core": args.sessions / cpu if cpu else float("inf"),
+        "idle rss MiB": idle["rss"],
+        "rss/session MiB": (after["rss"] - idle["rss"]) / args.sessions,
+        "threads": after["threads"],
+        "batches/s per viewer": batches / args.sessions / args.seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--client-procs", type=int, default=4)
+    parser.add_argument("--serve")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--adb-port", type=int)
+    parser.add_argument("--server-path")
+    parser.add_argument("--watch")
+    parser.add_argument("serials", nargs="*")
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.serve, args.port, args.adb_port, args.server_path)
+    if args.watch:
+        return asyncio.run(watch(args.watch, args.serials, args.warmup, args.seconds))
+
+    from fake_adb_server import FakeAdbServer
+
+    root = tempfile.mkdtemp()
+    server_path = os.path.join(root, "scrcpy-server")
+    with open(server_path, "wb") as f:
+        f.write(os.urandom(64 * 1024))
+    serials = [f"bench-{i:03d}" for i in range(args.sessions)]
+    adb = FakeAdbServer(os.path.join(root, "devices"), serials, scrcpy_fps=args.fps).start()
+
+    print(f"{args.sessions} sessions, {args.fps} fps, one viewer each, {args.seconds:.0f}s")
+    for engine in ENGINES:
+        result = run(engine, args, adb.port, server_path, serials)
+        print(f"{engine:<8} " + "  ".join(
+            f"{k} {v:.1f}" if isinstance(v, float) else f"{k} {v}" for k, v in result.items()
+        ))
+
+
+if __name__ == "__main__":
+    main()
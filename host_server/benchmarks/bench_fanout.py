@@ -0,0 +1,109 @@
+"""Idle and loaded CPU per device: legacy 1 ms polling loop vs VideoFanout.
+
+Usage: python benchmarks/bench_fanout.py [--devices 30] [--seconds 5] [--fps 60]
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse
+import os
+import queue
+import sys
+import time
+
+import gevent
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from demuxer import Packet, PacketType
+from fanout import VideoFanout
+
+logger.remove()
+
+
+class PollingFanout:
+    # copy of the previous video_send_task loop
+    def __init__(self, emit):
+        self.emit = emit
+        self.queue = queue.Queue()
+        self.closed = False
+
+    def put(self, data):
+        self.queue.put(data)
+
+    def close(self):
+        self.closed = True
+
+    def run(self):
+        while not self.closed:
+            try:
+                data = self.queue.get(timeout=0.001)
+                self.emit(data)
+            except queue.Empty:
+                continue
+
+
+def producer(fanout, fps, packet_size, stop_at):
+    packet = Packet(PacketType.DELTA, 0, b"\x00" * packet_size)
+    interval = 1 / fps
+    while time.monotonic() < stop_at:
+        fanout.put(packet)
+        gevent.sleep(interval)
+
+
+def run_phase(make_fanout, devices, seconds, fps, packet_size):
+    emitted = [0]
+
+    def emit(*args):
+        emitted[0] += 1
+        if len(args) == 3 and args[2]:
+            args[2]()  # the browser acks the batches it is asked to
+
+    fanouts = [make_fanout(emit) for _ in range(devices)]
+    for f in fanouts:
+        if isinstance(f, VideoFanout):
+            f.subscribe("viewer")
+    tasks = [gevent.spawn(f.run) for f in fanouts]
+    stop_at = time.monotonic() + seconds
+    cpu_start = time.process_time()
+    if fps:
+        producers = [
+            gevent.spawn(producer, f, fps, packet_size, stop_at) for f in fanouts
+        ]
+        gevent.joinall(producers)
+    else:
+        gevent.sleep(seconds)
+    cpu = time.process_time() - cpu_start
+    for f in fanouts:
+        f.close()
+    gevent.joinall(tasks, timeout=2)
+    return cpu, emitted[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=30)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--packet-size", type=int, default=16 * 1024)
+    args = parser.parse_args()
+
+    variants = {
+        "polling": lambda emit: PollingFanout(emit),
+        "fanout": lambda emit: VideoFanout("bench", emit),
+    }
+    print(f"{args.devices} devices, {args.seconds}s per phase")
+    print(f"{'variant':<10}{'phase':<8}{'cpu %/device':>14}{'emits':>10}")
+    for name, make in variants.items():
+        for phase, fps in (("idle", 0), ("loaded", args.fps)):
+            cpu, emitted = run_phase(
+                make, args.devices, args.seconds, fps, args.packet_size
+            )
+            per_device = cpu / args.seconds / args.devices * 100
+            print(f"{name:<10}{phase:<8}{per_device:>14.3f}{emitted:>10}")
+
+
+if __name__ == "__main__":
+    main()
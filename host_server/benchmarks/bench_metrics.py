@@ -0,0 +1,86 @@
+"""Hot path cost of the metrics: Histogram.observe, DeviceMetrics.received
+per packet and .sent per batch, the VideoFanout fan-out with and without metrics, and
+the time to render a scrape for many devices.
+
+Usage: python benchmarks/bench_metrics.py [--devices 100] [--viewers 10]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from loguru import logger
+from demuxer import Packet, PacketType
+from fanout import VideoFanout
+from metrics import DeviceMetrics, Histogram, MetricsRegistry
+
+logger.remove()
+
+
+def per_call(stmt, number: int = 200_000) -> float:
+    return min(timeit.repeat(stmt, number=number, repeat=3)) / number * 1e9
+
+
+def fanout_rate(metrics, viewers: int, packets: int) -> float:
+    fanout = VideoFanout("bench", lambda sid, data, ack: ack and ack(), maxsize=packets,
+                         viewer_queue_size=packets, metrics=metrics)
+    for i in range(viewers):
+        fanout.subscribe(f"viewer-{i}")
+    runner = threading.Thread(target=fanout.run)
+    runner.start()
+    start = time.perf_counter()
+    for n in range(packets):
+        kind = PacketType.KEYFRAME if n % 60 == 0 else PacketType.DELTA
+        fanout.put(Packet(kind, n * 16_666, b"\x00" * 1024))
+    while any(len(v.queue) for v in list(fanout.viewers.values())) or len(fanout.queue):
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    fanout.close()
+    runner.join()
+    return packets / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--viewers", type=int, default=10)
+    parser.add_argument("--packets", type=int, default=20_000)
+    args = parser.parse_args()
+
+    histogram = Histogram()
+    metrics = DeviceMetrics()
+    packet = Packet(PacketType.DELTA, 1_000_000, b"\x00" * 1024)
+    metrics.received(packet)
+    print(f"Histogram.observe          {per_call(lambda: histogram.observe(0.012)):6.0f} ns")
+    print(f"DeviceMetrics.received     {per_call(lambda: metrics.received(packet)):6.0f} ns")
+    print(f"DeviceMetrics.sent (1 pkt) {per_call(lambda: metrics.sent([packet], 1024)):6.0f} ns")
+    batch = [packet] * 10
+    print(f"DeviceMetrics.sent (10 pkt){per_call(lambda: metrics.sent(batch, 10240)):6.0f} ns")
+
+    plain = fanout_rate(None, args.viewers, args.packets)
+    measured = fanout_rate(DeviceMetrics(), args.viewers, args.packets)
+    print(f"fanout, {args.viewers} viewers       {plain:9.0f} packets/s without metrics, "
+          f"{measured:9.0f} with ({(plain / measured - 1) * 100:+.1f}% time)")
+
+    registry = MetricsRegistry()
+    for i in range(args.devices):
+        device = registry.device(f"device-{i:04d}")
+        for n in range(100):
+            device.received(Packet(PacketType.DELTA, n * 16_666, b"\x00" * 1024))
+        device.sent([packet], 1024)
+        device.control_rtt.observe(0.02)
+    gauges = [("scrcpy_viewers", "gauge", "Connected viewers",
+               {f"device-{i:04d}": 1 for i in range(args.devices)})]
+    render = min(timeit.repeat(lambda: registry.render(gauges), number=20, repeat=3)) / 20
+    body = registry.render(gauges)
+    print(f"scrape, {args.devices} devices          {render * 1000:6.2f} ms, "
+          f"{len(body) / 1024:.0f} KiB, {body.count(chr(10))} lines")
+
+
+if __name__ == "__main__":
+    main()
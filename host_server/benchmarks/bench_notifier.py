@@ -0,0 +1,114 @@
+"""A burst of session events (a USB hub reset: every device disconnects and
+reconnects) sent one request per event, the old send_message_to_telegram
+behaviour, against the queued TelegramNotifier, on benchmarks/fake_telegram.py.
+
+Also checks that messages queued while Telegram is down are kept in the
+outbox file and delivered by the next notifier instance.
+
+Usage: python benchmarks/bench_notifier.py [--devices 30] [--rate 1]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from loguru import logger
+from notifier import TelegramNotifier
+from fake_telegram import FakeTelegram
+
+logger.remove()
+
+
+def events(devices: int) -> list[str]:
+    names = [f"device-{i:02d}" for i in range(devices)]
+    return [f"🔴Сессия с девайсом {n} закончилась 🔴" for n in names] + [
+        f"🟢Сессия с девайсом {n} началась 🟢" for n in names
+    ]
+
+
+def direct(server: FakeTelegram, texts: list[str]) -> dict:
+    start = time.perf_counter()
+    delivered = 0
+    for text in texts:
+        res = requests.post(
+            f"{server.url}/botTOKEN/sendMessage", data={"chat_id": 1, "text": text}
+        )
+        delivered += res.status_code == 200
+    return {
+        "handler time": time.perf_counter() - start,
+        "requests": len(texts),
+        "events delivered": delivered,
+        "rejected (429)": server.rejected,
+    }
+
+
+def queued(server: FakeTelegram, texts: list[str], outbox: str, rate: float) -> dict:
+    notifier = TelegramNotifier("TOKEN", 1, api_url=server.url, window=1.0, rate=rate,
+                                burst=1, outbox_path=outbox)
+    start = time.perf_counter()
+    for text in texts:
+        notifier.notify(text)
+    handler_time = time.perf_counter() - start
+    while notifier.events.qsize() or notifier.outbox or not notifier.sent:
+        time.sleep(0.05)
+    lines = sum(len(m["text"].splitlines()) for m in server.messages)
+    return {
+        "handler time": handler_time,
+        "requests": len(server.messages) + server.rejected,
+        "events delivered": lines,
+        "rejected (429)": server.rejected,
+        "delivery time": time.perf_counter() - start,
+    }
+
+
+def outage(texts: list[str], outbox: str) -> dict:
+    server = FakeTelegram(rate=100).start()
+    server.down = True
+    first = TelegramNotifier("TOKEN", 1, api_url=server.url, window=0.2,
+                             outbox_path=outbox, retry_delay=60)
+    for text in texts:
+        first.notify(text)
+    while not first.failed:
+        time.sleep(0.05)
+    # the process restarts while Telegram is still down
+    server.down = False
+    second = TelegramNotifier("TOKEN", 1, api_url=server.url, outbox_path=outbox)
+    restored = len(second.outbox)
+    second.start()
+    while second.outbox:
+        time.sleep(0.05)
+    server.shutdown()
+    return {"outbox after restart": restored, "delivered": len(server.messages)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=30)
+    parser.add_argument("--rate", type=float, default=1)
+    args = parser.parse_args()
+    texts = events(args.devices)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, run in (
+            ("direct", lambda s: direct(s, texts)),
+            ("notifier", lambda s: queued(s, texts, f"{directory}/a.jsonl", args.rate)),
+        ):
+            server = FakeTelegram(rate=int(args.rate)).start()
+            result = run(server)
+            server.shutdown()
+            print(f"{name:<9} " + "  ".join(
+                f"{k} {v:.2f}s" if isinstance(v, float) else f"{k} {v}"
+                for k, v in result.items()
+            ))
+        print("outage    " + "  ".join(
+            f"{k} {v}" for k, v in outage(texts, f"{directory}/b.jsonl").items()
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""50 observers on one device: host CPU, memory and frame latency of the old
+room broadcast against per-viewer buffers (VideoFanout.subscribe).
+
+A Flask-SocketIO gevent server (this script with --serve) streams synthetic
+60 fps video whose packets carry their wall clock send time. The controller
+and the observers are socket.io clients in this process; one slow observer
+runs in its own process and blocks 300 ms on every batch, so the kernel
+buffers fill and the server has to hold or drop its frames.
+
+Usage: python benchmarks/bench_observers.py [--observers 50] [--seconds 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import struct
+import subprocess
+import sys
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+STAMP = struct.Struct(">d")
+
+
+def rss_mib() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def serve(port: int, mode: str, fps: int, size: int, gop: int):
+    from gevent import monkey
+
+    monkey.patch_all()
+
+    from flask import Flask, request
+    from flask_socketio import SocketIO, join_room
+    from loguru import logger
+    from demuxer import Packet, PacketType
+    from fanout import VideoFanout, set_tcp_nodelay
+
+    logger.remove()
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode="gevent")
+    fanout = VideoFanout(
+        "bench",
+        lambda sid, data, ack: socketio.emit("video_data", data, to=sid, callback=ack),
+    )
+
+    @socketio.on("connect")
+    def connect(auth=None):
+        set_tcp_nodelay(request.environ)
+        if mode == "room":
+            join_room("bench")
+        else:
+            fanout.subscribe(request.sid)
+
+    @socketio.on("disconnect")
+    def disconnect():
+        fanout.unsubscribe(request.sid)
+
+    @app.route("/stats")
+    def stats():
+        # engine.io keeps an unbounded outgoing queue per client
+        backlog = [s.queue.qsize() for s in list(socketio.server.eio.sockets.values())]
+        viewers = fanout.stats()["viewers"].values()
+        return {
+            "cpu": time.process_time(),
+            "time": time.monotonic(),
+            "rss": rss_mib(),
+            "backlog": max(backlog, default=0),
+            "dropped": sum(v["dropped"] for v in viewers),
+        }
+
+    def producer():
+        n = 0
+        while True:
+            kind = PacketType.KEYFRAME if n % gop == 0 else PacketType.DELTA
+            data = STAMP.pack(time.time()) + bytes(size - STAMP.size)
+            if mode == "room":
+                socketio.emit("video_data", data, to="bench")
+            else:
+                fanout.put(Packet(kind, n, data))
+            n += 1
+            socketio.sleep(1 / fps)
+
+    if mode != "room":
+        socketio.start_background_task(fanout.run)
+    socketio.start_background_task(producer)
+    socketio.run(app, host="127.0.0.1", port=port, log_output=False)
+
+
+def latencies(data: bytes, size: int) -> list[float]:
+    now = time.time()
+    return [
+        now - STAMP.unpack_from(data, offset)[0] for offset in range(0, len(data), size)
+    ]
+
+
+async def viewer(url: str, size: int, samples: list[float], block: float = 0):
+    import socketio
+
+    client = socketio.AsyncClient()
+
+    @client.on("video_data")
+    def on_video(data):
+        samples.extend(latencies(data, size))
+        if block:
+            time.sleep(block)  # stalls the whole event loop, like a frozen tab
+        return True
+
+    await client.connect(url, transports=["websocket"])
+    return client
+
+
+async def watch(url: str, observers: int, seconds: float, size: int) -> dict:
+    # packets cut off by the disconnects at the end fail to decode
+    asyncio.get_running_loop().set_exception_handler(lambda loop, context: None)
+    controller: list[float] = []
+    watchers = [[] for _ in range(observers)]
+    clients = [await viewer(url, size, controller)]
+    for samples in watchers:
+        clients.append(await viewer(url, size, samples))
+    await asyncio.sleep(1)  # warm up
+    controller.clear()
+    for samples in watchers:
+        samples.clear()
+    await asyncio.sleep(seconds)
+    for client in clients:
+        await client.disconnect()
+    return {"controller": controller, "observers": [x for s in watchers for x in s]}
+
+
+def stats(url: str) -> dict:
+    with urllib.request.urlopen(f"{url}/stats") as res:
+        return json.load(res)
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else values[0]
+
+
+def run(mode: str, args) -> dict:
+    port = 18000 + (mode == "room")
+    url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, __file__, "--serve", mode, "--port", str(port),
+         "--fps", str(args.fps), "--size", str(args.size)]
+    )
+    slow = None
+    try:
+        for _ in range(50):
+            try:
+                idle = stats(url)
+                break
+            except OSError:
+                time.sleep(0.1)
+        if args.slow:
+            slow = subprocess.Popen(
+                [sys.executable, __file__, "--slow-observer", url, "--size", str(args.size)],
+                stdout=subprocess.PIPE,
+            )
+            slow.stdout.readline()
+        before = stats(url)
+        result = asyncio.run(watch(url, args.observers, args.seconds, args.size))
+        after = stats(url)
+    finally:
+        if slow:
+            slow.kill()
+        server.kill()
+    wall = after["time"] - before["time"]
+    return {
+        "cpu %": (after["cpu"] - before["cpu"]) / wall * 100,
+        "rss MiB": after["rss"] - idle["rss"],
+        "controller p50": percentile(result["controller"], 50),
+        "controller p99": percentile(result["controller"], 99),
+        "observers p50": percentile(result["observers"], 50),
+        "observers p99": percentile(result["observers"], 99),
+        "frames/s per observer": len(result["observers"]) / max(1, args.observers) / args.seconds,
+        "max backlog": after["backlog"],
+        "dropped": after["dropped"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--observers", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--size", type=int, default=16 * 1024)
+    parser.add_argument("--no-slow", dest="slow", action="store_false")
+    parser.add_argument("--serve")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--slow-observer", dest="slow_url")
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.port, args.serve, args.fps, args.size, gop=args.fps * 2)
+    if args.slow_url:
+        async def slow():
+            await viewer(args.slow_url, args.size, [], block=0.3)
+            print("connected", flush=True)
+            await asyncio.sleep(3600)
+
+        return asyncio.run(slow())
+
+    print(f"1 controller + {args.observers} observers"
+          f"{' + 1 slow observer' if args.slow else ''}, {args.fps} fps, "
+          f"{args.size // 1024} KiB packets, {args.seconds:.0f}s")
+    for mode in ("room", "viewer"):
+        result = run(mode, args)
+        print(f"{mode:<7} " + "  ".join(
+            f"{k} {v:.1f}" if isinstance(v, float) else f"{k} {v}" for k, v in result.items()
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Local port selection for the scrcpy adb forwards: the old random pick
+probed with connect_ex against PortAllocator, on benchmarks/fake_adb_server.py.
+
+Starts --sessions forwards at once (one per device) and counts the ones
+another session took over: adb rebinds an existing local port silently, so
+two sessions that pick the same port end up streaming from one device.
+Also checks that forwards leaked by a crashed run are reclaimed at startup
+and that a port held by another program is skipped.
+
+Usage: python benchmarks/bench_port_allocator.py [--sessions 200] [--threads 32]
+"""
+import argparse
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from loguru import logger
+from adb_client import AdbClient
+from port_allocator import PortAllocator
+from scrcpy import Scrcpy
+from fake_adb_server import FakeAdbServer
+
+logger.remove()
+
+
+def find_free_port() -> int:
+    # app.find_free_port before the allocator
+    while True:
+        port = random.randint(30000, 40000)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            if s.connect_ex(("localhost", port)) != 0:
+                return port
+
+
+def start_all(server: FakeAdbServer, serials: list[str], make, threads: int) -> dict:
+    server.forwards.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        sessions = list(executor.map(make, serials))
+    elapsed = time.perf_counter() - start
+    for sc in sessions:
+        sc.setup_adb_forward()
+    lost = sum(
+        server.forwards.get(f"tcp:{sc.local_port}", ("",))[0] != sc.serial_number
+        for sc in sessions
+    )
+    return {"port pick": elapsed, "forwards taken over": lost}
+
+
+def pick_rate(pick, seconds: float = 1.0) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pick()
+        count += 1
+    return count / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+    serials = [f"device-{i:04d}" for i in range(args.sessions)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        # only the forward table is compared, nothing connects through them
+        server = FakeAdbServer(directory, serials, forward_listeners=False).start()
+        client = AdbClient(port=server.port)
+
+        random_result = start_all(
+            server,
+            serials,
+            lambda serial: Scrcpy(serial, find_free_port(), adb_client=client),
+            args.threads,
+        )
+        ports = PortAllocator()
+        allocator_result = start_all(
+            server,
+            serials,
+            lambda serial: Scrcpy(serial, adb_client=client, port_allocator=ports),
+            args.threads,
+        )
+        for name, result in (("random", random_result), ("allocator", allocator_result)):
+            print(f"{name:<10} port pick {result['port pick'] * 1000:7.1f} ms  "
+                  f"forwards taken over {result['forwards taken over']}")
+
+        rates = {
+            "random": pick_rate(find_free_port),
+            "allocator": pick_rate(lambda: (ports.acquire("x"), ports.release("x"))),
+        }
+        print("picks/s   " + "  ".join(f"{k} {v:,.0f}" for k, v in rates.items()))
+
+        # the host process dies with every forward still in place
+        leaked = len(server.forwards)
+        restarted = PortAllocator()
+        restarted.reconcile(client)
+        print(f"restart   leaked forwards {leaked}  after reconcile {len(server.forwards)}")
+
+        server.busy_ports = {30000, 30001}
+        sc = Scrcpy(serials[0], adb_client=client, port_allocator=restarted)
+        sc.setup_adb_forward()
+        print(f"busy      ports {sorted(server.busy_ports)} skipped, forward on {sc.local_port}")
+        sc.remove_adb_forward()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""CPU per recorded session: REMUX (stream copy) vs REENCODE (libx264).
+
+The input is a raw H.264 Annex B file with one slice per frame, e.g.
+    ffmpeg -f lavfi -i testsrc2=size=1080x2400:rate=60 -t 30 -c:v libx264 \
+        -g 60 -bf 0 -bsf:v h264_mp4toannexb -f h264 sample.h264
+Every session replays it in real time through its own Recorder. Linux only
+(child CPU time is read with the resource module).
+
+Usage: python benchmarks/bench_recorder.py sample.h264 [--sessions 4] [--fps 60]
+"""
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger
+from demuxer import (
+    CODEC_META,
+    DEVICE_NAME_LENGTH,
+    PACKET_FLAG_CONFIG,
+    PACKET_FLAG_KEY_FRAME,
+    PACKET_HEADER,
+    Packet,
+    PacketType,
+)
+from mkv import split_nal_units
+from recorder import Recorder, RecordMode
+
+logger.remove()
+
+
+def load_packets(path: str, fps: int) -> list[Packet]:
+    with open(path, "rb") as f:
+        units = split_nal_units(f.read())
+    header = b"bench".ljust(DEVICE_NAME_LENGTH, b"\x00") + CODEC_META.pack(0, 0, 0)
+    packets = [Packet(PacketType.HEADER, None, header)]
+    config, pending, frame_index = [], [], 0
+    for unit in units:
+        nal_type = unit[0] & 0x1F
+        if nal_type in (7, 8):
+            if frame_index == 0:
+                config.append(unit)
+            continue
+        pending.append(unit)
+        if nal_type not in (1, 5):
+            continue
+        if frame_index == 0:
+            data = b"".join(b"\x00\x00\x00\x01" + u for u in config)
+            packets.append(
+                Packet(
+                    PacketType.CONFIG,
+                    None,
+                    PACKET_HEADER.pack(PACKET_FLAG_CONFIG, len(data)) + data,
+                )
+            )
+        pts = frame_index * 1_000_000 // fps
+        keyframe = nal_type == 5
+        data = b"".join(b"\x00\x00\x00\x01" + u for u in pending)
+        flags = PACKET_FLAG_KEY_FRAME if keyframe else 0
+        packets.append(
+            Packet(
+                PacketType.KEYFRAME if keyframe else PacketType.DELTA,
+                pts,
+                PACKET_HEADER.pack(pts | flags, len(data)) + data,
+            )
+        )
+        pending = []
+        frame_index += 1
+    return packets
+
+
+def replay(recorder: Recorder, packets: list[Packet], fps: int):
+    start = time.monotonic()
+    for i, packet in enumerate(packets):
+        delay = start + i / fps - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        recorder.write(packet)
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def run(mode: RecordMode, extension: str, packets, sessions: int, fps: int):
+    with tempfile.TemporaryDirectory() as directory:
+        recorders = [
+            Recorder(os.path.join(directory, f"{i}.{extension}"), str(i), mode)
+            for i in range(sessions)
+        ]
+        cpu_start = cpu_seconds()
+        wall_start = time.monotonic()
+        for recorder in recorders:
+            recorder.start()
+        threads = [
+            threading.Thread(target=replay, args=(recorder, packets, fps))
+            for recorder in recorders
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for recorder in recorders:
+            recorder.stop()
+        wall = time.monotonic() - wall_start
+        cpu = cpu_seconds() - cpu_start
+    return cpu / wall / sessions * 100
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("h264")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--fps", type=int, default=60)
+    args = parser.parse_args()
+
+    packets = load_packets(args.h264, args.fps)
+    print(f"{len(packets) - 2} frames, {args.sessions} concurrent sessions")
+    for mode, extension in (
+        (RecordMode.REMUX, "mkv"),
+        (RecordMode.REMUX, "mp4"),
+        (RecordMode.REENCODE, "mp4"),
+    ):
+        if extension != "mkv" and shutil.which("ffmpeg") is None:
+            print(f"{mode.value:<9}{extension:<5} skipped, ffmpeg not found")
+            continue
+        per_session = run(mode, extension, packets, args.sessions, args.fps)
+        print(f"{mode.value:<9}{extension:<5}{per_session:>8.1f} % core per session")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Minimal stand-in for the adb command line used by the benchmarks.
+
+Device storage lives under $FAKE_ADB_ROOT/<serial>/. Every call sleeps
+$FAKE_ADB_LATENCY seconds (adb round trip); pushes additionally pay
+$FAKE_ADB_PUSH_OVERHEAD seconds (sync session setup, fsync on the device)
+and are throttled to $FAKE_ADB_USB_MBPS megabytes per second.
+"""
+import hashlib
+import os
+import sys
+import time
+
+ROOT = os.environ.get("FAKE_ADB_ROOT", "fake_adb_root")
+LATENCY = float(os.environ.get("FAKE_ADB_LATENCY", "0.03"))
+PUSH_OVERHEAD = float(os.environ.get("FAKE_ADB_PUSH_OVERHEAD", "0.15"))
+USB_MBPS = float(os.environ.get("FAKE_ADB_USB_MBPS", "20"))
+SERIALS = os.environ.get("FAKE_ADB_SERIALS", "emulator-5554").split(",")
+
+
+def device_path(serial: str, path: str) -> str:
+    return os.path.join(ROOT, serial, path.lstrip("/"))
+
+
+def shell(serial: str, command: str) -> int:
+    name, *args = command.split()
+    if name == "stat" and args[:2] == ["-c", "%s"]:
+        path = device_path(serial, args[2])
+        if not os.path.exists(path):
+            print(f"stat: {args[2]}: No such file or directory", file=sys.stderr)
+            return 1
+        print(os.path.getsize(path))
+        return 0
+    if name == "sha256sum":
+        path = device_path(serial, args[0])
+        if not os.path.exists(path):
+            print(f"sha256sum: {args[0]}: No such file or directory", file=sys.stderr)
+            return 1
+        with open(path, "rb") as f:
+            print(f"{hashlib.sha256(f.read()).hexdigest()}  {args[0]}")
+        return 0
+    return 0
+
+
+def main(argv: list[str]) -> int:
+    time.sleep(LATENCY)
+    serial = SERIALS[0]
+    if argv[:1] == ["-s"]:
+        serial, argv = argv[1], argv[2:]
+    command, args = argv[0], argv[1:]
+    if command == "devices":
+        print("List of devices attached")
+        for name in SERIALS:
+            print(f"{name}\tdevice")
+        return 0
+    if command == "push":
+        with open(args[0], "rb") as f:
+            data = f.read()
+        time.sleep(PUSH_OVERHEAD + len(data) / (USB_MBPS * 1024 * 1024))
+        target = device_path(serial, args[1])
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+        print(f"{args[0]}: 1 file pushed, 0 skipped.")
+        return 0
+    if command == "shell":
+        return shell(serial, " ".join(args))
+    if command == "forward":
+        return 0
+    print(f"fake adb: unsupported command {argv}", file=sys.stderr)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
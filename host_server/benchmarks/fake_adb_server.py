@@ -0,0 +1,273 @@
+"""Minimal adb server speaking the smart-socket protocol on a TCP port, used
+by the benchmarks to exercise adb_client.AdbClient without real devices.
+
+Device storage lives under <root>/<serial>/, like benchmarks/fake_adb.py.
+Every request sleeps `latency` seconds; sync pushes additionally pay
+`push_overhead` seconds and are throttled to `usb_mbps` megabytes per second.
+Devices can be plugged and unplugged at runtime with set_devices(), which
+notifies host:track-devices listeners. Local ports in `busy_ports` behave
+like ports another program on the host is bound to: forwards to them fail
+with "cannot bind listener", as with the real adb server. With
+`forward_listeners` forwards listen on their local port and running
+scrcpy-server (app_process) starts a benchmarks/fake_scrcpy.py server that
+takes the forwarded connections; without it forwards are only recorded.
+"""
+import hashlib
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+from fake_scrcpy import FakeScrcpyServer, parse_options
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        root: str,
+        serials: list[str],
+        port: int = 0,
+        latency: float = 0.0,
+        push_overhead: float = 0.0,
+        usb_mbps: float = 20,
+        scrcpy_fps: int = 30,
+        forward_listeners: bool = True,
+    ):
+        super().__init__(("127.0.0.1", port), FakeAdbHandler)
+        self.root = root
+        self.latency = latency
+        self.push_overhead = push_overhead
+        self.usb_mbps = usb_mbps
+        self.devices = {serial: "device" for serial in serials}
+        self.forwards: dict[str, tuple[str, str]] = {}  # local -> (serial, remote)
+        self.busy_ports: set[int] = set()
+        self.listeners: dict[str, socket.socket] = {}  # local -> listening socket
+        self.scrcpy: dict[str, FakeScrcpyServer] = {}  # serial -> running server
+        self.scrcpy_fps = scrcpy_fps
+        self.forward_listeners = forward_listeners
+        self.changed = threading.Condition()
+        self.version = 0
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def set_devices(self, devices: dict[str, str]):
+        with self.changed:
+            self.devices = dict(devices)
+            self.version += 1
+            self.changed.notify_all()
+
+    def device_listing(self, long: bool = False) -> str:
+        suffix = " usb:1-1 product:fake model:Fake device:fake" if long else ""
+        return "".join(
+            f"{serial}\t{state}{suffix}\n" for serial, state in self.devices.items()
+        )
+
+    def device_path(self, serial: str, path: str) -> str:
+        return os.path.join(self.root, serial, path.lstrip("/"))
+
+    def listen(self, local: str):
+        if not self.forward_listeners or local in self.listeners:
+            return
+        listener = socket.create_server(("127.0.0.1", int(local.split(":")[1])))
+        self.listeners[local] = listener
+        threading.Thread(target=self.accept_forward, args=(local, listener), daemon=True).start()
+
+    def accept_forward(self, local: str, listener: socket.socket):
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            serial, remote = self.forwards.get(local, (None, None))
+            scrcpy = self.scrcpy.get(serial) if remote == "localabstract:scrcpy" else None
+            if scrcpy is None:
+                # adb accepts the connection and closes it, nobody listens on the device
+                conn.close()
+            else:
+                scrcpy.accept(conn)
+
+    def unlisten(self, local: str):
+        listener = self.listeners.pop(local, None)
+        if listener:
+            # wakes the accept() blocked on it, close() alone keeps the port bound
+            try:
+                listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            listener.close()
+
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+    server: FakeAdbServer
+
+    def recv_exact(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def read_request(self) -> str:
+        size = int(self.recv_exact(4), 16)
+        return self.recv_exact(size).decode()
+
+    def okay(self, payload: str | None = None):
+        data = b"OKAY"
+        if payload is not None:
+            data += b"%04x" % len(payload.encode()) + payload.encode()
+        self.request.sendall(data)
+
+    def fail(self, message: str):
+        self.request.sendall(b"FAIL" + b"%04x" % len(message.encode()) + message.encode())
+
+    def handle(self):
+        try:
+            self.dispatch()
+        except ConnectionError:
+            pass
+
+    def dispatch(self):
+        server = self.server
+        request = self.read_request()
+        time.sleep(server.latency)
+        if request == "host:devices":
+            return self.okay(server.device_listing())
+        if request == "host:devices-l":
+            return self.okay(server.device_listing(long=True))
+        if request == "host:track-devices":
+            return self.track_devices()
+        if request == "host:list-forward":
+            return self.okay(
+                "".join(
+                    f"{serial} {local} {remote}\n"
+                    for local, (serial, remote) in server.forwards.items()
+                )
+            )
+        if request.startswith("host-serial:"):
+            _, serial, service = request.split(":", 2)
+            if server.devices.get(serial) != "device":
+                return self.fail(f"device '{serial}' not found")
+            if service.startswith("forward:"):
+                local, remote = service[len("forward:") :].split(";")
+                if int(local.split(":")[1]) in server.busy_ports:
+                    self.okay()
+                    return self.fail("cannot bind listener: Address already in use")
+                # like adb without norebind: an existing forward is silently taken over
+                try:
+                    server.listen(local)
+                except OSError as e:
+                    self.okay()
+                    return self.fail(f"cannot bind listener: {e}")
+                server.forwards[local] = (serial, remote)
+                self.request.sendall(b"OKAYOKAY")
+                return
+            if service.startswith("killforward:"):
+                local = service[len("killforward:") :]
+                if server.forwards.pop(local, None) is None:
+                    self.okay()
+                    return self.fail(f"listener '{local}' not found")
+                server.unlisten(local)
+                self.request.sendall(b"OKAYOKAY")
+                return
+        if request.startswith("host:transport:"):
+            serial = request[len("host:transport:") :]
+            if server.devices.get(serial) != "device":
+                return self.fail(f"device '{serial}' not found")
+            self.okay()
+            return self.device_service(serial, self.read_request())
+        self.fail(f"unknown host service {request}")
+
+    def track_devices(self):
+        server = self.server
+        self.okay()
+        while True:
+            with server.changed:
+                version = server.version
+                listing = server.device_listing()
+            self.request.sendall(b"%04x" % len(listing.encode()) + listing.encode())
+            with server.changed:
+                while server.version == version:
+                    server.changed.wait()
+
+    def device_service(self, serial: str, service: str):
+        if service.startswith("shell:") and "com.genymobile.scrcpy.Server" in service:
+            self.okay()
+            return self.scrcpy_server(serial, service[len("shell:") :])
+        if service.startswith("shell:"):
+            self.okay()
+            self.request.sendall(self.shell(serial, service[len("shell:") :]).encode())
+            return
+        if service == "sync:":
+            self.okay()
+            return self.sync(serial)
+        self.fail(f"unknown device service {service}")
+
+    def scrcpy_server(self, serial: str, command: str):
+        server = self.server
+        scrcpy = FakeScrcpyServer(serial, parse_options(command), server.scrcpy_fps)
+        server.scrcpy[serial] = scrcpy
+        try:
+            self.request.sendall(b"[server] INFO: Device: fake (Android 14)\n")
+            # runs until the host hangs up the shell
+            while self.request.recv(1024):
+                pass
+        except OSError:
+            pass
+        finally:
+            scrcpy.stop()
+            if server.scrcpy.get(serial) is scrcpy:
+                server.scrcpy.pop(serial)
+
+    def shell(self, serial: str, command: str) -> str:
+        name, *args = command.split() or [""]
+        if name == "stat" and args[:2] == ["-c", "%s"]:
+            path = self.server.device_path(serial, args[2])
+            if not os.path.exists(path):
+                return f"stat: {args[2]}: No such file or directory\n"
+            return f"{os.path.getsize(path)}\n"
+        if name == "sha256sum":
+            path = self.server.device_path(serial, args[0])
+            if not os.path.exists(path):
+                return f"sha256sum: {args[0]}: No such file or directory\n"
+            with open(path, "rb") as f:
+                return f"{hashlib.sha256(f.read()).hexdigest()}  {args[0]}\n"
+        if name == "echo":
+            return " ".join(args) + "\n"
+        return ""
+
+    def sync(self, serial: str):
+        server = self.server
+        while True:
+            command = self.recv_exact(4)
+            size = struct.unpack("<I", self.recv_exact(4))[0]
+            if command == b"QUIT":
+                return
+            if command != b"SEND":
+                raise ConnectionError
+            remote_path = self.recv_exact(size).decode().rsplit(",", 1)[0]
+            chunks = []
+            while True:
+                command = self.recv_exact(4)
+                size = struct.unpack("<I", self.recv_exact(4))[0]
+                if command == b"DONE":
+                    break
+                chunks.append(self.recv_exact(size))
+            data = b"".join(chunks)
+            time.sleep(server.push_overhead + len(data) / (server.usb_mbps * 1024 * 1024))
+            target = server.device_path(serial, remote_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+            self.request.sendall(b"OKAY" + struct.pack("<I", 0))
@@ -0,0 +1,110 @@
+"""Stand-in for scrcpy-server 3.1 (tunnel_forward=true) on a fake device,
+started by benchmarks/fake_adb_server.py when the host runs app_process.
+
+It takes the video, audio and control sockets of one session in that order,
+sends the dummy byte on the first one and then a synthetic stream in the
+scrcpy framing: the stream header, a config packet, then `fps` packets per
+second (at most max_fps) of video_bit_rate / fps / 8 bytes with a keyframe
+every `gop` packets. RESET_VIDEO on the control socket restarts the stream at a
+config packet and a keyframe. Everything stops when the shell connection
+that started the server closes.
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from demuxer import (
+    CODEC_META,
+    DEVICE_NAME_LENGTH,
+    PACKET_FLAG_CONFIG,
+    PACKET_FLAG_KEY_FRAME,
+    PACKET_HEADER,
+)
+from scrcpy import CONTROL_MSG_RESET_VIDEO
+
+CODEC_H264 = 0x68323634
+CONFIG_PAYLOAD = b"\x00\x00\x00\x01\x67\x42\xc0\x1f" + bytes(16) + b"\x00\x00\x00\x01\x68\xce\x3c\x80"
+
+
+def parse_options(command: str) -> dict[str, str]:
+    return dict(arg.split("=", 1) for arg in command.split()[4:] if "=" in arg)
+
+
+class FakeScrcpyServer:
+    def __init__(self, serial: str, options: dict[str, str], fps: int = 30, gop: int = 60):
+        self.serial = serial
+        self.bit_rate = int(options.get("video_bit_rate", 8_000_000))
+        # max_fps caps the frame rate, the display does not go faster than fps
+        self.fps = min(int(options.get("max_fps", 0)) or fps, fps)
+        self.gop = gop
+        self.sockets: list[socket.socket] = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.reset = threading.Event()
+        self.control_bytes = 0
+
+    def accept(self, conn: socket.socket):
+        with self.lock:
+            index = len(self.sockets)
+            self.sockets.append(conn)
+        if self.stopped.is_set() or index > 2:
+            conn.close()
+        elif index == 0:
+            threading.Thread(target=self.stream, args=(conn,), daemon=True).start()
+        elif index == 2:
+            threading.Thread(target=self.read_control, args=(conn,), daemon=True).start()
+
+    def stream(self, conn: socket.socket):
+        size = max(64, self.bit_rate // 8 // self.fps)
+        header = self.serial.encode()[:DEVICE_NAME_LENGTH].ljust(DEVICE_NAME_LENGTH, b"\x00")
+        started = next_at = time.monotonic()
+        n = 0
+        try:
+            conn.sendall(b"\x00" + header + CODEC_META.pack(CODEC_H264, 1080, 2400))
+            while not self.stopped.is_set():
+                pts = int((time.monotonic() - started) * 1_000_000)
+                if n % self.gop == 0 or self.reset.is_set():
+                    self.reset.clear()
+                    n = 0
+                    conn.sendall(
+                        PACKET_HEADER.pack(PACKET_FLAG_CONFIG, len(CONFIG_PAYLOAD)) + CONFIG_PAYLOAD
+                    )
+                    flags = pts | PACKET_FLAG_KEY_FRAME
+                    payload = bytes(size * 4)
+                else:
+                    flags = pts
+                    payload = bytes(size)
+                conn.sendall(PACKET_HEADER.pack(flags, len(payload)) + payload)
+                n += 1
+                next_at = max(next_at + 1 / self.fps, time.monotonic())
+                time.sleep(max(0.0, next_at - time.monotonic()))
+        except OSError:
+            pass
+
+    def read_control(self, conn: socket.socket):
+        try:
+            while True:
+                data = conn.recv(4096)
+                if not data:
+                    break
+                self.control_bytes += len(data)
+                if data[0] == CONTROL_MSG_RESET_VIDEO:
+                    self.reset.set()
+        except OSError:
+            pass
+
+    def stop(self):
+        self.stopped.set()
+        with self.lock:
+            sockets = list(self.sockets)
+        for conn in sockets:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
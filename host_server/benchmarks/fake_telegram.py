@@ -0,0 +1,79 @@
+"""Local stand-in for the Telegram Bot API sendMessage method.
+
+Accepts POST /bot<token>/sendMessage with a JSON or form body, records the
+messages and answers 429 with retry_after once a chat sends more than
+`rate` messages per second. `down` makes it answer 502 for every request.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeTelegram(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, rate: int = 1):
+        super().__init__(("127.0.0.1", port), FakeTelegramHandler)
+        self.rate = rate
+        self.messages: list[dict] = []
+        self.rejected = 0
+        self.down = False
+        self.recent: dict[str, list[float]] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    server: FakeTelegram
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if server.down:
+            return self.reply(502, {"ok": False, "description": "Bad Gateway"})
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            payload = json.loads(body)
+        else:
+            payload = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+        if not self.path.endswith("/sendMessage") or "chat_id" not in payload:
+            return self.reply(400, {"ok": False, "description": "Bad Request: chat not found"})
+        chat = str(payload["chat_id"])
+        now = time.monotonic()
+        with server.lock:
+            recent = [t for t in server.recent.get(chat, []) if now - t < 1.0]
+            if len(recent) >= server.rate:
+                server.rejected += 1
+                server.recent[chat] = recent
+                return self.reply(
+                    429,
+                    {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": "Too Many Requests: retry after 1",
+                        "parameters": {"retry_after": 1},
+                    },
+                )
+            recent.append(now)
+            server.recent[chat] = recent
+            server.messages.append(payload)
+        self.reply(200, {"ok": True, "result": {"message_id": len(server.messages)}})
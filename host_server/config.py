@@ -6,5 +6,44 @@ class Settings(BaseSettings):
 class Setting(Settings):
     TOKEN: str
     ADMIN_ID: int
+    BACKEND_URL: str = "http://localhost:8000"
+    BACKEND_TIMEOUT: float = 5.0
+    BACKEND_RETRIES: int = 3
+    TELEGRAM_API_URL: str = "https://api.telegram.org"
+    TELEGRAM_DIGEST_WINDOW: float = 3.0
+    TELEGRAM_RATE: float = 1.0  # messages per second
+    TELEGRAM_BURST: int = 3
+    TELEGRAM_OUTBOX: str = "logs/telegram_outbox.jsonl"
+    VIDEO_QUEUE_SIZE: int = 30
+    VIDEO_QUEUE_POLICY: str = "DROP"  # DROP or BLOCK
+    VIDEO_MAX_BATCH: int = 32
+    VIEWER_QUEUE_SIZE: int = 60
+    VIEWER_ACK_WINDOW: int = 8  # unacknowledged batches per viewer
+    VIEWER_ACK_TIMEOUT: float = 2.0
+    ADAPTIVE_QUALITY: bool = True
+    ADAPTIVE_START_LEVEL: int = 3  # index in adaptive.LADDER, 1 Mbps
+    ADAPTIVE_INTERVAL: float = 2.0
+    ADAPTIVE_HOLD: float = 10.0
+    HOST_VIDEO_BUDGET: int = 200_000_000  # bits/s shared by all sessions
+    METRICS_PORT: int = 9100  # Prometheus text format on /metrics, 0 disables
+    GOP_CACHE_MAX_BYTES: int = 8 * 1024 * 1024
+    # RESET_VIDEO on every join restarts the encoder for everyone watching;
+    # off, it is only sent when the cached GOP has no keyframe
+    REQUEST_KEYFRAME_ON_JOIN: bool = False
+    RECORD_MODE: str = "REMUX"  # REMUX or REENCODE
+    RECORD_FORMAT: str = "mp4"  # mp4 (fragmented) or mkv
+    RECORD_QUEUE_SIZE: int = 512
+    RECORD_QUEUE_POLICY: str = "SPILL"  # SPILL, DROP or BLOCK (not with async_app.py)
+    SCRCPY_FORCE_PUSH: bool = False
+    SCRCPY_STARTUP_TIMEOUT: float = 10.0
+    FORWARD_PORT_START: int = 30000
+    FORWARD_PORT_END: int = 40000
+    WARM_POOL_ENABLED: bool = False
+    WARM_POOL_MAX_SESSIONS: int = 16
+    WARM_POOL_IDLE_TIMEOUT: float = 1800
+    WARM_POOL_INTERVAL: float = 30
+    BATCH_PER_BUS_LIMIT: int = 4
+    BATCH_MAX_CONCURRENCY: int = 16
+    BATCH_DEVICE_TIMEOUT: float = 30
 
 settings = Setting()
\ No newline at end of file
@@ -0,0 +1,50 @@
+import struct
+
+# scrcpy control messages the batching looks into
+TYPE_INJECT_TOUCH_EVENT = 2
+ACTION_MOVE = 2
+
+# a control_batch is the messages of one animation frame, each one prefixed
+# by its length, so the host never has to know the size of every message type
+LENGTH = struct.Struct(">H")
+
+
+def split_batch(data: bytes) -> list[bytes]:
+    messages = []
+    offset = 0
+    while offset + LENGTH.size <= len(data):
+        (size,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        if offset + size > len(data):
+            raise ValueError(f"truncated control message at {offset}")
+        messages.append(data[offset : offset + size])
+        offset += size
+    if offset != len(data):
+        raise ValueError("trailing bytes in control batch")
+    return messages
+
+
+def pointer_move(message: bytes) -> bytes | None:
+    # pointer id of a touch MOVE
+    if len(message) >= 10 and message[0] == TYPE_INJECT_TOUCH_EVENT and message[1] == ACTION_MOVE:
+        return message[2:10]
+    return None
+
+
+def coalesce_moves(messages: list[bytes]) -> list[bytes]:
+    # a MOVE is dropped when a later MOVE of the same pointer follows it with
+    # only MOVEs in between; DOWN, UP, keys and scrolls keep their order and
+    # every pointer still ends the batch at its last position
+    kept = []
+    superseded = set()
+    for message in reversed(messages):
+        pointer = pointer_move(message)
+        if pointer is None:
+            superseded.clear()
+        elif pointer in superseded:
+            continue
+        else:
+            superseded.add(pointer)
+        kept.append(message)
+    kept.reverse()
+    return kept
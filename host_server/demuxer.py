@@ -0,0 +1,80 @@
+import struct
+from enum import Enum
+from typing import NamedTuple
+
+DEVICE_NAME_LENGTH = 64
+CODEC_META = struct.Struct(">III")  # codec id, width, height
+PACKET_HEADER = struct.Struct(">QI")  # pts and flags, payload size
+STREAM_HEADER_LENGTH = DEVICE_NAME_LENGTH + CODEC_META.size
+
+PACKET_FLAG_CONFIG = 1 << 63
+PACKET_FLAG_KEY_FRAME = 1 << 62
+PACKET_PTS_MASK = PACKET_FLAG_KEY_FRAME - 1
+
+
+class PacketType(Enum):
+    HEADER = "HEADER"
+    CONFIG = "CONFIG"
+    KEYFRAME = "KEYFRAME"
+    DELTA = "DELTA"
+
+
+class Packet(NamedTuple):
+    type: PacketType
+    pts: int | None
+    data: bytes  # scrcpy framing included, forwarded to the browser as is
+
+    @property
+    def payload(self) -> memoryview:
+        if self.type is PacketType.HEADER:
+            return memoryview(self.data)
+        return memoryview(self.data)[PACKET_HEADER.size :]
+
+
+class VideoDemuxer:
+    def __init__(self):
+        self.buffer = bytearray()
+        self.device_name = None
+        self.codec_id = None
+        self.width = None
+        self.height = None
+        self.header = None
+
+    def feed(self, data) -> list[Packet]:
+        buffer = self.buffer
+        buffer += data
+        packets = []
+        offset = 0
+
+        if self.header is None:
+            if len(buffer) < STREAM_HEADER_LENGTH:
+                return packets
+            self.header = bytes(buffer[:STREAM_HEADER_LENGTH])
+            self.device_name = (
+                self.header[:DEVICE_NAME_LENGTH].rstrip(b"\x00").decode(errors="replace")
+            )
+            self.codec_id, self.width, self.height = CODEC_META.unpack_from(
+                self.header, DEVICE_NAME_LENGTH
+            )
+            packets.append(Packet(PacketType.HEADER, None, self.header))
+            offset = STREAM_HEADER_LENGTH
+
+        available = len(buffer)
+        while available - offset >= PACKET_HEADER.size:
+            pts_and_flags, size = PACKET_HEADER.unpack_from(buffer, offset)
+            end = offset + PACKET_HEADER.size + size
+            if end > available:
+                break
+            if pts_and_flags & PACKET_FLAG_CONFIG:
+                packet_type, pts = PacketType.CONFIG, None
+            elif pts_and_flags & PACKET_FLAG_KEY_FRAME:
+                packet_type, pts = PacketType.KEYFRAME, pts_and_flags & PACKET_PTS_MASK
+            else:
+                packet_type, pts = PacketType.DELTA, pts_and_flags
+            packets.append(Packet(packet_type, pts, bytes(buffer[offset:end])))
+            offset = end
+
+        if offset:
+            # bytearray drops a prefix without moving the remaining bytes
+            del buffer[:offset]
+        return packets
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import threading
+from loguru import logger
+
+DEVICE_SERVER_PATH = "/data/local/tmp/scrcpy-server.jar"
+
+
+class ServerDeployCache:
+    def __init__(self, cache_path: str = "logs/scrcpy_deploy.json"):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.local_builds = {}  # server path -> (size, mtime, build)
+        self.devices = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.devices, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def build(self, server_path: str) -> dict:
+        # hashed once per jar version, rehashed only if the file changes
+        stat = os.stat(server_path)
+        with self.lock:
+            cached = self.local_builds.get(server_path)
+            if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                return cached[2]
+            digest = hashlib.sha256()
+            with open(server_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            build = {"sha256": digest.hexdigest(), "size": stat.st_size}
+            self.local_builds[server_path] = (stat.st_size, stat.st_mtime_ns, build)
+            return build
+
+    def is_deployed(self, serial: str, build: dict) -> bool:
+        with self.lock:
+            return self.devices.get(serial) == build
+
+    def remember(self, serial: str, build: dict):
+        with self.lock:
+            self.devices[serial] = build
+            try:
+                self._save()
+            except OSError as e:
+                logger.warning(f"Failed to save scrcpy deploy cache: {e}")
+
+    def forget(self, serial: str):
+        with self.lock:
+            if self.devices.pop(serial, None) is not None:
+                try:
+                    self._save()
+                except OSError as e:
+                    logger.warning(f"Failed to save scrcpy deploy cache: {e}")
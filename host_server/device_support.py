@@ -1,10 +1,18 @@
+import os
 import time
 import redis
 import requests
-import subprocess
 from enum import Enum
+from queue import Queue, Empty
+from threading import Thread
+from adb_client import adb, AdbError
 
 LINK = "http://localhost:8000"
+BATCH_WINDOW = float(os.environ.get("DEVICE_SUPPORT_BATCH_WINDOW", "0.5"))
+RESYNC_INTERVAL = float(os.environ.get("DEVICE_SUPPORT_RESYNC_INTERVAL", "300"))
+POLL_FALLBACK_PERIOD = 30
+RETRY_INTERVAL = 5
+
 
 class RequestsType(Enum):
     GET = "GET"
@@ -16,46 +24,163 @@ class RedisActionType(Enum):
     SADD = "SADD"
 
 
-def send_requests(path: str, type_requests: RequestsType) -> dict | None:
+def send_requests(path: str, type_requests: RequestsType, **kwargs) -> dict | None:
+    # None when the backend answered with an error, the caller keeps its state
     while True:
         try:
             if type_requests == RequestsType.GET:
-                res = requests.get(f"{LINK}{path}")
-                return res.json()
+                res = requests.get(f"{LINK}{path}", **kwargs)
             elif type_requests == RequestsType.PATCH:
-                requests.patch(f"{LINK}{path}")
+                res = requests.patch(f"{LINK}{path}", **kwargs)
+            else:
                 return None
         except requests.exceptions.ConnectionError:
             print(f"{LINK}{path} недоступен! Скорее всего, docker-compose не запущен")
             time.sleep(1)
+            continue
+        if not res.ok:
+            print(f"{LINK}{path} ответил {res.status_code}: {res.text[:200]}")
+            return None
+        try:
+            return res.json()
+        except ValueError:
+            print(f"{LINK}{path} вернул не JSON: {res.text[:200]}")
+            return None
 
 
 def redis_action(action_type: RedisActionType, data: str | list):
     redis_engine = redis.Redis(host="localhost", port=6379)
     try:
         if action_type == RedisActionType.SREM:
-            redis_engine.srem("devices", data)
+            redis_engine.srem("devices", *data)
         elif action_type == RedisActionType.SADD:
             redis_engine.sadd("devices", *data)
-    except ConnectionError:
+    except redis.exceptions.ConnectionError:
         print("Redis недоступен")
 
+
+def watch_devices(snapshots: Queue):
+    # adb pushes a new device list on every change; if tracking is not
+    # available the list is polled and only changed snapshots are passed on
+    while True:
+        try:
+            for snapshot in adb.track_devices():
+                snapshots.put(snapshot)
+        except (AdbError, OSError) as e:
+            print(f"track-devices недоступен, опрос adb devices: {e}")
+        previous = None
+        deadline = time.monotonic() + POLL_FALLBACK_PERIOD
+        while time.monotonic() < deadline:
+            try:
+                snapshot = adb.devices()
+            except (AdbError, OSError):
+                snapshot = {}
+            if snapshot != previous:
+                snapshots.put(snapshot)
+                previous = snapshot
+            time.sleep(1)
+
+
+def fetch_registered() -> dict[str, str] | None:
+    devices = send_requests("/v1/devices/", RequestsType.GET)
+    if devices is None:
+        return None
+    return {device["serial_number"]: device["status_device"] for device in devices}
+
+
+def send_transitions(transitions: dict[str, str]) -> tuple[list[str], list[str]] | None:
+    # (updated, not_found) serials, None if the batch was not applied
+    changes = [
+        {"serial_number": serial, "status_device": status}
+        for serial, status in transitions.items()
+    ]
+    res = send_requests(
+        "/v1/devices/status:batch", RequestsType.PATCH, json={"changes": changes}
+    )
+    if res is None:
+        return None
+    return res.get("updated", []), res.get("not_found", [])
+
+
+class DeviceTracker:
+    def __init__(self):
+        self.registered: dict[str, str] = {}  # serial -> status known to the backend
+        self.unregistered: set[str] | None = None
+        self.pending = False  # the last transitions were not applied
+
+    def resync(self):
+        registered = fetch_registered()
+        if registered is not None:
+            self.registered = registered
+
+    def apply(self, snapshot: dict[str, str]):
+        # only devices whose status differs from the backend view are sent
+        online = {serial for serial, state in snapshot.items() if state == "device"}
+        transitions = {}
+        for serial, status in self.registered.items():
+            desired = "ONLINE" if serial in online else "OFFLINE"
+            if status != desired:
+                transitions[serial] = desired
+        if transitions:
+            result = send_transitions(transitions)
+            if result is None:
+                # the backend view is unchanged, main() applies the snapshot
+                # again after RETRY_INTERVAL
+                self.pending = True
+                print(f"Смена статуса не применена: {transitions}")
+            else:
+                updated, not_found = result
+                accepted = {s: transitions[s] for s in updated if s in transitions}
+                self.registered.update(accepted)
+                for serial in not_found:
+                    # removed from the backend since the last resync
+                    self.registered.pop(serial, None)
+                self.pending = False
+                print(f"Смена статуса: {accepted}")
+
+        unregistered = set(snapshot) - set(self.registered)
+        if self.unregistered is None:
+            stale = set(self.registered)
+            added = unregistered
+        else:
+            stale = self.unregistered - unregistered
+            added = unregistered - self.unregistered
+        if stale:
+            redis_action(RedisActionType.SREM, list(stale))
+        if added:
+            redis_action(RedisActionType.SADD, list(added))
+        self.unregistered = unregistered
+
+
 def main():
+    snapshots = Queue()
+    Thread(target=watch_devices, args=(snapshots,), daemon=True).start()
+    tracker = DeviceTracker()
+    tracker.resync()
+    snapshot = None
+    next_resync = time.monotonic() + RESYNC_INTERVAL
     while True:
-        result = subprocess.run(["adb", "devices"], capture_output=True, text=True)
-        result = result.stdout.split("\n")[1:]
-        list_device = [x.split("\t")[0] for x in result if x != "" or x == "List of device attached"]
-        res = send_requests("/v1/devices/all-devices-online", RequestsType.GET)
-        for device in res:
-            if device in list_device:
-                send_requests(f"/v1/devices/update-status/online/{device}/online", RequestsType.PATCH)
-                list_device.remove(device)
-                redis_action(RedisActionType.SREM, device)
-            elif device not in list_device:
-                send_requests(f"/v1/devices/update-status/online/{device}/offline", RequestsType.PATCH)
-        if list_device:
-            redis_action(RedisActionType.SADD, list_device)
-        time.sleep(1)
+        try:
+            wake_at = next_resync
+            if tracker.pending:
+                wake_at = min(wake_at, time.monotonic() + RETRY_INTERVAL)
+            snapshot = snapshots.get(timeout=max(0, wake_at - time.monotonic()))
+            # a cable wiggle produces several snapshots in a row, keep the last
+            deadline = time.monotonic() + BATCH_WINDOW
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    snapshot = snapshots.get(timeout=remaining)
+                except Empty:
+                    break
+        except Empty:
+            pass
+        if time.monotonic() >= next_resync:
+            # picks up devices registered in the meantime and drift in the db
+            tracker.resync()
+            next_resync = time.monotonic() + RESYNC_INTERVAL
+        if snapshot is not None:
+            tracker.apply(snapshot)
+
 
 if "__main__" == __name__:
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,320 @@
+import asyncio
+import socket
+import threading
+import time
+from loguru import logger
+from demuxer import PacketType
+from gop_cache import GopCache
+from packet_queue import AsyncPacketQueue, PacketQueue, QueuePolicy
+
+
+def set_tcp_nodelay(environ: dict):
+    # the browser acks every batch; once it sends data back the kernel leaves
+    # quick-ack mode and Nagle holds the tail of each frame for the delayed
+    # ACK, adding up to 40 ms per frame
+    wsgi_input = environ.get("wsgi.input")
+    raw = getattr(getattr(wsgi_input, "rfile", wsgi_input), "raw", None)
+    sock = getattr(raw, "_sock", None)
+    if sock is not None:
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except OSError:
+            pass
+
+
+def join_packets(packets: list) -> bytes:
+    if len(packets) == 1:
+        return packets[0].data
+    return b"".join(packet.data for packet in packets)
+
+
+class Viewer:
+    queue_class = PacketQueue
+
+    def __init__(
+        self,
+        sid: str,
+        emit,
+        primer: list,
+        maxsize: int = 60,
+        max_batch: int = 32,
+        window: int = 8,
+        ack_timeout: float = 2.0,
+        metrics=None,
+    ):
+        self.sid = sid
+        self.emit = emit  # (sid, data, ack callback)
+        self.primer = primer
+        self.metrics = metrics
+        self.max_batch = max_batch
+        self.window = window
+        # an ack is requested for every half window, not for every batch
+        self.ack_every = max(1, window // 2)
+        self.ack_timeout = ack_timeout
+        # a viewer that falls behind loses its own stale frames and restarts
+        # at the next keyframe, the other viewers never wait for it
+        self.queue = self.queue_class(maxsize, QueuePolicy.DROP)
+        self.cond = threading.Condition()
+        self.unacked = 0
+        self.lost_acks = 0
+        self.sent = 0
+        self.sent_bytes = 0
+        self.report: dict = {}  # last client_stats from the page
+        self.closed = False
+
+    def needs_keyframe(self) -> bool:
+        # without a keyframe in the primer the viewer shows nothing until the
+        # encoder produces the next one
+        return not any(packet.type is PacketType.KEYFRAME for packet in self.primer)
+
+    def ack(self, *args):
+        with self.cond:
+            self.unacked = max(0, self.unacked - self.ack_every)
+            self.cond.notify()
+
+    def close(self):
+        self.queue.discard()
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+
+    def stats(self) -> dict:
+        return {
+            **self.queue.stats(),
+            "unacked": self.unacked,
+            "lost_acks": self.lost_acks,
+            "sent_bytes": self.sent_bytes,
+            "decode_lag": self.report.get("decode_lag"),
+        }
+
+    def wait_for_window(self) -> bool:
+        # the client acks a batch once it is handed to the decoder, so at
+        # most `window` batches are in the socket buffers of a slow link
+        with self.cond:
+            deadline = time.monotonic() + self.ack_timeout
+            while self.unacked >= self.window and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # a page that does not ack: fall back to one batch per timeout
+                    self.lost_acks += 1
+                    self.unacked -= self.ack_every
+                    break
+                self.cond.wait(remaining)
+            self.unacked += 1
+            return not self.closed
+
+    def send(self, data: bytes, packets: list):
+        self.sent += 1
+        ack = self.ack if self.sent % self.ack_every == 0 else None
+        try:
+            self.emit(self.sid, data, ack)
+        except Exception as e:
+            logger.error(f"Error sending video to {self.sid}: {e}")
+            return
+        self.send_done(data, packets)
+
+    def send_done(self, data: bytes, packets: list):
+        self.sent_bytes += len(data)
+        if self.metrics:
+            self.metrics.sent(packets, len(data))
+
+    def run(self):
+        if self.primer and self.wait_for_window():
+            # the primer is old by design, it is not counted in the packet age
+            self.send(join_packets(self.primer), [])
+        while self.wait_for_window():
+            batch = self.queue.get_batch(self.max_batch)
+            if not batch:
+                break
+            self.send(join_packets(batch), batch)
+
+
+class VideoFanout:
+    queue_class = PacketQueue
+    viewer_class = Viewer
+
+    def __init__(
+        self,
+        serial: str,
+        emit,
+        maxsize: int = 30,
+        max_batch: int = 32,
+        policy: QueuePolicy = QueuePolicy.DROP,
+        gop_cache_bytes: int = 8 * 1024 * 1024,
+        viewer_queue_size: int = 60,
+        ack_window: int = 8,
+        ack_timeout: float = 2.0,
+        metrics=None,
+    ):
+        self.serial = serial
+        self.emit = emit
+        self.max_batch = max_batch
+        self.viewer_queue_size = viewer_queue_size
+        self.ack_window = ack_window
+        self.ack_timeout = ack_timeout
+        self.metrics = metrics
+        self.queue = self.queue_class(maxsize, policy)
+        self.cache = GopCache(gop_cache_bytes)
+        self.viewers: dict[str, Viewer] = {}
+        self.retired_dropped = 0  # dropped by viewers that left
+        self.lock = threading.Lock()
+
+    def put(self, packet):
+        if self.metrics:
+            self.metrics.received(packet)
+        self.queue.put(packet)
+
+    def close(self):
+        self.queue.discard()
+
+    def stats(self) -> dict:
+        return {
+            **self.queue.stats(),
+            "viewers": {sid: viewer.stats() for sid, viewer in list(self.viewers.items())},
+        }
+
+    def dropped(self) -> int:
+        viewers = list(self.viewers.values())
+        return self.queue.dropped + self.retired_dropped + sum(v.queue.dropped for v in viewers)
+
+    def primer(self) -> list:
+        # what a new subscriber needs before the live packets: the stream
+        # header, the codec config and the current GOP already sent
+        return self.cache.snapshot()
+
+    def add_viewer(self, sid: str) -> Viewer:
+        # the primer and the registration happen under the lock the packets
+        # are distributed under, so the viewer gets every packet exactly once
+        with self.lock:
+            viewer = self.viewer_class(
+                sid,
+                self.emit,
+                self.primer(),
+                self.viewer_queue_size,
+                self.max_batch,
+                self.ack_window,
+                self.ack_timeout,
+                self.metrics,
+            )
+            self.viewers[sid] = viewer
+        return viewer
+
+    def subscribe(self, sid: str) -> Viewer:
+        viewer = self.add_viewer(sid)
+        threading.Thread(target=viewer.run, daemon=True).start()
+        return viewer
+
+    def unsubscribe(self, sid: str):
+        with self.lock:
+            viewer = self.viewers.pop(sid, None)
+        if viewer:
+            self.retired_dropped += viewer.queue.dropped
+            viewer.close()
+
+    def distribute(self, batch: list):
+        with self.lock:
+            for packet in batch:
+                # a restarted encoder sends a new stream header; viewers
+                # parsed one already and follow the new size from the SPS
+                restarted = packet.type is PacketType.HEADER and self.cache.header
+                self.cache.add(packet)
+                if restarted:
+                    continue
+                for viewer in self.viewers.values():
+                    viewer.queue.put(packet)
+
+    def close_viewers(self):
+        with self.lock:
+            viewers, self.viewers = list(self.viewers.values()), {}
+        for viewer in viewers:
+            viewer.close()
+
+    def run(self):
+        logger.info(f"Video send task started for {self.serial}")
+        while True:
+            batch = self.queue.get_batch(self.max_batch)
+            if not batch:
+                break
+            self.distribute(batch)
+        self.close_viewers()
+        logger.info(f"Video send task stopped for {self.serial}")
+
+
+class AsyncViewer(Viewer):
+    # a Viewer whose send loop is a task on the asyncio loop; emit is a
+    # coroutine function with the same (sid, data, ack callback) arguments
+    queue_class = AsyncPacketQueue
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.acked = asyncio.Event()
+        self.task = None
+
+    def ack(self, *args):
+        self.unacked = max(0, self.unacked - self.ack_every)
+        self.acked.set()
+
+    def close(self):
+        self.queue.discard()
+        self.closed = True
+        self.acked.set()
+
+    async def wait_for_window(self) -> bool:
+        deadline = time.monotonic() + self.ack_timeout
+        while self.unacked >= self.window and not self.closed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.lost_acks += 1
+                self.unacked -= self.ack_every
+                break
+            self.acked.clear()
+            try:
+                await asyncio.wait_for(self.acked.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        self.unacked += 1
+        return not self.closed
+
+    async def send(self, data: bytes, packets: list):
+        self.sent += 1
+        ack = self.ack if self.sent % self.ack_every == 0 else None
+        try:
+            await self.emit(self.sid, data, ack)
+        except Exception as e:
+            logger.error(f"Error sending video to {self.sid}: {e}")
+            return
+        self.send_done(data, packets)
+
+    async def run(self):
+        if self.primer and await self.wait_for_window():
+            await self.send(join_packets(self.primer), [])
+        while await self.wait_for_window():
+            batch = await self.queue.get_batch_async(self.max_batch)
+            if not batch:
+                break
+            await self.send(join_packets(batch), batch)
+
+
+class AsyncVideoFanout(VideoFanout):
+    queue_class = AsyncPacketQueue
+    viewer_class = AsyncViewer
+
+    async def put(self, packet):
+        if self.metrics:
+            self.metrics.received(packet)
+        await self.queue.put_wait(packet)
+
+    def subscribe(self, sid: str) -> AsyncViewer:
+        viewer = self.add_viewer(sid)
+        viewer.task = asyncio.get_running_loop().create_task(viewer.run())
+        return viewer
+
+    async def run(self):
+        logger.info(f"Video send task started for {self.serial}")
+        while True:
+            batch = await self.queue.get_batch_async(self.max_batch)
+            if not batch:
+                break
+            self.distribute(batch)
+        self.close_viewers()
+        logger.info(f"Video send task stopped for {self.serial}")
@@ -0,0 +1,35 @@
+from demuxer import Packet, PacketType
+
+
+class GopCache:
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.header = None
+        self.config = None
+        self.gop: list[Packet] = []
+        self.gop_bytes = 0
+
+    def add(self, packet: Packet):
+        if packet.type is PacketType.HEADER:
+            self.header = packet
+        elif packet.type is PacketType.CONFIG:
+            # a new config means a new encoder session, the old GOP is useless
+            self.config = packet
+            self.gop = []
+            self.gop_bytes = 0
+        elif packet.type is PacketType.KEYFRAME:
+            self.gop = [packet]
+            self.gop_bytes = len(packet.data)
+        elif self.gop:
+            self.gop_bytes += len(packet.data)
+            if self.gop_bytes > self.max_bytes:
+                # a GOP with holes cannot be decoded, keep nothing until the
+                # next keyframe rather than replaying a broken one
+                self.gop = []
+                self.gop_bytes = 0
+            else:
+                self.gop.append(packet)
+
+    def snapshot(self) -> list[Packet]:
+        packets = [p for p in (self.header, self.config) if p is not None]
+        return packets + self.gop
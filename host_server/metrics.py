@@ -0,0 +1,222 @@
+import time
+from bisect import bisect_left
+from demuxer import PacketType
+
+# seconds; fixed buckets so an observation is one bisect and two adds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name: str, labels: str) -> list[str]:
+        lines = []
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class DeviceMetrics:
+    def __init__(self):
+        self.bytes_in = 0
+        self.packets_in = 0
+        self.bytes_out = 0
+        self.packets_out = 0
+        self.packet_age = Histogram()
+        self.control_rtt = Histogram()
+        self.input_latency = Histogram()
+        self.control_in = 0
+        self.control_coalesced = 0
+        self.control_writes = 0
+        # the smallest wall clock minus PTS seen: the packet that reached the
+        # host fastest defines zero age for the current encoder session
+        self.pts_offset = None
+
+    def received(self, packet):
+        self.bytes_in += len(packet.data)
+        self.packets_in += 1
+        if packet.pts is None:
+            if packet.type is PacketType.CONFIG:
+                # a new encoder session, its PTS start from zero again
+                self.pts_offset = None
+            return
+        offset = time.monotonic() - packet.pts / 1_000_000
+        if self.pts_offset is None or offset < self.pts_offset:
+            self.pts_offset = offset
+
+    def sent(self, packets: list, size: int):
+        self.bytes_out += size
+        self.packets_out += len(packets)
+        if self.pts_offset is None:
+            return
+        # one observation per emitted batch, the age of its oldest packet:
+        # per packet it cost the fan-out almost a third of its time
+        for packet in packets:
+            if packet.pts is not None:
+                now = time.monotonic() - self.pts_offset
+                self.packet_age.observe(max(0.0, now - packet.pts / 1_000_000))
+                return
+
+
+COUNTERS = (
+    ("scrcpy_video_in_bytes_total", "Video bytes received from the device", "bytes_in"),
+    ("scrcpy_video_in_packets_total", "Video packets received from the device", "packets_in"),
+    ("scrcpy_video_out_bytes_total", "Video bytes sent to viewers", "bytes_out"),
+    ("scrcpy_video_out_packets_total", "Video packets sent to viewers", "packets_out"),
+    ("scrcpy_control_in_messages_total", "Control messages received from the page", "control_in"),
+    (
+        "scrcpy_control_coalesced_messages_total",
+        "Touch moves dropped because a later move of the same pointer was in the batch",
+        "control_coalesced",
+    ),
+    ("scrcpy_control_writes_total", "Writes to the device control socket", "control_writes"),
+)
+HISTOGRAMS = (
+    (
+        "scrcpy_packet_age_seconds",
+        "Time from capture (device PTS) to the emit to a viewer of the oldest packet of each "
+        "batch, relative to the fastest packet",
+        "packet_age",
+    ),
+    (
+        "scrcpy_control_rtt_seconds",
+        "Control channel round trip measured by the page",
+        "control_rtt",
+    ),
+    (
+        "scrcpy_input_latency_seconds",
+        "Input event in the page until the host wrote it to the device",
+        "input_latency",
+    ),
+)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.devices: dict[str, DeviceMetrics] = {}
+
+    def device(self, serial: str) -> DeviceMetrics:
+        metrics = self.devices.get(serial)
+        if metrics is None:
+            metrics = self.devices[serial] = DeviceMetrics()
+        return metrics
+
+    def render(self, gauges: list[tuple[str, str, str, dict]] = ()) -> str:
+        # gauges: (name, type, help, {serial: value}) read at scrape time
+        lines = []
+        devices = sorted(self.devices.items())
+        for name, help_text, attr in COUNTERS:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for serial, metrics in devices:
+                lines.append(f'{name}{{serial="{serial}"}} {getattr(metrics, attr)}')
+        for name, help_text, attr in HISTOGRAMS:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for serial, metrics in devices:
+                lines.extend(getattr(metrics, attr).samples(name, f'serial="{serial}"'))
+        for name, kind, help_text, values in gauges:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for serial, value in sorted(values.items()):
+                if value is not None:
+                    lines.append(f'{name}{{serial="{serial}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def wsgi_app(self, collect):
+        # served on its own port so a scrape never queues behind socket.io
+        def app(environ, start_response):
+            if environ.get("PATH_INFO") != "/metrics":
+                start_response("404 Not Found", [("Content-Type", "text/plain")])
+                return [b"not found\n"]
+            body = self.render(collect()).encode()
+            start_response(
+                "200 OK",
+                [
+                    ("Content-Type", "text/plain; version=0.0.4; charset=utf-8"),
+                    ("Content-Length", str(len(body))),
+                ],
+            )
+            return [body]
+
+        return app
+
+
+def session_gauges(sessions: list) -> list:
+    # (serial, Session) pairs of either engine, read at scrape time
+
+    def per_session(value) -> dict:
+        return {serial: value(session) for serial, session in sessions}
+
+    def recorder_queue(session):
+        recorder = session.scrcpy.recorder
+        return len(recorder.queue) if recorder else None
+
+    def viewer_queue(session):
+        viewers = list(session.fanout.viewers.values())
+        return max((len(viewer.queue) for viewer in viewers), default=0)
+
+    return [
+        ("scrcpy_viewers", "gauge", "Connected viewers", per_session(lambda s: s.viewers)),
+        (
+            "scrcpy_video_queue_packets",
+            "gauge",
+            "Packets between the device reader and the fanout",
+            per_session(lambda s: len(s.fanout.queue)),
+        ),
+        (
+            "scrcpy_viewer_queue_packets_max",
+            "gauge",
+            "Deepest viewer send buffer",
+            per_session(viewer_queue),
+        ),
+        (
+            "scrcpy_dropped_packets_total",
+            "counter",
+            "Video packets dropped by the fanout and the viewer buffers",
+            per_session(lambda s: s.fanout.dropped()),
+        ),
+        (
+            "scrcpy_recorder_queue_packets",
+            "gauge",
+            "Packets the recorder has not written yet, spilled ones included",
+            per_session(recorder_queue),
+        ),
+        (
+            "scrcpy_time_to_ready_seconds",
+            "gauge",
+            "Session start until the video socket was accepted",
+            per_session(lambda s: s.scrcpy.time_to_ready),
+        ),
+        (
+            "scrcpy_time_to_first_frame_seconds",
+            "gauge",
+            "Session start until the first video frame",
+            per_session(lambda s: s.scrcpy.time_to_first_frame),
+        ),
+        (
+            "scrcpy_video_bit_rate",
+            "gauge",
+            "Encoder bit rate of the current quality rung",
+            per_session(lambda s: s.quality.rung.bit_rate),
+        ),
+    ]
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,180 @@
+import struct
+from demuxer import CODEC_META, DEVICE_NAME_LENGTH, Packet, PacketType
+
+# Minimal live Matroska muxer for H.264 scrcpy packets: unknown-size segment
+# and clusters, one SimpleBlock per packet, timestamps taken from the scrcpy
+# PTS. The output is playable while it is being written.
+
+EBML = 0x1A45DFA3
+EBML_VERSION = 0x4286
+EBML_READ_VERSION = 0x42F7
+EBML_MAX_ID_LENGTH = 0x42F2
+EBML_MAX_SIZE_LENGTH = 0x42F3
+DOC_TYPE = 0x4282
+DOC_TYPE_VERSION = 0x4287
+DOC_TYPE_READ_VERSION = 0x4285
+SEGMENT = 0x18538067
+INFO = 0x1549A966
+TIMESTAMP_SCALE = 0x2AD7B1
+MUXING_APP = 0x4D80
+WRITING_APP = 0x5741
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+TRACK_UID = 0x73C5
+TRACK_TYPE = 0x83
+CODEC_ID = 0x86
+CODEC_PRIVATE = 0x63A2
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CLUSTER = 0x1F43B675
+TIMESTAMP = 0xE7
+SIMPLE_BLOCK = 0xA3
+
+UNKNOWN_SIZE = b"\x01\xff\xff\xff\xff\xff\xff\xff"
+MAX_BLOCK_OFFSET_MS = 30000
+
+NAL_SPS = 7
+NAL_PPS = 8
+
+
+def _id(element_id: int) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big")
+
+
+def _size(size: int) -> bytes:
+    length = 1
+    while size >= (1 << (7 * length)) - 1:
+        length += 1
+    return (size | (1 << (7 * length))).to_bytes(length, "big")
+
+
+def _element(element_id: int, data: bytes) -> bytes:
+    return _id(element_id) + _size(len(data)) + data
+
+
+def _uint(element_id: int, value: int) -> bytes:
+    return _element(element_id, value.to_bytes(max(1, (value.bit_length() + 7) // 8), "big"))
+
+
+def split_nal_units(data) -> list[bytes]:
+    data = bytes(data)
+    units = []
+    start = data.find(b"\x00\x00\x01")
+    while start != -1:
+        start += 3
+        end = data.find(b"\x00\x00\x01", start)
+        if end == -1:
+            units.append(data[start:])
+            break
+        units.append(data[start:end].rstrip(b"\x00"))
+        start = end
+    return [unit for unit in units if unit]
+
+
+def avc_decoder_configuration(sps: bytes, pps: bytes) -> bytes:
+    return (
+        bytes([1, sps[1], sps[2], sps[3], 0xFF, 0xE1])
+        + struct.pack(">H", len(sps))
+        + sps
+        + b"\x01"
+        + struct.pack(">H", len(pps))
+        + pps
+    )
+
+
+def to_length_prefixed(units: list[bytes]) -> bytes:
+    return b"".join(struct.pack(">I", len(unit)) + unit for unit in units)
+
+
+class MatroskaWriter:
+    def __init__(self, stream, width: int = 0, height: int = 0):
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self.started = False
+        self.pending_config = None
+        self.first_pts = None
+        self.cluster_ts = None
+
+    def _write_header(self, sps: bytes, pps: bytes):
+        ebml = _element(
+            EBML,
+            _uint(EBML_VERSION, 1)
+            + _uint(EBML_READ_VERSION, 1)
+            + _uint(EBML_MAX_ID_LENGTH, 4)
+            + _uint(EBML_MAX_SIZE_LENGTH, 8)
+            + _element(DOC_TYPE, b"matroska")
+            + _uint(DOC_TYPE_VERSION, 4)
+            + _uint(DOC_TYPE_READ_VERSION, 2),
+        )
+        info = _element(
+            INFO,
+            _uint(TIMESTAMP_SCALE, 1_000_000)
+            + _element(MUXING_APP, b"host_server")
+            + _element(WRITING_APP, b"host_server"),
+        )
+        video = _uint(PIXEL_WIDTH, self.width) + _uint(PIXEL_HEIGHT, self.height)
+        track = _element(
+            TRACK_ENTRY,
+            _uint(TRACK_NUMBER, 1)
+            + _uint(TRACK_UID, 1)
+            + _uint(TRACK_TYPE, 1)
+            + _element(CODEC_ID, b"V_MPEG4/ISO/AVC")
+            + _element(CODEC_PRIVATE, avc_decoder_configuration(sps, pps))
+            + _element(VIDEO, video),
+        )
+        self.stream.write(ebml + _id(SEGMENT) + UNKNOWN_SIZE + info + _element(TRACKS, track))
+        self.started = True
+
+    def _on_config(self, packet: Packet):
+        units = split_nal_units(packet.payload)
+        sps = next((u for u in units if u[0] & 0x1F == NAL_SPS), None)
+        pps = next((u for u in units if u[0] & 0x1F == NAL_PPS), None)
+        if sps is None or pps is None:
+            return
+        if not self.started:
+            self._write_header(sps, pps)
+        else:
+            # resolution changes (rotation) keep the original CodecPrivate,
+            # the new parameter sets travel in-band with the next keyframe
+            self.pending_config = units
+
+    def write_packet(self, packet: Packet):
+        if packet.type is PacketType.HEADER:
+            _, self.width, self.height = CODEC_META.unpack_from(
+                packet.data, DEVICE_NAME_LENGTH
+            )
+            return
+        if packet.type is PacketType.CONFIG:
+            self._on_config(packet)
+            return
+        if not self.started:
+            return
+        keyframe = packet.type is PacketType.KEYFRAME
+        if self.first_pts is None:
+            if not keyframe:
+                return
+            self.first_pts = packet.pts
+
+        units = split_nal_units(packet.payload)
+        if keyframe and self.pending_config:
+            units = self.pending_config + units
+            self.pending_config = None
+
+        ts = max(0, (packet.pts - self.first_pts) // 1000)
+        out = b""
+        if (
+            self.cluster_ts is None
+            or keyframe
+            or not 0 <= ts - self.cluster_ts <= MAX_BLOCK_OFFSET_MS
+        ):
+            self.cluster_ts = ts
+            out = _id(CLUSTER) + UNKNOWN_SIZE + _uint(TIMESTAMP, ts)
+        block = (
+            b"\x81"  # track number 1
+            + struct.pack(">hB", ts - self.cluster_ts, 0x80 if keyframe else 0)
+            + to_length_prefixed(units)
+        )
+        self.stream.write(out + _element(SIMPLE_BLOCK, block))
@@ -0,0 +1,186 @@
+import json
+import os
+import queue
+import threading
+import time
+import requests
+from loguru import logger
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        # takes a token, returns how long the caller has to wait for it
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def wait(self):
+        delay = self.acquire()
+        if delay:
+            time.sleep(delay)
+
+
+def split_message(lines: list[str], limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    messages, current = [], ""
+    for line in lines:
+        # a line longer than a message goes out in several, nothing is cut off
+        while len(line) > limit:
+            if current:
+                messages.append(current)
+                current = ""
+            messages.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            messages.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages
+
+
+class TelegramNotifier:
+    def __init__(
+        self,
+        token: str,
+        chat_id: int | str,
+        api_url: str = "https://api.telegram.org",
+        window: float = 3.0,
+        rate: float = 1.0,
+        burst: int = 3,
+        outbox_path: str = "logs/telegram_outbox.jsonl",
+        timeout: float = 10.0,
+        retry_delay: float = 5.0,
+    ):
+        self.url = f"{api_url.rstrip('/')}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.window = window
+        self.bucket = TokenBucket(rate, burst)
+        self.outbox_path = outbox_path
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        self.events = queue.Queue()
+        self.session = requests.Session()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.outbox = self._load_outbox()
+        self.sent = 0
+        self.failed = 0
+
+    def _load_outbox(self) -> list[str]:
+        try:
+            with open(self.outbox_path, "r", encoding="utf-8") as f:
+                return [json.loads(line)["text"] for line in f if line.strip()]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def _save_outbox(self):
+        # undelivered messages survive a restart
+        try:
+            os.makedirs(os.path.dirname(self.outbox_path) or ".", exist_ok=True)
+            tmp_path = f"{self.outbox_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for text in self.outbox:
+                    f.write(json.dumps({"text": text}, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.outbox_path)
+        except OSError as e:
+            logger.warning(f"Failed to save telegram outbox: {e}")
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._worker, daemon=True)
+                self.thread.start()
+        return self
+
+    def notify(self, text: str):
+        self.start()
+        self.events.put((time.time(), text))
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.events.qsize(),
+            "outbox": len(self.outbox),
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+    def _collect(self) -> list[tuple[float, str]]:
+        # the first event opens a window, everything arriving in it is one digest
+        timeout = self.retry_delay if self.outbox else None
+        try:
+            batch = [self.events.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.window
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                batch.append(self.events.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _digest(self, batch: list[tuple[float, str]]) -> list[str]:
+        if len(batch) == 1:
+            return split_message([batch[0][1]])
+        lines = [
+            f"{time.strftime('%H:%M:%S', time.localtime(ts))} {text}" for ts, text in batch
+        ]
+        return split_message(lines)
+
+    def _worker(self):
+        # messages restored from the outbox go out without waiting for an event
+        self._flush()
+        while True:
+            batch = self._collect()
+            if batch:
+                self.outbox.extend(self._digest(batch))
+                self._save_outbox()
+            self._flush()
+
+    def _flush(self):
+        while self.outbox:
+            self.bucket.wait()
+            try:
+                res = self.session.post(
+                    self.url,
+                    json={"chat_id": self.chat_id, "text": self.outbox[0]},
+                    timeout=self.timeout,
+                )
+            except requests.RequestException as e:
+                self.failed += 1
+                logger.warning(f"Telegram is unreachable, will retry: {e}")
+                return
+            if res.status_code == 429:
+                try:
+                    retry_after = res.json()["parameters"]["retry_after"]
+                except (ValueError, KeyError, TypeError):
+                    retry_after = self.retry_delay
+                self.failed += 1
+                time.sleep(retry_after)
+                continue
+            if res.status_code >= 500:
+                self.failed += 1
+                return
+            if res.status_code != 200:
+                # a message Telegram rejects would block the outbox forever
+                logger.error(f"Telegram rejected a message: {res.status_code} {res.text}")
+            else:
+                self.sent += 1
+            self.outbox.pop(0)
+            self._save_outbox()
@@ -0,0 +1,197 @@
+import asyncio
+import struct
+import tempfile
+import threading
+from collections import deque
+from enum import Enum
+from demuxer import Packet, PacketType
+
+SPILL_RECORD = struct.Struct(">BqI")  # packet type, pts (-1 for None), size
+PACKET_TYPES = list(PacketType)
+
+
+class QueuePolicy(Enum):
+    BLOCK = "BLOCK"  # the producer waits, pushing back on the device socket
+    DROP = "DROP"  # queued frames are discarded, deltas dropped until a keyframe
+    SPILL = "SPILL"  # overflow goes to a temporary file and is replayed in order
+
+
+class PacketQueue:
+    def __init__(self, maxsize: int, policy: QueuePolicy = QueuePolicy.DROP):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+        self.spilled = 0
+        self.skip_deltas = False
+        self.spill_file = None
+        self.spill_count = 0
+        self.spill_read_pos = 0
+        self.spill_write_pos = 0
+
+    def __len__(self):
+        return len(self.items) + self.spill_count
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy.value,
+            "maxsize": self.maxsize,
+            "depth": len(self),
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+        }
+
+    def put(self, packet: Packet) -> bool:
+        with self.cond:
+            if self.closed:
+                return False
+            if self.policy == QueuePolicy.BLOCK:
+                while len(self.items) >= self.maxsize and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return False
+            elif self.policy == QueuePolicy.DROP:
+                if not self._admit(packet):
+                    self.dropped += 1
+                    return False
+            elif self.spill_count or len(self.items) >= self.maxsize:
+                self._spill(packet)
+                return True
+            self.items.append(packet)
+            self.cond.notify()
+            return True
+
+    def _admit(self, packet: Packet) -> bool:
+        if packet.type is PacketType.KEYFRAME:
+            self.skip_deltas = False
+        elif packet.type is PacketType.DELTA and self.skip_deltas:
+            return False
+        if len(self.items) < self.maxsize:
+            return True
+        # the consumer fell behind: whatever video is queued is already stale,
+        # keep only the stream header and codec config and restart at a keyframe
+        kept = deque(
+            p for p in self.items if p.type in (PacketType.HEADER, PacketType.CONFIG)
+        )
+        self.dropped += len(self.items) - len(kept)
+        self.items = kept
+        if packet.type is PacketType.DELTA:
+            self.skip_deltas = True
+            return False
+        return True
+
+    def _spill(self, packet: Packet):
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+        self.spill_file.seek(self.spill_write_pos)
+        pts = -1 if packet.pts is None else packet.pts
+        self.spill_file.write(
+            SPILL_RECORD.pack(PACKET_TYPES.index(packet.type), pts, len(packet.data))
+        )
+        self.spill_file.write(packet.data)
+        self.spill_write_pos = self.spill_file.tell()
+        self.spill_count += 1
+        self.spilled += 1
+        self.cond.notify()
+
+    def _unspill(self):
+        self.spill_file.seek(self.spill_read_pos)
+        while self.spill_count and len(self.items) < self.maxsize:
+            type_index, pts, size = SPILL_RECORD.unpack(
+                self.spill_file.read(SPILL_RECORD.size)
+            )
+            data = self.spill_file.read(size)
+            self.items.append(
+                Packet(PACKET_TYPES[type_index], None if pts < 0 else pts, data)
+            )
+            self.spill_count -= 1
+        self.spill_read_pos = self.spill_file.tell()
+        if not self.spill_count:
+            self.spill_file.seek(0)
+            self.spill_file.truncate()
+            self.spill_read_pos = self.spill_write_pos = 0
+
+    def get_batch(self, max_items: int = 1) -> list[Packet]:
+        # blocks until at least one packet is queued; empty list once closed
+        with self.cond:
+            while not self.items and not self.spill_count and not self.closed:
+                self.cond.wait()
+            if not self.items and self.spill_count:
+                self._unspill()
+            if self.closed and not self.items and self.spill_file is not None:
+                self.spill_file.close()
+                self.spill_file = None
+            batch = []
+            while self.items and len(batch) < max_items:
+                batch.append(self.items.popleft())
+            if self.policy == QueuePolicy.BLOCK:
+                self.cond.notify_all()
+            return batch
+
+    def get(self) -> Packet | None:
+        batch = self.get_batch(1)
+        return batch[0] if batch else None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def discard(self):
+        with self.cond:
+            self.closed = True
+            self.items.clear()
+            self.spill_count = 0
+            if self.spill_file is not None:
+                self.spill_file.close()
+                self.spill_file = None
+            self.cond.notify_all()
+
+
+class AsyncPacketQueue(PacketQueue):
+    # the same policies for producers and consumers on one asyncio loop: the
+    # condition is never waited on, put() and get_batch() only run once the
+    # events say they will not block
+    def __init__(self, maxsize: int, policy: QueuePolicy = QueuePolicy.DROP):
+        super().__init__(maxsize, policy)
+        self.readable = asyncio.Event()
+        self.writable = asyncio.Event()
+
+    def put(self, packet: Packet) -> bool:
+        if self.policy == QueuePolicy.BLOCK and len(self.items) >= self.maxsize:
+            # a full BLOCK queue would stop the loop, producers use put_wait
+            self.dropped += 1
+            return False
+        added = super().put(packet)
+        self.readable.set()
+        return added
+
+    async def put_wait(self, packet: Packet) -> bool:
+        while (
+            self.policy == QueuePolicy.BLOCK
+            and len(self.items) >= self.maxsize
+            and not self.closed
+        ):
+            self.writable.clear()
+            await self.writable.wait()
+        return self.put(packet)
+
+    async def get_batch_async(self, max_items: int = 1) -> list[Packet]:
+        while not self.items and not self.spill_count and not self.closed:
+            self.readable.clear()
+            await self.readable.wait()
+        batch = self.get_batch(max_items)
+        self.writable.set()
+        return batch
+
+    def close(self):
+        super().close()
+        self.readable.set()
+        self.writable.set()
+
+    def discard(self):
+        super().discard()
+        self.readable.set()
+        self.writable.set()
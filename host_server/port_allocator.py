@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import deque
+from loguru import logger
+
+SCRCPY_SOCKET = "localabstract:scrcpy"
+
+
+class PortAllocator:
+    def __init__(self, start: int = 30000, end: int = 40000, quarantine_time: float = 600):
+        self.start = start
+        self.end = end
+        self.quarantine_time = quarantine_time
+        self.free = deque(range(start, end))
+        self.leases: dict[str, int] = {}  # serial -> port
+        self.owners: dict[int, str] = {}  # port -> serial
+        self.quarantined: dict[int, float] = {}  # port -> monotonic time it is free again
+        self.lock = threading.Lock()
+
+    def __contains__(self, port: int) -> bool:
+        return self.start <= port < self.end
+
+    def acquire(self, serial: str) -> int:
+        # one forward per device: a serial that already holds a lease keeps it
+        with self.lock:
+            port = self.leases.get(serial)
+            if port is not None:
+                return port
+            now = time.monotonic()
+            for _ in range(len(self.free)):
+                port = self.free.popleft()
+                until = self.quarantined.get(port)
+                if until is not None:
+                    if until > now:
+                        # another program may still hold it, try it again later
+                        self.free.append(port)
+                        continue
+                    del self.quarantined[port]
+                if port not in self.owners:
+                    self.leases[serial] = port
+                    self.owners[port] = serial
+                    return port
+            raise RuntimeError(f"No free ports left in {self.start}-{self.end}")
+
+    def release(self, serial: str, quarantine: bool = False, port: int | None = None):
+        # a port another program on this host is bound to is not handed out
+        # again for quarantine_time; with `port` the lease is only released
+        # if it is still that one
+        with self.lock:
+            if port is not None and self.leases.get(serial) != port:
+                return
+            port = self.leases.pop(serial, None)
+            if port is None:
+                return
+            self.owners.pop(port, None)
+            if quarantine:
+                self.quarantined[port] = time.monotonic() + self.quarantine_time
+            self.free.append(port)
+
+    def port_of(self, serial: str) -> int | None:
+        return self.leases.get(serial)
+
+    def reconcile(self, adb_client):
+        # forwards in our range left behind by a crashed run are removed;
+        # nothing holds a lease yet at startup
+        try:
+            forwards = adb_client.list_forward()
+        except Exception as e:
+            logger.warning(f"Failed to list adb forwards: {e}")
+            return
+        for serial, local, remote in forwards:
+            if not local.startswith("tcp:") or remote != SCRCPY_SOCKET:
+                continue
+            port = int(local[len("tcp:"):])
+            if port not in self or port in self.owners:
+                continue
+            try:
+                adb_client.kill_forward(serial, local)
+                logger.info(f"Removed stale forward {local} -> {serial}")
+            except Exception as e:
+                logger.warning(f"Failed to remove stale forward {local}: {e}")
@@ -1,27 +1,57 @@
 import subprocess
 import os
-import queue
 import threading
+from enum import Enum
 from loguru import logger
+from demuxer import PacketType
+from mkv import MatroskaWriter
+from packet_queue import PacketQueue, QueuePolicy
 
 # TODO: refactoring
 
 
+class RecordMode(Enum):
+    REMUX = "REMUX"  # stream copy of the device H.264 into mkv / fragmented mp4
+    REENCODE = "REENCODE"  # libx264 re-encode, costs host CPU per session
+
+
 class Recorder:
-    def __init__(self, filename, serial):
+    def __init__(
+        self,
+        filename,
+        serial,
+        mode: RecordMode = RecordMode.REMUX,
+        queue_size: int = 512,
+        queue_policy: QueuePolicy = QueuePolicy.SPILL,
+    ):
         self.filename = filename
         self.serial = serial
+        self.mode = mode
         self.process = None
-        self.queue = queue.Queue()
+        self.output = None
+        self.muxer = None
+        self.queue = PacketQueue(queue_size, queue_policy)
         self.running = False
         self.thread = None
-        self.buffer = bytearray()
         self.header_sent = False
         self.packet_count = 0
 
-    def start(self):
-        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
-        cmd = [
+    def _ffmpeg_cmd(self):
+        if self.mode == RecordMode.REMUX:
+            return [
+                "ffmpeg",
+                "-y",
+                "-f",
+                "matroska",
+                "-i",
+                "pipe:0",
+                "-c:v",
+                "copy",
+                "-movflags",
+                "frag_keyframe+empty_moov+default_base_moof",
+                self.filename,
+            ]
+        return [
             "ffmpeg",
             "-y",
             "-f",
@@ -44,19 +74,29 @@ class Recorder:
             "cfr",
             self.filename,
         ]
-        try:
-            self.process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=False,
-            )
-        except FileNotFoundError:
-            return
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        if self.mode == RecordMode.REMUX and self.filename.endswith(".mkv"):
+            # matroska is written directly, no ffmpeg process at all
+            self.output = open(self.filename, "wb")
+        else:
+            try:
+                self.process = subprocess.Popen(
+                    self._ffmpeg_cmd(),
+                    stdin=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    universal_newlines=False,
+                )
+            except FileNotFoundError:
+                return
+            self.output = self.process.stdin
+            threading.Thread(target=self._read_stderr, daemon=True).start()
+        if self.mode == RecordMode.REMUX:
+            self.muxer = MatroskaWriter(self.output)
         self.running = True
         self.thread = threading.Thread(target=self._writer, daemon=True)
         self.thread.start()
-        threading.Thread(target=self._read_stderr, daemon=True).start()
 
     def _read_stderr(self):
         if self.process:
@@ -64,58 +104,46 @@ class Recorder:
                 ...
 
     def _writer(self):
-        while self.running:
+        while True:
             try:
-                data = self.queue.get(timeout=0.5)
-                if data is None:
+                packet = self.queue.get()
+                if packet is None:
                     break
-                self.process.stdin.write(data)
-                self.process.stdin.flush()
+                if self.muxer:
+                    self.muxer.write_packet(packet)
+                else:
+                    self.output.write(packet.payload)
+                self.output.flush()
                 self.packet_count += 1
                 if self.packet_count % 100 == 0:
                     ...
-            except queue.Empty:
-                continue
             except Exception as e:
+                self.queue.discard()
                 break
 
-    def write(self, data):
+    def write(self, packet):
         if not self.running:
             return
-        if len(data) < 4:
-            return
-
-        if not self.header_sent:
-            self.buffer.extend(data)
-            start_code = b"\x00\x00\x00\x01"
-            pos = 0
-            while pos <= len(self.buffer) - 4:
-                if self.buffer[pos : pos + 4] == start_code:
-                    nal_type = self.buffer[pos + 4] & 0x1F
-                    if nal_type == 7:
-                        self.queue.put(bytes(self.buffer[pos:]))
-                        self.header_sent = True
-                        self.buffer = None
-                        return
-                    pos += 4
-                else:
-                    pos += 1
-            if len(self.buffer) > 1024 * 1024:
-                self.queue.put(bytes(self.buffer))
+        if self.mode == RecordMode.REENCODE:
+            # ffmpeg reads a raw Annex B stream, it has to start with SPS/PPS
+            if packet.type is PacketType.HEADER:
+                return
+            if not self.header_sent:
+                if packet.type is not PacketType.CONFIG:
+                    return
                 self.header_sent = True
-                self.buffer = None
-            return
-        else:
-            self.queue.put(data)
+        self.queue.put(packet)
 
     def stop(self):
         logger.info(f"Остановка записи для {self.serial}, видео сохранено")
         self.running = False
+        self.queue.close()
         if self.thread:
             self.thread.join(timeout=3)
-        if self.process:
+        if self.output:
             try:
-                self.process.stdin.close()
+                self.output.close()
             except:
                 pass
+        if self.process:
             self.process.wait(timeout=5)
@@ -0,0 +1,142 @@
+from loguru import logger
+from config import settings
+from control import coalesce_moves, split_batch
+from metrics import registry
+from utils import record_options
+
+# Who watches and who controls each device, and what the socket.io handlers
+# do with a session once they have it. Shared by app.py and async_app.py,
+# the engines only do the I/O: socket.io rooms and emits, pool calls and
+# the scrcpy restarts.
+
+
+class Rooms:
+    def __init__(self, on_controller=None):
+        self.devices: dict[str, str] = {}  # sid -> serial
+        self.clients: dict[str, set[str]] = {}  # serial -> set(sid)
+        self.controllers: dict[str, str] = {}  # serial -> sid allowed to send input
+        self.restarting: set[str] = set()  # serials whose encoder is being reconfigured
+        self.on_controller = on_controller  # (serial, started) when control starts or ends
+
+    def serial_of(self, sid: str) -> str | None:
+        return self.devices.get(sid)
+
+    def sids(self, serial: str) -> list[str]:
+        return list(self.clients.get(serial, ()))
+
+    def controller(self, serial: str) -> str | None:
+        return self.controllers.get(serial)
+
+    def join(self, sid: str, serial: str):
+        self.devices[sid] = serial
+        self.clients.setdefault(serial, set()).add(sid)
+
+    def leave(self, sid: str) -> str | None:
+        serial = self.devices.pop(sid, None)
+        if not serial:
+            return None
+        clients = self.clients.get(serial, set())
+        clients.discard(sid)
+        if self.controllers.get(serial) == sid:
+            self.controllers.pop(serial)
+            if self.on_controller:
+                self.on_controller(serial, False)
+        if not clients:
+            self.clients.pop(serial, None)
+        else:
+            logger.debug(f"Client {sid} left, still {len(clients)} clients for {serial}")
+        return serial
+
+    def assign_role(self, sid: str, serial: str, observe: bool) -> bool:
+        # the first client controls the device, everyone joining while it is
+        # connected (or with ?mode=observe) only watches the same stream
+        if not observe and serial not in self.controllers:
+            self.controllers[serial] = sid
+            if self.on_controller:
+                self.on_controller(serial, True)
+        else:
+            logger.info(f"Observer {sid} joined {serial}")
+        return self.controllers.get(serial) == sid
+
+    def quality_sample(self, session) -> dict | None:
+        # the quality follows the controlling client; observers only drop frames
+        viewers = session.fanout.stats()["viewers"]
+        viewer = viewers.get(self.controllers.get(session.serial))
+        if viewer is None and viewers:
+            viewer = min(viewers.values(), key=lambda v: v["depth"])
+        return viewer
+
+    def quality_updates(self, sessions: list, min_level: int) -> list:
+        # (session, rung) for every session whose encoder has to be reconfigured
+        updates = []
+        for session in sessions:
+            if session.serial in self.restarting:
+                continue
+            rung = session.quality.update(self.quality_sample(session), min_level)
+            if rung:
+                updates.append((session, rung))
+        return updates
+
+    def begin_restart(self, session, rung) -> bool:
+        if session.serial in self.restarting:
+            return False
+        self.restarting.add(session.serial)
+        logger.info(
+            f"Quality for {session.serial}: {rung.bit_rate // 1000} kbps, "
+            f"max_size {rung.max_size}, max_fps {rung.max_fps}"
+        )
+        return True
+
+    def end_restart(self, session):
+        self.restarting.discard(session.serial)
+
+    def control_batch(self, sid: str, session, data) -> bool:
+        serial = self.devices.get(sid)
+        if not serial or self.controllers.get(serial) != sid:
+            return False
+        if not session or not isinstance(data, bytes):
+            return False
+        try:
+            messages = split_batch(data)
+        except ValueError as e:
+            logger.warning(f"Bad control batch from {sid}: {e}")
+            return False
+        kept = coalesce_moves(messages)
+        if kept:
+            # the whole animation frame goes to the device in one write
+            session.scrcpy.scrcpy_send_control(b"".join(kept))
+        metrics = registry.device(serial)
+        metrics.control_in += len(messages)
+        metrics.control_coalesced += len(messages) - len(kept)
+        metrics.control_writes += bool(kept)
+        # the page times the batch from its first event to this ack
+        return True
+
+    def client_stats(self, sid: str, session, data):
+        viewer = session.fanout.viewers.get(sid) if session else None
+        if not viewer or not isinstance(data, dict):
+            return
+        viewer.report = data
+        metrics = registry.device(session.serial)
+        rtt = data.get("control_rtt")
+        if isinstance(rtt, (int, float)) and rtt >= 0:
+            metrics.control_rtt.observe(rtt)
+        latencies = data.get("input_latency")
+        for latency in latencies[:100] if isinstance(latencies, list) else ():
+            if isinstance(latency, (int, float)) and latency >= 0:
+                metrics.input_latency.observe(latency)
+
+
+def recording_options(session) -> dict | None:
+    # the first viewer starts the recording; the engine runs start_recording,
+    # the asyncio one off the loop since it opens files and spawns ffmpeg
+    return record_options() if session.viewers == 1 else None
+
+
+def attach_viewer(session, sid: str):
+    # a running session: the viewer gets the cached config and current GOP
+    # first, then the live packets through its own buffer
+    viewer = session.fanout.subscribe(sid)
+    if settings.REQUEST_KEYFRAME_ON_JOIN or viewer.needs_keyframe():
+        session.scrcpy.scrcpy_request_keyframe()
+    return viewer
@@ -1,17 +1,30 @@
 import os
 from threading import Thread
-import subprocess
 import socket
 import time
 from loguru import logger
 import datetime
-from recorder import Recorder
+from recorder import Recorder, RecordMode
+from demuxer import VideoDemuxer, PacketType
+from packet_queue import QueuePolicy
+from deploy_cache import ServerDeployCache, DEVICE_SERVER_PATH
+from adb_client import AdbClient, AdbError, adb
+from port_allocator import PortAllocator
 
 # TODO: refactoring
 
+CONTROL_MSG_RESET_VIDEO = 17
+
 
 class Scrcpy:
-    def __init__(self, serial_number: str, local_port: int):
+    def __init__(
+        self,
+        serial_number: str,
+        local_port: int | None = None,
+        deploy_cache: ServerDeployCache | None = None,
+        adb_client: AdbClient | None = None,
+        port_allocator: PortAllocator | None = None,
+    ):
         self.video_socket = None
         self.audio_socket = None
         self.control_socket = None
@@ -20,95 +33,163 @@ class Scrcpy:
         self.video_thread = None
         self.audio_thread = None
         self.control_thread = None
-        self.android_process = None
+        self.server_conn = None
+        self.server_exited = False
 
         self.serial_number = serial_number
         self.local_port = local_port
-        self.adb_path = "adb"
+        self.adb = adb_client or adb
+        self.port_allocator = port_allocator
         self.server_path = rf"{os.getcwd()}\host_server\scrcpy-server"
+        self.deploy_cache = deploy_cache
         self.stop = False
+        self.demuxer = None
+        self.header_packet = None
+        self.config_packet = None
+        self.started_at = None
+        self.time_to_ready = None
+        self.time_to_first_frame = None
+        self.keyframe_requested_at = 0.0
+        self.video_bit_rate = None
+        self.max_size = 0
+        self.max_fps = 0
+        self.record_options = None
+        self.restarts = 0
 
-    def push_server_to_device(self):
-        device_server_path = "/data/local/tmp/scrcpy-server.jar"
-        result = subprocess.run(
-            [
-                self.adb_path,
-                "-s",
-                self.serial_number,
-                "push",
-                self.server_path,
-                device_server_path,
-            ],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode != 0:
-            logger.error(f"Error pushing server: {result.stderr}")
+    def adb_shell(self, command: str) -> str | None:
+        try:
+            return self.adb.shell(self.serial_number, command).strip()
+        except (AdbError, OSError) as e:
+            logger.warning(f"adb shell on {self.serial_number} failed: {e}")
+            return None
+
+    def server_is_deployed(self, build: dict) -> bool:
+        if self.deploy_cache.is_deployed(self.serial_number, build):
+            # the build is known to be there, a size check is enough to catch
+            # a wiped /data/local/tmp
+            output = self.adb_shell(f"stat -c %s {DEVICE_SERVER_PATH}")
+            return output == str(build["size"])
+        output = self.adb_shell(f"sha256sum {DEVICE_SERVER_PATH}")
+        if output and output.split()[0] == build["sha256"]:
+            self.deploy_cache.remember(self.serial_number, build)
+            return True
+        return False
+
+    def push_server_to_device(self, force: bool = False):
+        build = None
+        if self.deploy_cache:
+            build = self.deploy_cache.build(self.server_path)
+            if not force and self.server_is_deployed(build):
+                logger.debug(f"scrcpy-server already deployed on {self.serial_number}")
+                return True
+        try:
+            self.adb.push(self.serial_number, self.server_path, DEVICE_SERVER_PATH)
+        except (AdbError, OSError) as e:
+            logger.error(f"Error pushing server: {e}")
+            if self.deploy_cache:
+                self.deploy_cache.forget(self.serial_number)
             return False
+        if build:
+            self.deploy_cache.remember(self.serial_number, build)
         return True
 
-    def setup_adb_forward(self):
-        subprocess.run(
-            [
-                self.adb_path,
-                "-s",
-                self.serial_number,
-                "forward",
-                f"tcp:{self.local_port}",
-                "localabstract:scrcpy",
-            ],
-            check=True,
-        )
+    def setup_adb_forward(self, attempts: int = 3):
+        if not self.port_allocator:
+            self.adb.forward(
+                self.serial_number, f"tcp:{self.local_port}", "localabstract:scrcpy"
+            )
+            return
+        for attempt in range(attempts):
+            self.local_port = self.port_allocator.acquire(self.serial_number)
+            try:
+                self.adb.forward(
+                    self.serial_number, f"tcp:{self.local_port}", "localabstract:scrcpy"
+                )
+                return
+            except AdbError as e:
+                # "cannot bind listener": another program on the host holds the port
+                busy = "bind" in str(e)
+                self.port_allocator.release(
+                    self.serial_number, quarantine=busy, port=self.local_port
+                )
+                if not busy or attempt == attempts - 1:
+                    raise
+                logger.warning(f"Port {self.local_port} for {self.serial_number} is busy: {e}")
+            except OSError:
+                self.port_allocator.release(self.serial_number, port=self.local_port)
+                raise
 
     def remove_adb_forward(self):
-        subprocess.run(
-            [
-                self.adb_path,
-                "-s",
-                self.serial_number,
-                "forward",
-                "--remove",
-                f"tcp:{self.local_port}",
-            ],
-            capture_output=True,
+        if self.local_port is None:
+            return
+        lease = self.port_allocator.port_of(self.serial_number) if self.port_allocator else None
+        if self.port_allocator and lease != self.local_port:
+            # the lease went to another port, the forward on ours is not ours to remove
+            return
+        try:
+            self.adb.kill_forward(self.serial_number, f"tcp:{self.local_port}")
+        except (AdbError, OSError):
+            pass
+        if self.port_allocator:
+            self.port_allocator.release(self.serial_number, port=self.local_port)
+
+    def server_command(self) -> str:
+        cmd = (
+            f"CLASSPATH={DEVICE_SERVER_PATH} app_process / com.genymobile.scrcpy.Server 3.1 "
+            f"tunnel_forward=true log_level=VERBOSE video_bit_rate={self.video_bit_rate}"
         )
+        if self.max_size:
+            cmd += f" max_size={self.max_size}"
+        if self.max_fps:
+            cmd += f" max_fps={self.max_fps}"
+        return cmd
+
+    def log_server_line(self, line: bytes):
+        line = line.decode(errors="replace").strip()
+        if "ERROR" in line or "Exception" in line:
+            logger.error(f"Server error: {line}")
+        elif line:
+            logger.debug(f"Server: {line}")
 
     def start_server(self):
-        device_server_path = "/data/local/tmp/scrcpy-server.jar"
-        cmd = [
-            self.adb_path,
-            "-s",
-            self.serial_number,
-            "shell",
-            f"CLASSPATH={device_server_path} app_process / com.genymobile.scrcpy.Server 3.1 "
-            f"tunnel_forward=true log_level=VERBOSE video_bit_rate={self.video_bit_rate}",
-        ]
-        self.android_process = subprocess.Popen(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-        while not self.stop:
-            stderr_line = self.android_process.stderr.readline().decode().strip()
-            if not stderr_line:
-                break
-            if stderr_line:
-                logger.error(f"Server error: {stderr_line}")
-        self.android_process.wait()
+        try:
+            self.server_conn = self.adb.open_shell(self.serial_number, self.server_command())
+            # the shell service merges stdout and stderr
+            for line in self.server_conn.sock.makefile("rb"):
+                if self.stop:
+                    break
+                self.log_server_line(line)
+        except (AdbError, OSError) as e:
+            if not self.stop:
+                logger.error(f"scrcpy server on {self.serial_number} failed: {e}")
+        finally:
+            self.server_exited = True
+
+    def track_packet(self, packet):
+        if packet.type is PacketType.HEADER:
+            self.header_packet = packet
+        elif packet.type is PacketType.CONFIG:
+            self.config_packet = packet
+        elif self.time_to_first_frame is None:
+            self.time_to_first_frame = time.monotonic() - self.started_at
+            logger.bind(connection=True).info(
+                f"Первый кадр от {self.serial_number} через "
+                f"{self.time_to_first_frame:.2f} с"
+            )
+        if self.recorder:
+            self.recorder.write(packet)
 
     def receive_video_data(self):
         logger.info("Receiving video data (H.264)...")
         self.video_socket.settimeout(1.0)
-        try:
-            self.video_socket.recv(1)
-        except socket.timeout:
-            pass
         while not self.stop:
             try:
                 data = self.video_socket.recv(262144)
                 if not data:
                     break
-                if self.recorder:
-                    self.recorder.write(data)
-                self.video_callback(data)
+                for packet in self.demuxer.feed(data):
+                    self.track_packet(packet)
+                    self.video_callback(packet)
             except socket.timeout:
                 continue
             except Exception as e:
@@ -131,8 +212,6 @@ class Scrcpy:
                 data = self.audio_socket.recv(1024)
                 if not data:
                     break
-                if self.recorder:
-                    self.recorder.write(data)
             except socket.timeout:
                 continue
             except (socket.error, ConnectionError) as e:
@@ -162,23 +241,110 @@ class Scrcpy:
                     break
                 break
 
-    def scrcpy_start(self, video_callback, video_bit_rate, record=True):
+    def connect_when_ready(self, deadline: float):
+        # adb accepts the forwarded connection even before the server listens
+        # and closes it right away; the server answers with a dummy byte once
+        # it has accepted the video socket
+        delay = 0.05
+        while not self.stop and time.monotonic() < deadline:
+            if self.server_exited:
+                logger.error(f"scrcpy server on {self.serial_number} exited early")
+                return None
+            sock = None
+            try:
+                sock = socket.create_connection(("localhost", self.local_port), timeout=1.0)
+                sock.settimeout(max(0.1, min(1.0, deadline - time.monotonic())))
+                if sock.recv(1):
+                    sock.settimeout(None)
+                    return sock
+            except OSError:
+                pass
+            if sock:
+                sock.close()
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+        return None
+
+    def scrcpy_start(
+        self,
+        video_callback,
+        video_bit_rate,
+        record=True,
+        record_mode=RecordMode.REMUX,
+        record_format="mp4",
+        record_queue_size=512,
+        record_queue_policy=QueuePolicy.SPILL,
+        force_push=False,
+        startup_timeout=10.0,
+        max_size=0,
+        max_fps=0,
+    ):
+        self.reset(video_callback, video_bit_rate, max_size, max_fps)
+        if not self.push_server_to_device(force=force_push):
+            return False
+
+        try:
+            self.setup_adb_forward()
+        except (AdbError, OSError) as e:
+            logger.error(f"adb forward for {self.serial_number} failed: {e}")
+            return False
+        if not self.connect_streams(startup_timeout):
+            self.scrcpy_stop()
+            return False
+        self.time_to_ready = time.monotonic() - self.started_at
+
+        if record:
+            self.start_recording(
+                record_mode, record_format, record_queue_size, record_queue_policy
+            )
+        self.start_readers()
+        return True
+
+    def reset(self, video_callback, video_bit_rate, max_size=0, max_fps=0):
+        self.started_at = time.monotonic()
+        self.time_to_ready = None
+        self.time_to_first_frame = None
         self.video_bit_rate = video_bit_rate
+        self.max_size = max_size
+        self.max_fps = max_fps
         self.video_callback = video_callback
         self.stop = False
         self.recorder = None
+        self.demuxer = VideoDemuxer()
+        self.header_packet = None
+        self.config_packet = None
 
-        if not self.push_server_to_device():
-            return
+    def restart(self, video_bit_rate, max_size=0, max_fps=0, startup_timeout=10.0):
+        # scrcpy 3.1 cannot change the encoder settings of a running server:
+        # it is restarted on the same forward and the new stream continues
+        # the old one for the viewers, starting with a new config and keyframe
+        record_options = self.record_options if self.recorder else None
+        self.shutdown_streams()
+        self.stop_recording()
+        self.stop = False
+        self.video_bit_rate = video_bit_rate
+        self.max_size = max_size
+        self.max_fps = max_fps
+        self.demuxer = VideoDemuxer()
+        self.restarts += 1
+        if not self.connect_streams(startup_timeout):
+            return False
+        if record_options:
+            # the new stream restarts its timestamps, it goes to a new file
+            self.start_recording(**record_options)
+        self.start_readers()
+        return True
 
-        self.setup_adb_forward()
+    def connect_streams(self, startup_timeout) -> bool:
+        self.server_exited = False
         self.android_thread = Thread(target=self.start_server, daemon=True)
         self.android_thread.start()
-        time.sleep(2)
 
         # video connection
-        self.video_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.video_socket.connect(("localhost", self.local_port))
+        self.video_socket = self.connect_when_ready(time.monotonic() + startup_timeout)
+        if not self.video_socket:
+            logger.error(f"scrcpy server on {self.serial_number} is not ready")
+            return False
 
         # audio connection
         self.audio_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -187,13 +353,9 @@ class Scrcpy:
         # control connection
         self.control_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.control_socket.connect(("localhost", self.local_port))
+        return True
 
-        if record:
-            timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = f"logs/recordings/{self.serial_number}_{timestamp}.mp4"
-            self.recorder = Recorder(filename, self.serial_number)
-            self.recorder.start()
-
+    def start_readers(self):
         self.video_thread = Thread(target=self.receive_video_data, daemon=True)
         self.audio_thread = Thread(target=self.receive_audio_data, daemon=True)
         self.control_thread = Thread(target=self.handle_control_conn, daemon=True)
@@ -201,18 +363,62 @@ class Scrcpy:
         self.audio_thread.start()
         self.control_thread.start()
 
+    def start_recording(
+        self,
+        record_mode=RecordMode.REMUX,
+        record_format="mp4",
+        record_queue_size=512,
+        record_queue_policy=QueuePolicy.SPILL,
+    ):
+        self.record_options = {
+            "record_mode": record_mode,
+            "record_format": record_format,
+            "record_queue_size": record_queue_size,
+            "record_queue_policy": record_queue_policy,
+        }
+        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        filename = f"logs/recordings/{self.serial_number}_{timestamp}.{record_format}"
+        recorder = Recorder(
+            filename,
+            self.serial_number,
+            record_mode,
+            record_queue_size,
+            record_queue_policy,
+        )
+        recorder.start()
+        # a recording joining a running stream needs the header and codec
+        # config first, the muxer then waits for the next keyframe
+        for packet in (self.header_packet, self.config_packet):
+            if packet is not None:
+                recorder.write(packet)
+        self.recorder = recorder
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder:
+            recorder.stop()
+
     def scrcpy_stop(self):
+        self.shutdown_streams()
+        self.stop_recording()
+        self.remove_adb_forward()
+
+    def shutdown_streams(self):
         self.stop = True
         if self.video_socket:
-            self.video_socket.shutdown(socket.SHUT_RDWR)
+            try:
+                self.video_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self.video_socket.close()
         if self.audio_socket:
             self.audio_socket.close()
         if self.control_socket:
-            self.control_socket.shutdown(socket.SHUT_RDWR)
+            try:
+                self.control_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self.control_socket.close()
-        if self.recorder:
-            self.recorder.stop()
 
         if self.video_thread:
             self.video_thread.join()
@@ -221,14 +427,34 @@ class Scrcpy:
         if self.control_thread:
             self.control_thread.join()
 
-        if self.android_process:
-            self.android_process.terminate()
+        if self.server_conn:
+            # closing the shell connection hangs up the server process
+            try:
+                self.server_conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.server_conn.close()
         if self.android_thread:
             self.android_thread.join()
+        self.video_socket = self.audio_socket = self.control_socket = None
+        self.server_conn = None
 
-        self.remove_adb_forward()
+    def scrcpy_request_keyframe(self, min_interval: float = 1.0):
+        # RESET_VIDEO restarts the encoder: a new config packet and an IDR follow.
+        # Observers joining together share one reset
+        now = time.monotonic()
+        if now - self.keyframe_requested_at < min_interval:
+            return
+        self.keyframe_requested_at = now
+        self.scrcpy_send_control(bytes([CONTROL_MSG_RESET_VIDEO]))
 
     def scrcpy_send_control(self, data):
         if isinstance(data, str):
             data = data.encode("utf-8")
-        self.control_socket.send(data)
+        control_socket = self.control_socket
+        if not control_socket:
+            return
+        try:
+            control_socket.sendall(data)
+        except OSError as e:
+            logger.warning(f"Control message to {self.serial_number} failed: {e}")
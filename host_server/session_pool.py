@@ -0,0 +1,308 @@
+import asyncio
+import time
+import threading
+from loguru import logger
+
+
+class SessionPoolFull(Exception):
+    pass
+
+
+class Session:
+    def __init__(self, serial: str, scrcpy, fanout, task=None, quality=None):
+        self.serial = serial
+        self.scrcpy = scrcpy
+        self.fanout = fanout
+        self.task = task
+        self.quality = quality
+        self.viewers = 0
+
+    def stop(self):
+        self.fanout.close()
+        self.scrcpy.scrcpy_stop()
+
+    def stats(self) -> dict:
+        recorder = self.scrcpy.recorder
+        return {
+            "viewers": self.viewers,
+            "local_port": self.scrcpy.local_port,
+            "quality": {"level": self.quality.level, **self.quality.rung._asdict()},
+            "restarts": self.scrcpy.restarts,
+            "time_to_ready": self.scrcpy.time_to_ready,
+            "time_to_first_frame": self.scrcpy.time_to_first_frame,
+            "video": self.fanout.stats(),
+            "recorder": recorder.queue.stats() if recorder else None,
+        }
+
+
+class AsyncSession(Session):
+    async def stop(self):
+        self.fanout.close()
+        await self.scrcpy.scrcpy_stop()
+
+
+class SessionPool:
+    def __init__(
+        self,
+        start_session,
+        warm: bool = False,
+        max_sessions: int = 16,
+        idle_timeout: float = 1800,
+    ):
+        self.start_session = start_session  # serial -> Session | None
+        self.warm = warm
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.sessions: dict[str, Session] = {}
+        self.starting: dict[str, threading.Event] = {}
+        # a serial is not started again until its previous session has
+        # stopped: both would use the same forward port lease
+        self.stopping: dict[str, threading.Event] = {}
+        self.last_used: dict[str, float] = {}
+        # started by a batch: counted as in use until a viewer releases them
+        # or they are stopped, the budget never evicts them
+        self.pinned: set[str] = set()
+        self.created_at = time.monotonic()
+        self.lock = threading.RLock()
+
+    def get(self, serial: str) -> Session | None:
+        return self.sessions.get(serial)
+
+    def _start(self, serial: str, attach: bool = False, pin: bool = False) -> Session | None:
+        # sessions start outside the lock, a second caller for the same serial
+        # waits for the first one instead of launching another server
+        while True:
+            with self.lock:
+                session = self.sessions.get(serial)
+                if session is not None:
+                    self._claim(session, attach, pin)
+                    return session
+                pending = self.starting.get(serial) or self.stopping.get(serial)
+                if pending is None:
+                    pending = self.starting[serial] = threading.Event()
+                    break
+            pending.wait()
+        try:
+            self._make_room(strict=pin)
+            session = self.start_session(serial)
+            if session is not None:
+                with self.lock:
+                    self.sessions[serial] = session
+                    self._claim(session, attach, pin)
+            return session
+        finally:
+            with self.lock:
+                self.starting.pop(serial, None)
+            pending.set()
+
+    def _claim(self, session: Session, attach: bool, pin: bool):
+        if attach:
+            self._attach(session)
+        if pin:
+            self.pinned.add(session.serial)
+
+    def _attach(self, session: Session):
+        session.viewers += 1
+        self.last_used[session.serial] = time.monotonic()
+
+    def start(self, serial: str, pin: bool = False) -> Session | None:
+        return self._start(serial, pin=pin)
+
+    def acquire(self, serial: str) -> Session | None:
+        return self._start(serial, attach=True)
+
+    def release(self, serial: str) -> Session | None:
+        with self.lock:
+            session = self.sessions.get(serial)
+            if session is None:
+                return None
+            session.viewers = max(0, session.viewers - 1)
+            self.last_used[serial] = time.monotonic()
+            self.pinned.discard(serial)
+            stop = not session.viewers and not self.warm
+        if stop:
+            self.stop(serial)
+        return session
+
+    def stop(self, serial: str):
+        with self.lock:
+            session = self.sessions.pop(serial, None)
+            self.pinned.discard(serial)
+            if session is None:
+                return
+            stopped = self.stopping[serial] = threading.Event()
+        logger.info(f"Stopping scrcpy for {serial}")
+        try:
+            session.stop()
+        finally:
+            with self.lock:
+                self.stopping.pop(serial, None)
+            stopped.set()
+
+    def stop_all(self):
+        for serial in list(self.sessions):
+            self.stop(serial)
+
+    def _idle_sessions(self) -> list[Session]:
+        idle = [
+            s for s in self.sessions.values() if not s.viewers and s.serial not in self.pinned
+        ]
+        return sorted(idle, key=lambda s: self.last_used.get(s.serial, 0))
+
+    def _room_victims(self, strict: bool = False) -> list[str]:
+        # the budget never evicts a session somebody is watching or a batch
+        # started; a viewer still gets its session over the budget, a strict
+        # (batch) start is refused instead; WARM_POOL_MAX_SESSIONS only
+        # applies to the warm pool, without it nothing is kept to evict
+        if not self.warm:
+            return []
+        with self.lock:
+            idle = self._idle_sessions()
+            # sessions being started, this one included, count against the budget
+            excess = len(self.sessions) + len(self.starting) - self.max_sessions
+            if strict and excess > len(idle):
+                raise SessionPoolFull(f"all {self.max_sessions} sessions are in use")
+            return [session.serial for session in idle[: max(0, excess)]]
+
+    def _make_room(self, strict: bool = False):
+        for serial in self._room_victims(strict):
+            self.stop(serial)
+
+    def _expired(self) -> list[str]:
+        now = time.monotonic()
+        with self.lock:
+            return [
+                session.serial
+                for session in self._idle_sessions()
+                if now - self.last_used.get(session.serial, self.created_at)
+                > self.idle_timeout
+            ]
+
+    def evict_idle(self):
+        for serial in self._expired():
+            logger.info(f"Evicting idle session {serial}")
+            self.stop(serial)
+
+    def _prewarm_candidates(self, serials: list[str]) -> list[str]:
+        # devices not used for longer than idle_timeout stay cold until a
+        # viewer opens them again; the most recently used are warmed first
+        now = time.monotonic()
+        candidates = [
+            serial
+            for serial in serials
+            if serial not in self.sessions
+            and now - self.last_used.get(serial, self.created_at) <= self.idle_timeout
+        ]
+        candidates.sort(key=lambda serial: self.last_used.get(serial, 0), reverse=True)
+        return candidates
+
+    def prewarm(self, serials: list[str]):
+        for serial in self._prewarm_candidates(serials):
+            with self.lock:
+                if len(self.sessions) >= self.max_sessions:
+                    return
+            if self._start(serial) is not None:
+                logger.info(f"Pre-warmed session {serial}")
+
+    def _retired(self, serials: set[str]) -> list[str]:
+        # idle sessions of devices that are no longer ACTIVE
+        with self.lock:
+            return [
+                session.serial
+                for session in self._idle_sessions()
+                if session.serial not in serials
+            ]
+
+    def retire(self, serials: set[str]):
+        for serial in self._retired(serials):
+            self.stop(serial)
+
+
+class AsyncSessionPool(SessionPool):
+    # the same pool for an asyncio engine: start_session is a coroutine
+    # function and sessions are AsyncSession; the lock is only held between
+    # awaits, it never blocks the loop
+    async def _start(
+        self, serial: str, attach: bool = False, pin: bool = False
+    ) -> Session | None:
+        while True:
+            with self.lock:
+                session = self.sessions.get(serial)
+                if session is not None:
+                    self._claim(session, attach, pin)
+                    return session
+                pending = self.starting.get(serial) or self.stopping.get(serial)
+                if pending is None:
+                    pending = self.starting[serial] = asyncio.Event()
+                    break
+            await pending.wait()
+        try:
+            await self._make_room(strict=pin)
+            session = await self.start_session(serial)
+            if session is not None:
+                with self.lock:
+                    self.sessions[serial] = session
+                    self._claim(session, attach, pin)
+            return session
+        finally:
+            with self.lock:
+                self.starting.pop(serial, None)
+            pending.set()
+
+    async def start(self, serial: str, pin: bool = False) -> Session | None:
+        return await self._start(serial, pin=pin)
+
+    async def acquire(self, serial: str) -> Session | None:
+        return await self._start(serial, attach=True)
+
+    async def release(self, serial: str) -> Session | None:
+        with self.lock:
+            session = self.sessions.get(serial)
+            if session is None:
+                return None
+            session.viewers = max(0, session.viewers - 1)
+            self.last_used[serial] = time.monotonic()
+            self.pinned.discard(serial)
+            stop = not session.viewers and not self.warm
+        if stop:
+            await self.stop(serial)
+        return session
+
+    async def stop(self, serial: str):
+        with self.lock:
+            session = self.sessions.pop(serial, None)
+            self.pinned.discard(serial)
+            if session is None:
+                return
+            stopped = self.stopping[serial] = asyncio.Event()
+        logger.info(f"Stopping scrcpy for {serial}")
+        try:
+            await session.stop()
+        finally:
+            with self.lock:
+                self.stopping.pop(serial, None)
+            stopped.set()
+
+    async def stop_all(self):
+        await asyncio.gather(*(self.stop(serial) for serial in list(self.sessions)))
+
+    async def _make_room(self, strict: bool = False):
+        for serial in self._room_victims(strict):
+            await self.stop(serial)
+
+    async def evict_idle(self):
+        for serial in self._expired():
+            logger.info(f"Evicting idle session {serial}")
+            await self.stop(serial)
+
+    async def prewarm(self, serials: list[str]):
+        for serial in self._prewarm_candidates(serials):
+            with self.lock:
+                if len(self.sessions) >= self.max_sessions:
+                    return
+            if await self._start(serial) is not None:
+                logger.info(f"Pre-warmed session {serial}")
+
+    async def retire(self, serials: set[str]):
+        for serial in self._retired(serials):
+            await self.stop(serial)
@@ -70,7 +70,9 @@ class ScrcpyInput {
             }
         });
 
-        // --- Throttled mousemove ---
+        // --- mousemove ---
+        // every move is passed on: the page sends one batch per animation
+        // frame and the host keeps only the last move of the batch
         const rawMouseMoveHandler = (event) => {
             if (!leftButtonIsPressed) return;
 
@@ -86,8 +88,7 @@ class ScrcpyInput {
                 this.callback(data);
             }
         };
-        const throttledMouseMove = this.throttle(rawMouseMoveHandler, 20); // 20 мс ≈ 50 раз/сек
-        document.addEventListener('mousemove', throttledMouseMove);
+        document.addEventListener('mousemove', rawMouseMoveHandler);
 
         // --- (Опционально) Throttled touchmove для сенсорных экранов ---
         // Если понадобится поддержка касаний, раскомментируйте блок ниже
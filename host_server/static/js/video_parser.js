@@ -14,54 +14,67 @@ class VideoParser {
     }
 
     appendData(data) {
-        const newBuffer = new Uint8Array(this.buffer.length + data.length);
-        newBuffer.set(this.buffer, 0);
-        newBuffer.set(data, this.buffer.length);
-        this.buffer = newBuffer;
+        // the host sends whole scrcpy frames, so the buffer is normally empty
+        // here and the incoming message is parsed in place without copying
+        if (this.buffer.length === 0) {
+            this.buffer = data;
+        } else {
+            const newBuffer = new Uint8Array(this.buffer.length + data.length);
+            newBuffer.set(this.buffer, 0);
+            newBuffer.set(data, this.buffer.length);
+            this.buffer = newBuffer;
+        }
         this.scrcpyProcessBuffer();
     }
 
     scrcpyProcessBuffer() {
+        const buffer = this.buffer;
+        const view = new DataView(buffer.buffer, buffer.byteOffset, buffer.byteLength);
         let startIndex = 0;
         if (this.name == null) {
-            if (this.buffer.length >= 64) {
-                const name = this.buffer.slice(0, 64);
-                this.name = new TextDecoder().decode(name);
-                console.log("Device name:" + this.name);
-                if (this.onNaluCallback) {
-                    this.onNaluCallback({
-                        type: 'name',
-                        data: { "name": this.name }
-                    });
-                }
-                startIndex = 64;
+            if (buffer.length < 64) {
+                return;
             }
-        } else if (this.width == null) {
-            if (this.buffer.length >= 12) {
-                const id = new DataView(this.buffer.buffer).getInt32(0, false);
-                this.width = new DataView(this.buffer.buffer).getInt32(4, false);
-                this.height = new DataView(this.buffer.buffer).getInt32(8, false);
-                console.log("width:" + this.width + " height:" + this.height);
-                if (this.onNaluCallback) {
-                    this.onNaluCallback({
-                        type: 'screen_size',
-                        data: { "width": this.width, "height": this.height }
-                    });
-                }
-                startIndex += 12;
+            const name = buffer.subarray(0, 64);
+            this.name = new TextDecoder().decode(name);
+            console.log("Device name:" + this.name);
+            if (this.onNaluCallback) {
+                this.onNaluCallback({
+                    type: 'name',
+                    data: { "name": this.name }
+                });
             }
-        } else while (this.buffer.length - startIndex > 12) {
-            // const flag = new DataView(this.buffer.buffer).getInt64(0, false);
-            const size = new DataView(this.buffer.buffer).getInt32(startIndex + 8, false);
-            if (this.buffer.length - startIndex >= 12 + size) {
-                const nalu = this.buffer.slice(startIndex + 12, startIndex + 12 + size);
+            startIndex = 64;
+        }
+        if (this.width == null) {
+            if (buffer.length - startIndex < 12) {
+                this.buffer = buffer.subarray(startIndex);
+                return;
+            }
+            const id = view.getInt32(startIndex, false);
+            this.width = view.getInt32(startIndex + 4, false);
+            this.height = view.getInt32(startIndex + 8, false);
+            console.log("width:" + this.width + " height:" + this.height);
+            if (this.onNaluCallback) {
+                this.onNaluCallback({
+                    type: 'screen_size',
+                    data: { "width": this.width, "height": this.height }
+                });
+            }
+            startIndex += 12;
+        }
+        while (buffer.length - startIndex >= 12) {
+            // const flag = view.getBigUint64(startIndex, false);
+            const size = view.getInt32(startIndex + 8, false);
+            if (buffer.length - startIndex >= 12 + size) {
+                const nalu = buffer.subarray(startIndex + 12, startIndex + 12 + size);
                 this.processBuffer(nalu)
                 startIndex = startIndex + 12 + size;
             } else {
                 break;
             }
         }
-        this.buffer = this.buffer.slice(startIndex);
+        this.buffer = buffer.subarray(startIndex);
     }
 
     findSequence(arr, sequence, startIndex = 0) {
@@ -0,0 +1,7 @@
+import os
+import sys
+
+HOST_SERVER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the host server modules import each other flat, the fakes live in benchmarks/
+sys.path.insert(0, HOST_SERVER)
+sys.path.insert(0, os.path.join(HOST_SERVER, "benchmarks"))
@@ -0,0 +1,47 @@
+import struct
+import pytest
+from control import LENGTH, coalesce_moves, split_batch
+
+ACTION_DOWN, ACTION_UP, ACTION_MOVE = 0, 1, 2
+
+
+def touch(action: int, pointer: int, x: int) -> bytes:
+    return struct.pack(">BBqiiHHHII", 2, action, pointer, x, 0, 1080, 2400, 0xFFFF, 0, 0)
+
+
+def key(code: int) -> bytes:
+    return struct.pack(">BBiii", 0, 0, code, 0, 0)
+
+
+def batch(messages: list[bytes]) -> bytes:
+    return b"".join(LENGTH.pack(len(m)) + m for m in messages)
+
+
+def test_split_batch_round_trip():
+    messages = [touch(ACTION_DOWN, 1, 10), key(4), touch(ACTION_UP, 1, 10)]
+    assert split_batch(batch(messages)) == messages
+    assert split_batch(b"") == []
+
+
+@pytest.mark.parametrize("data", [batch([key(4)])[:-1], batch([key(4)]) + b"\x00"])
+def test_split_batch_rejects_truncated_and_trailing_bytes(data):
+    with pytest.raises(ValueError):
+        split_batch(data)
+
+
+def test_only_the_last_move_of_a_pointer_is_kept():
+    messages = [touch(ACTION_MOVE, 1, x) for x in range(5)]
+    assert coalesce_moves(messages) == [messages[-1]]
+
+
+def test_moves_of_other_pointers_are_kept():
+    a1, b1, a2, b2 = (touch(ACTION_MOVE, p, x) for p, x in ((1, 1), (2, 1), (1, 2), (2, 2)))
+    assert coalesce_moves([a1, b1, a2, b2]) == [a2, b2]
+
+
+def test_moves_are_not_merged_across_down_up_or_keys():
+    down = touch(ACTION_DOWN, 1, 0)
+    m1, m2, m3 = (touch(ACTION_MOVE, 1, x) for x in (1, 2, 3))
+    up = touch(ACTION_UP, 1, 3)
+    messages = [down, m1, m2, key(4), m3, up]
+    assert coalesce_moves(messages) == [down, m2, key(4), m3, up]
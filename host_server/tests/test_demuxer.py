@@ -0,0 +1,57 @@
+from demuxer import (
+    CODEC_META,
+    DEVICE_NAME_LENGTH,
+    PACKET_FLAG_CONFIG,
+    PACKET_FLAG_KEY_FRAME,
+    PACKET_HEADER,
+    PacketType,
+    VideoDemuxer,
+)
+
+HEADER = b"Pixel 7".ljust(DEVICE_NAME_LENGTH, b"\x00") + CODEC_META.pack(0x68323634, 1080, 2400)
+
+
+def packet(flags: int, payload: bytes) -> bytes:
+    return PACKET_HEADER.pack(flags, len(payload)) + payload
+
+
+STREAM = (
+    HEADER
+    + packet(PACKET_FLAG_CONFIG, b"\x00\x00\x00\x01\x67sps")
+    + packet(PACKET_FLAG_KEY_FRAME | 1000, b"\x00\x00\x00\x01\x65" + bytes(300))
+    + packet(34333, b"\x00\x00\x00\x01\x41" + bytes(50))
+)
+
+
+def test_whole_stream_in_one_chunk():
+    demuxer = VideoDemuxer()
+    packets = demuxer.feed(STREAM)
+    assert [p.type for p in packets] == [
+        PacketType.HEADER,
+        PacketType.CONFIG,
+        PacketType.KEYFRAME,
+        PacketType.DELTA,
+    ]
+    assert demuxer.device_name == "Pixel 7"
+    assert (demuxer.width, demuxer.height) == (1080, 2400)
+    assert [p.pts for p in packets] == [None, None, 1000, 34333]
+    assert b"".join(p.data for p in packets) == STREAM
+    assert bytes(packets[2].payload) == b"\x00\x00\x00\x01\x65" + bytes(300)
+
+
+def test_byte_by_byte_gives_the_same_packets():
+    demuxer = VideoDemuxer()
+    packets = []
+    for i in range(len(STREAM)):
+        packets += demuxer.feed(STREAM[i : i + 1])
+    assert packets == VideoDemuxer().feed(STREAM)
+    assert not demuxer.buffer
+
+
+def test_incomplete_packet_waits_for_the_rest():
+    demuxer = VideoDemuxer()
+    split = len(STREAM) - 10
+    first = demuxer.feed(STREAM[:split])
+    assert [p.type for p in first] == [PacketType.HEADER, PacketType.CONFIG, PacketType.KEYFRAME]
+    rest = demuxer.feed(STREAM[split:])
+    assert [p.type for p in rest] == [PacketType.DELTA]
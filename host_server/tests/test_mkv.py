@@ -0,0 +1,59 @@
+import io
+from demuxer import CODEC_META, DEVICE_NAME_LENGTH, PACKET_HEADER, Packet, PacketType
+from mkv import (
+    CLUSTER,
+    EBML,
+    SIMPLE_BLOCK,
+    MatroskaWriter,
+    _id,
+    _size,
+    split_nal_units,
+)
+
+SPS = b"\x67\x42\xc0\x1f\x8c\x8d"
+PPS = b"\x68\xce\x3c\x80"
+
+
+def packet(packet_type: PacketType, pts: int | None, payload: bytes) -> Packet:
+    return Packet(packet_type, pts, PACKET_HEADER.pack(pts or 0, len(payload)) + payload)
+
+
+def header() -> Packet:
+    data = b"dev".ljust(DEVICE_NAME_LENGTH, b"\x00") + CODEC_META.pack(0x68323634, 720, 1280)
+    return Packet(PacketType.HEADER, None, data)
+
+
+def test_vint_sizes():
+    assert _size(0) == b"\x80"
+    assert _size(126) == b"\xfe"
+    # 127 is reserved in one byte (all ones means unknown size)
+    assert _size(127) == b"\x40\x7f"
+    assert _size(300) == b"\x41\x2c"
+
+
+def test_split_nal_units_with_3_and_4_byte_start_codes():
+    data = b"\x00\x00\x00\x01" + SPS + b"\x00\x00\x01" + PPS
+    assert split_nal_units(data) == [SPS, PPS]
+
+
+def test_writer_waits_for_config_and_keyframe():
+    out = io.BytesIO()
+    writer = MatroskaWriter(out)
+    writer.write_packet(header())
+    writer.write_packet(packet(PacketType.DELTA, 1000, b"\x00\x00\x01\x41x"))
+    assert out.getvalue() == b""
+    writer.write_packet(packet(PacketType.CONFIG, None, b"\x00\x00\x01" + SPS + b"\x00\x00\x01" + PPS))
+    start = len(out.getvalue())
+    assert out.getvalue().startswith(_id(EBML))
+    # a delta before the first keyframe is not decodable, it is skipped
+    writer.write_packet(packet(PacketType.DELTA, 2000, b"\x00\x00\x01\x41x"))
+    assert len(out.getvalue()) == start
+    writer.write_packet(packet(PacketType.KEYFRAME, 5000, b"\x00\x00\x01\x65key"))
+    writer.write_packet(packet(PacketType.DELTA, 38000, b"\x00\x00\x01\x41d"))
+    body = out.getvalue()[start:]
+    assert body.startswith(_id(CLUSTER))
+    assert body.count(_id(SIMPLE_BLOCK)) == 2
+    assert (writer.width, writer.height) == (720, 1280)
+    # the delta is 33 ms after the keyframe, relative to the cluster
+    assert writer.cluster_ts == 0
+    assert b"\x00\x21\x00\x00\x00\x00\x02\x41d" in body
@@ -0,0 +1,96 @@
+import json
+import time
+import pytest
+from fake_telegram import FakeTelegram
+from notifier import MAX_MESSAGE_LENGTH, TelegramNotifier, split_message
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def telegram():
+    server = FakeTelegram(rate=100).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def notifier_for(server, tmp_path, **kwargs) -> TelegramNotifier:
+    options = {"window": 0.05, "rate": 100, "burst": 100, "retry_delay": 0.05}
+    options.update(kwargs)
+    return TelegramNotifier(
+        "token", 42, api_url=server.url, outbox_path=str(tmp_path / "outbox.jsonl"), **options
+    )
+
+
+def test_split_message_packs_lines_up_to_the_limit():
+    lines = ["a" * 1000] * 9
+    messages = split_message(lines)
+    assert all(len(m) <= MAX_MESSAGE_LENGTH for m in messages)
+    assert [m.count("a") for m in messages] == [4000, 4000, 1000]
+    assert "\n".join(messages).split("\n") == lines
+
+
+def test_split_message_splits_a_line_longer_than_a_message():
+    text = "".join(str(i % 10) for i in range(10000))
+    messages = split_message(["before", text, "after"])
+    assert all(len(m) <= MAX_MESSAGE_LENGTH for m in messages)
+    assert messages[0] == "before"
+    assert messages[-1].endswith("after")
+    assert "".join(messages[1:-1]) + messages[-1][: -len("\nafter")] == text
+
+
+def test_events_in_one_window_are_one_digest(telegram, tmp_path):
+    notifier = notifier_for(telegram, tmp_path, window=0.5).start()
+    for i in range(5):
+        notifier.notify(f"event {i}")
+    wait_for(lambda: notifier.sent == 1 and not notifier.outbox)
+    assert len(telegram.messages) == 1
+    text = telegram.messages[0]["text"]
+    assert [line.split(" ", 1)[1] for line in text.split("\n")] == [
+        f"event {i}" for i in range(5)
+    ]
+
+
+def test_retry_after_of_a_429_is_respected(telegram, tmp_path):
+    telegram.rate = 1
+    # retry_delay is tiny: only retry_after can explain the wait
+    notifier = notifier_for(telegram, tmp_path, retry_delay=0.01).start()
+    notifier.notify("first")
+    wait_for(lambda: notifier.sent == 1)
+    sent_first = time.monotonic()
+    notifier.notify("second")
+    wait_for(lambda: notifier.sent == 2)
+    assert telegram.rejected >= 1
+    assert notifier.failed >= 1
+    assert time.monotonic() - sent_first >= 0.9
+    assert [m["text"] for m in telegram.messages] == ["first", "second"]
+
+
+def test_outbox_left_by_a_crash_is_sent_on_start(telegram, tmp_path):
+    outbox = tmp_path / "outbox.jsonl"
+    with open(outbox, "w", encoding="utf-8") as f:
+        for text in ("🔴 one", "🟢 two"):
+            f.write(json.dumps({"text": text}, ensure_ascii=False) + "\n")
+    notifier = notifier_for(telegram, tmp_path)
+    assert notifier.outbox == ["🔴 one", "🟢 two"]
+    notifier.start()
+    wait_for(lambda: notifier.sent == 2)
+    assert [m["text"] for m in telegram.messages] == ["🔴 one", "🟢 two"]
+    assert outbox.read_text(encoding="utf-8") == ""
+
+
+def test_outbox_survives_while_telegram_is_down(telegram, tmp_path):
+    telegram.down = True
+    notifier = notifier_for(telegram, tmp_path).start()
+    notifier.notify("lost?")
+    wait_for(lambda: notifier.failed >= 1)
+    # a new process after the crash finds the message in the outbox
+    restarted = notifier_for(telegram, tmp_path)
+    assert restarted.outbox == ["lost?"]
@@ -0,0 +1,61 @@
+import asyncio
+from demuxer import Packet, PacketType
+from packet_queue import AsyncPacketQueue, PacketQueue, QueuePolicy
+
+
+def p(packet_type: PacketType, n: int = 0) -> Packet:
+    return Packet(packet_type, None if packet_type is PacketType.CONFIG else n, bytes([n % 256]))
+
+
+def drain(queue: PacketQueue) -> list[Packet]:
+    queue.close()
+    items = []
+    while (batch := queue.get_batch(100)):
+        items += batch
+    return items
+
+
+def test_drop_keeps_header_and_config_and_skips_to_the_next_keyframe():
+    queue = PacketQueue(4, QueuePolicy.DROP)
+    header, config = p(PacketType.HEADER), p(PacketType.CONFIG)
+    for packet in (header, config, p(PacketType.KEYFRAME, 1), p(PacketType.DELTA, 2)):
+        assert queue.put(packet)
+    # full: the queued video is stale, the delta cannot be decoded without it
+    assert not queue.put(p(PacketType.DELTA, 3))
+    assert not queue.put(p(PacketType.DELTA, 4))
+    keyframe = p(PacketType.KEYFRAME, 5)
+    assert queue.put(keyframe)
+    delta = p(PacketType.DELTA, 6)
+    assert queue.put(delta)
+    assert drain(queue) == [header, config, keyframe, delta]
+    # two queued frames discarded, two deltas refused
+    assert queue.dropped == 4
+
+
+def test_spill_keeps_every_packet_in_order():
+    queue = PacketQueue(2, QueuePolicy.SPILL)
+    packets = [p(PacketType.KEYFRAME, 0)] + [p(PacketType.DELTA, n) for n in range(1, 10)]
+    for packet in packets:
+        assert queue.put(packet)
+    assert queue.spilled == 8
+    assert len(queue) == 10
+    assert drain(queue) == packets
+    assert queue.dropped == 0
+
+
+def test_closed_queue_refuses_packets():
+    queue = PacketQueue(2, QueuePolicy.BLOCK)
+    queue.close()
+    assert not queue.put(p(PacketType.KEYFRAME))
+    assert queue.get_batch(1) == []
+
+
+def test_async_block_queue_counts_a_refused_put():
+    async def main():
+        queue = AsyncPacketQueue(2, QueuePolicy.BLOCK)
+        assert queue.put(p(PacketType.KEYFRAME, 1))
+        assert queue.put(p(PacketType.DELTA, 2))
+        assert not queue.put(p(PacketType.DELTA, 3))
+        return queue.dropped, len(queue)
+
+    assert asyncio.run(main()) == (1, 2)
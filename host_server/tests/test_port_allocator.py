@@ -0,0 +1,86 @@
+import pytest
+from adb_client import AdbClient
+from fake_adb_server import FakeAdbServer
+from port_allocator import SCRCPY_SOCKET, PortAllocator
+
+
+def test_acquire_keeps_the_lease_of_a_serial():
+    ports = PortAllocator(30000, 30010)
+    port = ports.acquire("a")
+    assert ports.acquire("a") == port
+    assert ports.acquire("b") != port
+    assert ports.port_of("a") == port
+
+
+def test_exhausted_range_raises_until_a_port_is_released():
+    ports = PortAllocator(30000, 30003)
+    leased = {ports.acquire(serial) for serial in "abc"}
+    assert leased == {30000, 30001, 30002}
+    with pytest.raises(RuntimeError):
+        ports.acquire("d")
+    ports.release("b")
+    assert ports.acquire("d") == 30001
+
+
+def test_quarantined_port_is_skipped_until_it_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("port_allocator.time.monotonic", lambda: now[0])
+    ports = PortAllocator(30000, 30002, quarantine_time=60)
+    busy = ports.acquire("a")
+    ports.release("a", quarantine=True)
+    other = ports.acquire("b")
+    assert other != busy
+    # the only other port is quarantined
+    with pytest.raises(RuntimeError):
+        ports.acquire("c")
+    now[0] += 61
+    assert ports.acquire("c") == busy
+    assert busy not in ports.quarantined
+
+
+def test_stale_release_does_not_free_the_current_lease():
+    ports = PortAllocator(30000, 30010)
+    old = ports.acquire("a")
+    ports.release("a", port=old)
+    ports.acquire("x")  # takes the next port, `old` went to the back
+    new = ports.acquire("a")
+    assert new != old
+    # the previous session of "a" stops late and releases its own port
+    ports.release("a", port=old)
+    assert ports.port_of("a") == new
+    assert ports.owners[new] == "a"
+    assert new not in ports.free
+
+
+def test_reconcile_removes_leaked_forwards_in_range(tmp_path):
+    server = FakeAdbServer(str(tmp_path), ["dev1", "dev2"], forward_listeners=False).start()
+    try:
+        client = AdbClient(port=server.port)
+        server.forwards.update(
+            {
+                "tcp:30005": ("dev1", SCRCPY_SOCKET),  # leaked by a crashed run
+                "tcp:30006": ("dev2", SCRCPY_SOCKET),  # leaked by a crashed run
+                "tcp:45000": ("dev1", SCRCPY_SOCKET),  # outside the range
+                "tcp:30007": ("dev2", "tcp:8080"),  # not a scrcpy forward
+            }
+        )
+        ports = PortAllocator(30000, 31000)
+        ports.reconcile(client)
+        assert set(server.forwards) == {"tcp:45000", "tcp:30007"}
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_reconcile_keeps_leased_ports(tmp_path):
+    server = FakeAdbServer(str(tmp_path), ["dev1"], forward_listeners=False).start()
+    try:
+        client = AdbClient(port=server.port)
+        ports = PortAllocator(30000, 31000)
+        port = ports.acquire("dev1")
+        client.forward("dev1", f"tcp:{port}", SCRCPY_SOCKET)
+        ports.reconcile(client)
+        assert f"tcp:{port}" in server.forwards
+    finally:
+        server.shutdown()
+        server.server_close()
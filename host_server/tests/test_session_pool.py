@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from session_pool import AsyncSession, AsyncSessionPool, Session, SessionPool, SessionPoolFull
+
+
+class FakeScrcpy:
+    def scrcpy_stop(self):
+        pass
+
+
+class FakeFanout:
+    def close(self):
+        pass
+
+
+def start_session(serial: str) -> Session:
+    return Session(serial, FakeScrcpy(), FakeFanout())
+
+
+def test_batch_starts_are_not_capped_without_the_warm_pool():
+    pool = SessionPool(start_session, warm=False, max_sessions=16)
+    for i in range(20):
+        assert pool.start(f"device-{i}", pin=True) is not None
+    assert len(pool.sessions) == 20
+
+
+def test_batch_starts_past_the_warm_pool_budget_are_refused():
+    pool = SessionPool(start_session, warm=True, max_sessions=16)
+    for i in range(16):
+        pool.start(f"device-{i}", pin=True)
+    with pytest.raises(SessionPoolFull):
+        pool.start("device-16", pin=True)
+    assert len(pool.sessions) == 16
+
+
+def test_warm_pool_evicts_idle_sessions_for_a_batch():
+    pool = SessionPool(start_session, warm=True, max_sessions=2)
+    pool.acquire("idle")
+    pool.release("idle")
+    pool.start("batch-0", pin=True)
+    pool.start("batch-1", pin=True)
+    assert set(pool.sessions) == {"batch-0", "batch-1"}
+
+
+def test_async_batch_starts_are_not_capped_without_the_warm_pool():
+    class FakeAsyncScrcpy:
+        async def scrcpy_stop(self):
+            pass
+
+    async def start_async_session(serial: str) -> AsyncSession:
+        return AsyncSession(serial, FakeAsyncScrcpy(), FakeFanout())
+
+    async def main():
+        pool = AsyncSessionPool(start_async_session, warm=False, max_sessions=16)
+        await asyncio.gather(*(pool.start(f"device-{i}", pin=True) for i in range(20)))
+        return len(pool.sessions)
+
+    assert asyncio.run(main()) == 20
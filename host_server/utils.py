@@ -1,10 +1,51 @@
-import requests
+from loguru import logger
+from adb_client import adb
 from config import settings
+from notifier import TelegramNotifier
+from packet_queue import QueuePolicy
+from recorder import RecordMode
+
+notifier = TelegramNotifier(
+    settings.TOKEN,
+    settings.ADMIN_ID,
+    api_url=settings.TELEGRAM_API_URL,
+    window=settings.TELEGRAM_DIGEST_WINDOW,
+    rate=settings.TELEGRAM_RATE,
+    burst=settings.TELEGRAM_BURST,
+    outbox_path=settings.TELEGRAM_OUTBOX,
+)
 
 
 def send_message_to_telegram(text: str):
-    data = {
-        "chat": settings.ADMIN_ID,
-        "text": text
+    # queued, sent in digests by the notifier thread
+    notifier.notify(text)
+
+
+def is_device_available(serial: str) -> bool:
+    try:
+        return adb.devices().get(serial) == "device"
+    except Exception as e:
+        logger.error(f"ADB devices check failed: {e}")
+        return False
+
+
+def record_options() -> dict:
+    return {
+        "record_mode": RecordMode(settings.RECORD_MODE.upper()),
+        "record_format": settings.RECORD_FORMAT,
+        "record_queue_size": settings.RECORD_QUEUE_SIZE,
+        "record_queue_policy": QueuePolicy(settings.RECORD_QUEUE_POLICY.upper()),
     }
-    requests.post(f"https://api.telegram.org/bot{settings.TOKEN}/sendMessage", data=data)
\ No newline at end of file
+
+
+def report_session(backend, serial: str, started: bool):
+    # runs on the dispatcher worker, socket.io handlers never wait for it
+    backend.set_connection_status(serial, "CONNECTED" if started else "DISCONNECTED")
+    device = backend.get_device(serial) or {}
+    label = device.get("label") or serial
+    if started:
+        text_log = f"🟢Сессия с девайсом {label} началась 🟢"
+    else:
+        text_log = f"🔴Сессия с девайсом {label} закончилась 🔴"
+    logger.bind(connection=True).info(text_log)
+    send_message_to_telegram(text_log)
@@ -0,0 +1,68 @@
+import asyncio
+import aiohttp
+from config import settings
+
+
+class BackendClient:
+    def __init__(self, base_url: str, timeout: float = 10, limit: int = 20):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.limit = limit
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # created lazily inside the running event loop, shared by all handlers
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.limit),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def request(self, method: str, path: str, timeout: float | None = None, **kwargs):
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        async with self.session.request(method, f"{self.base_url}{path}", **kwargs) as res:
+            res.raise_for_status()
+            return await res.json()
+
+    async def get_devices(self) -> list[dict]:
+        return await self.request("GET", "/v1/devices/")
+
+    async def set_session_status(self, serial_number: str, status: str) -> dict:
+        return await self.request(
+            "PATCH",
+            f"/v1/devices/edit-status/session/{serial_number}",
+            params={"status": status},
+        )
+
+    async def set_all_session_status(self, status: str) -> dict:
+        return await self.request("POST", "/v1/devices/edit-all", params={"status": status})
+
+    async def start_batch(self, action: str, serials: list[str] | None = None) -> dict:
+        body = {"action": action}
+        if serials is not None:
+            body["serials"] = serials
+        return await self.request("POST", "/sessions/batch", json=body)
+
+    async def get_batch(self, job_id: str) -> dict:
+        return await self.request("GET", f"/sessions/batch/{job_id}")
+
+
+backend = BackendClient(settings.LINK)
+host = BackendClient(settings.HOST_LINK) if settings.HOST_LINK else None
+
+background_tasks: set[asyncio.Task] = set()
+
+
+def run_in_background(coro) -> asyncio.Task:
+    # the event loop keeps only weak references to tasks
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
@@ -5,6 +5,7 @@ class Settings(BaseSettings):
     TOKEN: str
     LINK: str
     REDIRECT_LINK: str
+    HOST_LINK: str = ""  # host server, for batch session start/stop
 
 
 settings = Settings()
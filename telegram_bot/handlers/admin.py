@@ -1,9 +1,12 @@
 from aiogram import F, Bot, Router
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
 from keyboard import admin as admin_keyboard
 from config import settings
-import requests
+from api_client import backend, host, run_in_background
+import asyncio
+import aiohttp
 
 
 bot = Bot(token=settings.TOKEN)
@@ -14,31 +17,85 @@ router = Router()
 
 @router.message(Command('devices'))
 async def active_device(m: Message):
-    res = requests.get(f"{settings.LINK}/v1/devices/all-in-base")
-    markup = await admin_keyboard.list_device_kb(res.json())
+    devices = await backend.get_devices()
+    markup = await admin_keyboard.list_device_kb(devices)
     await m.answer(text=
                     "Все устройства в базе данных, чтобы включить или отключить \
                     сервер для управления - нажмите на устройство",
                    reply_markup=markup)
 
 
+BATCH_POLL_INTERVAL = 2
+
+
+async def edit_text(message: Message, text: str):
+    try:
+        await message.edit_text(text=text)
+    except TelegramBadRequest:
+        # the text did not change since the last edit
+        pass
+
+
+async def follow_batch(message: Message, action: str, title: str) -> str:
+    # polls the host server job and keeps the message up to date
+    job = await host.start_batch(action)
+    text = None
+    while True:
+        progress = f"{title}: {job['done']}/{job['total']}"
+        if job["failed"] or job["timeout"]:
+            progress += f", ошибок: {job['failed'] + job['timeout']}"
+        if job["finished"]:
+            failed = "\n".join(f"{serial}: {error}" for serial, error in job["errors"].items())
+            return f"{progress}\n{failed}" if failed else progress
+        if progress != text:
+            text = progress
+            await edit_text(message, text)
+        await asyncio.sleep(BATCH_POLL_INTERVAL)
+        job = await host.get_batch(job["job_id"])
+
+
+async def start_all_job(message: Message):
+    # runs as a background task, progress is reported by editing the message
+    try:
+        await backend.set_all_session_status("ACTIVE")
+        if host:
+            text = await follow_batch(message, "start", "Запуск сессий")
+        else:
+            devices = await backend.get_devices()
+            active = sum(device["session_status"] == "ACTIVE" for device in devices)
+            text = f"Все сессии запущены: {active}/{len(devices)}"
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        text = f"Не удалось запустить сессии: {e}"
+    await edit_text(message, text)
+
+
+async def stop_all_job(message: Message):
+    try:
+        await backend.set_all_session_status("INACTIVE")
+        text = "Все сессии остановлены"
+        if host:
+            text = await follow_batch(message, "stop", "Остановка сессий")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        text = f"Не удалось остановить сессии: {e}"
+    await edit_text(message, text)
+
+
 @router.message(Command('start_all'))
 async def start_all(m: Message):
-    await m.answer(text="Начинаю запуск всех сессий")
-    requests.post(f"{settings.LINK}/v1/devices/all-device-active", timeout=90)
-    await m.answer(text="Все сессии запущены")
+    message = await m.answer(text="Начинаю запуск всех сессий")
+    run_in_background(start_all_job(message))
 
 
 @router.message(Command('stop_all'))
 async def stop_all(m: Message):
-    await m.answer(text="Останавливаю все сессии")
-    requests.post(f"f{settings.LINK}/v1/devices/all-device-inactive")
+    message = await m.answer(text="Останавливаю все сессии")
+    run_in_background(stop_all_job(message))
 
 
 @router.message(Command('for_copy'))
 async def for_copy(m: Message):
-    res = requests.get(f"{settings.LINK}/v1/devices/all-in-base")
-    markup = await admin_keyboard.list_for_copy_kb(res.json())
+    devices = await backend.get_devices()
+    markup = await admin_keyboard.list_for_copy_kb(devices)
     await m.answer(text="Устройства для копирования по нажатию на кнопку", reply_markup=markup)
 
 
@@ -46,11 +103,11 @@ async def for_copy(m: Message):
 async def reload_func(c: CallbackQuery):
     await c.answer()
     _, action = c.data.split("_")
-    res = requests.get(f"{settings.LINK}/v1/devices/all-in-base")
+    devices = await backend.get_devices()
     if action == "copy":
-        markup = await admin_keyboard.list_for_copy_kb(res.json())
+        markup = await admin_keyboard.list_for_copy_kb(devices)
     elif action == "list":
-        markup = await admin_keyboard.list_device_kb(res.json())
+        markup = await admin_keyboard.list_device_kb(devices)
     await bot.edit_message_reply_markup(message_id=c.message.message_id, chat_id=c.message.chat.id, reply_markup=markup)
 
 
@@ -58,12 +115,12 @@ async def reload_func(c: CallbackQuery):
 async def update_status(c: CallbackQuery):
     _, serial_number, status = c.data.split(":")
     if status == "ACTIVE":
-        requests.patch(f"{settings.LINK}/v1/devices/update-status/session/{serial_number}/inactive")
+        await backend.set_session_status(serial_number, "INACTIVE")
         text = "Отправлен запрос на отключение сессии"
     elif status == "INACTIVE":
-        requests.patch(f"{settings.LINK}/v1/devices/update-status/session/{serial_number}/active")
+        await backend.set_session_status(serial_number, "ACTIVE")
         text="Процедура поднятия сервера занимает некоторое время, ожидайте обновления клавиатуры"
     await c.answer(text=text, show_alert=True)
-    res = requests.get(f"{settings.LINK}/v1/devices/all-in-base")
-    markup = await admin_keyboard.list_device_kb(res.json())
+    devices = await backend.get_devices()
+    markup = await admin_keyboard.list_device_kb(devices)
     await bot.edit_message_reply_markup(message_id=c.message.message_id, chat_id=c.message.chat.id, reply_markup=markup)
\ No newline at end of file
@@ -3,6 +3,7 @@ from aiogram.client.default import DefaultBotProperties
 from config import settings
 from aiogram.types import BotCommand
 from handlers.admin import router
+from api_client import backend, host
 import asyncio
 
 bot = Bot(token=settings.TOKEN,
@@ -20,6 +21,9 @@ async def set_bot_commands():
 
 async def main():
     dp.include_routers(router)
+    dp.shutdown.register(backend.close)
+    if host:
+        dp.shutdown.register(host.close)
     await set_bot_commands()
     await dp.start_polling(bot)
 